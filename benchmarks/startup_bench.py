@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import cost of the core modules and time from process
+start to the first LLM call of a CLI `--query` invocation.
+
+Each measurement runs in a fresh interpreter so module caches do not
+leak between runs. The first-call probe replaces the provider dispatch
+with a hook that reports the elapsed time and exits, so no model server
+is needed.
+
+Run: python benchmarks/startup_bench.py [--repeat 5]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    "config",
+    "utils.model_client",
+    "utils.pageindex_retriever",
+    "core.contrastive_router",
+    "core.proxy_agent",
+    "core",
+    "evaluation.run_eval",
+]
+
+_IMPORT_PROBE = """
+import time
+t0 = time.perf_counter()
+import {module}
+print(f"{{time.perf_counter() - t0:.6f}}")
+"""
+
+_FIRST_CALL_PROBE = """
+import time
+t0 = time.perf_counter()
+import sys
+sys.argv = ["main.py", "--query", "Should we approve a $45,000 campaign?"]
+import utils.model_client as mc
+
+def _first_call(self, *args, **kwargs):
+    print(f"FIRST_CALL {time.perf_counter() - t0:.6f}", flush=True)
+    raise SystemExit(0)
+
+mc.ModelClient._generate_live_many = _first_call
+import main
+main.main()
+"""
+
+
+def _run(code: str) -> str:
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return out.stdout
+
+
+def bench_imports(repeat: int):
+    print("Import time (fresh interpreter, median of runs)")
+    for module in MODULES:
+        samples = [
+            float(_run(_IMPORT_PROBE.format(module=module)).strip().splitlines()[-1])
+            for _ in range(repeat)
+        ]
+        print(f"  {module:<28} {statistics.median(samples) * 1000:8.1f} ms")
+
+
+def bench_first_call(repeat: int):
+    in_process, wall = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stdout = _run(_FIRST_CALL_PROBE)
+        wall.append(time.perf_counter() - start)
+        first_call = next(line for line in stdout.splitlines()
+                          if line.startswith("FIRST_CALL"))
+        in_process.append(float(first_call.split()[1]))
+    print("\nCLI --query → first LLM call")
+    print(f"  after interpreter start      {statistics.median(in_process) * 1000:8.1f} ms")
+    print(f"  wall clock incl. interpreter {statistics.median(wall) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench_imports(args.repeat)
+    bench_first_call(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ load_dotenv()
 
 class Config:
     # ── Model Configuration ──────────────────────────────────────────────────
-    MODEL_PROVIDER = "ollama"          # "ollama" | "gemini" | "huggingface"
+    MODEL_PROVIDER = "ollama"          # "ollama" | "gemini" | "huggingface" | "local"
     OLLAMA_MODEL = "phi"               # phi, mistral, llama2, etc.
     OLLAMA_BASE_URL = "http://localhost:11434"
 
@@ -20,14 +20,56 @@ class Config:
     HF_TOKEN = os.getenv("HF_TOKEN", "")
     HF_MODEL = "gpt2"
 
+    # Local transformers model on CPU (optional, needs torch + transformers)
+    LOCAL_MODEL_PATH = os.getenv("CCR_LOCAL_MODEL", "gpt2")
+    LOCAL_WORKERS = 0                  # 0 = in-process; N = N-process pool
+    LOCAL_THREADS_PER_WORKER = 1       # torch / BLAS threads per worker
+
+    # Structured (JSON) output for scores, candidate actions and tree search.
+    # Ollama / Gemini constrain decoding; other providers are validated only.
+    STRUCTURED_OUTPUT = True
+    STRUCTURED_REPAIR_RETRIES = 2      # re-prompts per invalid reply
+
+    # Action scoring: "text" asks for a number; "logprob" reads P(a | x, C')
+    # from first-token log-probabilities (Ollama, local) in one forward pass
+    SCORING_MODE = "text"
+    LOGPROB_TARGET = "digits"          # "digits" (expected 0-9 rating) | "yesno"
+    LOGPROB_TOP_K = 20                 # candidates returned per token
+
+    # Provider rate limits (requests / tokens per minute; omitted = unlimited).
+    # Requests queue by priority: scoring, then explanation, then demo.
+    RATE_LIMITS = {
+        "gemini": {"rpm": 15, "tpm": 250000},
+        "huggingface": {"rpm": 60},
+    }
+    RATE_LIMIT_MAX_RETRIES = 4         # jittered backoff on 429 / 5xx
+    RATE_LIMIT_MAX_WAIT = 120.0        # seconds a request may queue before RateLimitError
+
     # ── PageIndex Configuration ──────────────────────────────────────────────
     # Set PAGEINDEX_API_KEY in .env to enable cloud mode.
     # Leave blank to use local tree-search mode (no external calls).
     # Get a key at: https://docs.pageindex.ai/quickstart
     PAGEINDEX_API_KEY = os.getenv("PAGEINDEX_API_KEY", "")
+    # "local" serves cloud mode from an offline PageIndexClient stand-in
+    # (no key or network needed) for tests and demos
+    PAGEINDEX_CLIENT = os.getenv("PAGEINDEX_CLIENT", "sdk")
+
+    # Cloud documents are indexed in the background at startup; queries
+    # use the local tree until every document is ready
+    PAGEINDEX_POLL_INTERVAL = 2.0      # seconds between indexing status checks
+    PAGEINDEX_INDEX_TIMEOUT = 600.0    # stop polling (keep serving local) after this long
+    PAGEINDEX_MAX_RESUBMITS = 3        # re-submissions of a document whose doc id keeps vanishing
+    PAGEINDEX_LOCAL_DELAY = 1.0        # stand-in: seconds a new document stays "processing"
+
+    # Local tree search: beam search, one LLM call per level at most
+    TREE_SEARCH_MAX_DEPTH = 3          # levels expanded below the document roots
+    TREE_SEARCH_BEAM_WIDTH = 3         # sections kept per level, across all documents
+    TREE_SEARCH_MAX_CALLS = 3          # LLM calls per query
+    TREE_SEARCH_MAX_TOKENS = 4000      # estimated prompt + reply tokens per query
 
     # ── Epistemic Layer ──────────────────────────────────────────────────────
     EPISTEMIC_N_VARIANTS = 3
+    ACTION_DEDUP_THRESHOLD = 0.85      # word-overlap similarity that merges candidates (None = exact only)
     EPISTEMIC_TEMPERATURE = 0.7
     CONFIDENCE_THRESHOLD = 0.7
     VARIANCE_THRESHOLD = 0.3
@@ -44,9 +86,26 @@ class Config:
     IDENTITY_PATH = CONFIGS_DIR / "identity.json"
     POLICIES_PATH = POLICIES_DIR / "company_policies.json"
     TEST_SUITE_PATH = TEST_DIR / "test_suite.json"
-    MEMORY_PATH = DATA_DIR / "agent_memory.pkl"
+    MEMORY_PATH = DATA_DIR / "agent_memory"      # records.jsonl + vectors.f4
+    SCORE_ARCHIVE_PATH = DATA_DIR / "score_archive"  # memory-mapped score matrices
+    PAGEINDEX_DOC_CACHE = DATA_DIR / ".pageindex_doc_ids.json"  # cloud doc ids by content hash
+    CANDIDATE_LIBRARY_PATH = DATA_DIR / "candidate_library.json"  # mined candidate actions
     TRAINING_DATA_PATH = TRAINING_DIR / "epistemic_training.jsonl"
 
+    # ── Transcript Record / Replay ───────────────────────────────────────────
+    # "" = live calls, "record" = live + append to transcript,
+    # "replay" = serve from transcript (strict: fail on misses,
+    # lenient: call the model on misses and record the response)
+    TRANSCRIPT_MODE = os.getenv("CCR_TRANSCRIPT_MODE", "")
+    TRANSCRIPT_STRICT = os.getenv("CCR_TRANSCRIPT_STRICT", "1") != "0"  # CCR_TRANSCRIPT_STRICT=0 → lenient
+    TRANSCRIPT_PATH = DATA_DIR / "transcripts" / "llm_transcript.jsonl"
+
+    # ── Explanation Memo Cache ───────────────────────────────────────────────
+    EXPLANATION_CACHE_SIZE = 256       # in-memory LRU entries (0 disables)
+    EXPLANATION_CACHE_PRECISION = 2    # decimals of the scores in the cache key
+    EXPLANATION_CACHE_PATH = DATA_DIR / "cache" / "explanations.sqlite3"  # None = memory only
+    LAZY_EXPLANATIONS = False          # generate the memo on first read of "response"
+
     # ── Evaluation Metrics ───────────────────────────────────────────────────
     METRICS = [
         "epistemic_consistency",
@@ -59,9 +118,39 @@ class Config:
 
     # ── Agent ────────────────────────────────────────────────────────────────
     MAX_MEMORY_ITEMS = 100
+    MEMORY_ENABLED = False             # answer near-duplicate queries from memory (opt-in)
+    MEMORY_SIMILARITY_THRESHOLD = 0.92
+    MEMORY_REVALIDATE = True           # re-score top actions before reusing a decision
+    SCORE_ARCHIVE_ENABLED = True       # archive every routed score matrix for audits
+    CANDIDATE_LIBRARY_ENABLED = False  # reuse mined candidate actions for recurring categories (opt-in)
+    CANDIDATE_LIBRARY_MIN_OBSERVATIONS = 3  # generated sets per key before it is trusted
+    CANDIDATE_LIBRARY_MIN_SUPPORT = 0.5     # share of those sets an action must appear in
+    CANDIDATE_LIBRARY_REFRESH_EVERY = 25    # every Nth hit regenerates instead (0 = never)
+    CANDIDATE_LIBRARY_QUERY_SIMILARITY = 0.6  # query must resemble one the entry learned from
     TEMPERATURE = 0.3
     MAX_TOKENS = 500
 
+    # ── HTTP Serving (server.py) ─────────────────────────────────────────────
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8080
+    SERVER_WORKERS = 4                 # concurrent pipeline executions
+    SERVER_MAX_QUEUE = 64              # pending distinct queries before 503
+    SERVER_DRAIN_TIMEOUT = 120.0       # seconds to finish in-flight work
+
+    # ── Query Scheduler (deadlines / priorities) ─────────────────────────────
+    SCHEDULER_WORKERS = 4              # queries routed concurrently (server: SERVER_WORKERS)
+    SCHEDULER_DEFAULT_DEADLINE = 60.0  # seconds, when a request sets none
+    SCHEDULER_HEADROOM = 0.9           # plan to finish within this share of the time left
+    SCHEDULER_COST_SMOOTHING = 0.3     # weight of each observed stage timing
+    # Initial stage cost estimates in seconds, refined from observed timings
+    SCHEDULER_STAGE_COSTS = {
+        "tree_search": 6.0,            # LLM tree search (up to TREE_SEARCH_MAX_CALLS calls)
+        "lexical": 0.05,               # keyword retrieval
+        "candidates": 4.0,             # candidate action generation (5 actions)
+        "score_cell": 1.0,             # per action × variant
+        "explanation": 6.0,            # decision memo
+    }
+
     # ── Logging ──────────────────────────────────────────────────────────────
     LOG_LEVEL = "INFO"
     LOG_FILE = LOGS_DIR / "agent.log"
@@ -1,6 +1,26 @@
 # core/__init__.py
-from .proxy_agent import EpistemicProxyAgent
-from .contrastive_router import ContrastiveCognitiveRouter
-from .epistemic_variants import EpistemicVariantGenerator
+"""
+Public classes are imported lazily (PEP 562) so that `import core` stays
+cheap; the agent and its model/retriever stack load on first attribute use.
+"""
+import importlib
 
-__all__ = ['EpistemicProxyAgent', 'ContrastiveCognitiveRouter', 'EpistemicVariantGenerator']
\ No newline at end of file
+_LAZY = {
+    'EpistemicProxyAgent': '.proxy_agent',
+    'ContrastiveCognitiveRouter': '.contrastive_router',
+    'EpistemicVariantGenerator': '.epistemic_variants',
+}
+
+__all__ = ['EpistemicProxyAgent', 'ContrastiveCognitiveRouter', 'EpistemicVariantGenerator']
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
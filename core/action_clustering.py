@@ -0,0 +1,152 @@
+"""
+Candidate action clustering — merge near-duplicate candidates before scoring.
+
+The candidate generator often returns two phrasings of one decision
+("Request additional information first" / "Request more information
+now"). Each candidate costs a full row of variant-scoring
+calls, so near-duplicates are grouped and only one representative per
+group is scored; every member then gets the representative's scores.
+
+Similarity is the Dice overlap of normalized content words: lower-cased,
+stop and filler words dropped, lightly stemmed, and common decision verbs
+mapped to one form (reject → deny, postpone → defer, additional → more).
+Candidates never merge when they differ in negation ("do not approve"),
+in ordering ("approve after legal review" vs "approve before legal
+review") or in the numbers they mention ("$10,000" vs "$20,000").
+
+Usage:
+    clusters = cluster_actions(actions)
+    grid = scorer.score_grid(query, contexts, clusters.representatives)
+    rows = [clusters.expand(scores) for scores in grid]   # per original action
+"""
+
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config import config
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d[\d,.]*")
+
+_STOPWORDS = {
+    "a", "an", "the", "to", "of", "for", "and", "or", "with", "on", "in",
+    "by", "this", "that", "it", "its", "we", "our", "is", "be", "as", "at",
+    "any", "all", "some",
+    # Filler that does not change the decision
+    "first", "now", "deciding", "decision", "decide", "proceeding", "proceed",
+    "further",
+}
+_NEGATIONS = {"not", "no", "never", "without", "dont", "don", "cannot"}
+# Ordering changes the decision ("approve after review" ≠ "approve before review")
+_ORDERING = {"before", "after", "until", "pending", "then", "once", "while", "unless"}
+_SYNONYMS = {
+    "additional": "more", "extra": "more",
+    "info": "information", "details": "information", "clarification": "information",
+    "ask": "request", "seek": "request", "obtain": "request", "gather": "request",
+    "postpone": "defer", "delay": "defer", "hold": "defer",
+    "reject": "deny", "decline": "deny", "refuse": "deny",
+    "accept": "approve", "authorize": "approve", "authorise": "approve",
+    "conditional": "condition",
+}
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > 4 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 3 and word.endswith("e") else word
+
+
+_SYNONYM_STEMS = {_stem(k): _stem(v) for k, v in _SYNONYMS.items()}
+
+
+Signature = Tuple[FrozenSet[str], bool, Tuple[str, ...], FrozenSet[str]]
+
+
+def action_signature(action: str) -> Signature:
+    """(content word stems, negated?, numbers, ordering words) of a candidate action."""
+    words = _WORD_RE.findall(action.lower())
+    negated = any(w in _NEGATIONS for w in words)
+    ordering = frozenset(w for w in words if w in _ORDERING)
+    stems = set()
+    for word in words:
+        if (word in _STOPWORDS or word in _NEGATIONS or word in _ORDERING
+                or word.isdigit()):
+            continue
+        stem = _stem(word)
+        stems.add(_SYNONYM_STEMS.get(stem, stem))
+    numbers = tuple(sorted(n.rstrip(".,").replace(",", "")
+                           for n in _NUMBER_RE.findall(action)))
+    return frozenset(stems), negated, numbers, ordering
+
+
+def action_similarity(a, b) -> float:
+    """Dice similarity of two signatures (0 when negation, numbers or ordering differ)."""
+    stems_a, neg_a, nums_a, order_a = a
+    stems_b, neg_b, nums_b, order_b = b
+    if neg_a != neg_b or nums_a != nums_b or order_a != order_b:
+        return 0.0
+    if not stems_a and not stems_b:
+        return 1.0
+    return 2 * len(stems_a & stems_b) / (len(stems_a) + len(stems_b))
+
+
+class ActionClusters:
+    """Candidate actions grouped under their first-seen representative."""
+
+    def __init__(self, actions: List[str], rep_of: List[int]):
+        self.actions = list(actions)
+        self._rep_of = rep_of                     # action index → representative slot
+        self.representatives: List[str] = []
+        for i, slot in enumerate(rep_of):
+            if slot == len(self.representatives):
+                self.representatives.append(self.actions[i])
+
+    @property
+    def merged(self) -> int:
+        """Number of candidates that are not scored themselves."""
+        return len(self.actions) - len(self.representatives)
+
+    def members(self) -> Dict[str, List[str]]:
+        """representative → every action in its cluster (itself first)."""
+        groups: Dict[str, List[str]] = {r: [] for r in self.representatives}
+        for action, slot in zip(self.actions, self._rep_of):
+            groups[self.representatives[slot]].append(action)
+        return groups
+
+    def expand(self, rep_scores: List[float]) -> List[float]:
+        """Scores per representative → scores per original action."""
+        return [rep_scores[slot] for slot in self._rep_of]
+
+
+def cluster_actions(actions: List[str],
+                    threshold: Optional[float] = None) -> ActionClusters:
+    """
+    Greedy clustering in generation order: each action joins the most
+    similar earlier representative at or above `threshold` (default:
+    config.ACTION_DEDUP_THRESHOLD; None disables merging except for
+    identical strings), otherwise it starts a cluster of its own.
+    """
+    if threshold is None:
+        threshold = config.ACTION_DEDUP_THRESHOLD
+
+    reps: List[Tuple[str, tuple]] = []
+    rep_of: List[int] = []
+    for action in actions:
+        signature = action_signature(action) if threshold is not None else None
+        best, best_sim = None, -1.0
+        for slot, (rep, rep_signature) in enumerate(reps):
+            if rep == action:
+                best, best_sim = slot, 1.0
+                break
+            if signature is None:
+                continue
+            sim = action_similarity(signature, rep_signature)
+            if sim >= threshold and sim > best_sim:
+                best, best_sim = slot, sim
+        if best is None:
+            best = len(reps)
+            reps.append((action, signature))
+        rep_of.append(best)
+    return ActionClusters(actions, rep_of)
@@ -0,0 +1,178 @@
+"""
+Batch planning: per-context instead of per-query preprocessing.
+
+In bulk review jobs many queries retrieve the same policy nodes, so they
+get identical contexts and — with variants seeded from the context —
+identical epistemic variants. The planner:
+
+  1. routes each distinct query once (whitespace-normalized duplicates
+     share one result) and serves decision-memory hits first
+  2. retrieves context once per distinct query and groups the queries
+     by retrieved-context fingerprint
+  3. generates candidate actions for all queries as one model batch
+  4. generates the epistemic variants once per context group
+  5. scores every query's action × variant grid in one scorer batch,
+     each against its group's shared variants; near-duplicate candidates
+     are merged and scored once (core/action_clustering.py)
+
+Results match process_query for the same queries (same seeds, same
+prompts); only the number and batching of calls differ.
+
+Usage:
+    results = agent.process_batch(queries)
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config import config
+from core.action_clustering import cluster_actions
+
+
+@dataclass
+class ContextGroup:
+    """Queries whose retrieval produced the same context."""
+    fingerprint: str
+    context: str
+    node_ids: Optional[List[str]]
+    seed: int
+    queries: List[str] = field(default_factory=list)
+    retrieval_costs: Dict[str, Optional[Dict]] = field(default_factory=dict)
+    variants: List[Dict] = field(default_factory=list)
+
+
+class BatchPlanner:
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.stats: Dict[str, int] = {}
+
+    @staticmethod
+    def fingerprint(context: str) -> str:
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()[:16]
+
+    # ── Planning ─────────────────────────────────────────────────────────────
+
+    def plan(self, queries: List[str], snapshot=None) -> List[ContextGroup]:
+        """Retrieve once per query and group queries by context fingerprint."""
+        agent = self.agent
+        snapshot = snapshot or agent.snapshot
+        groups: Dict[str, ContextGroup] = {}
+        for query in queries:
+            context, node_ids = agent._retrieve_context(query, snapshot)
+            cost = agent.retriever.last_cost
+            key = self.fingerprint(context)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = ContextGroup(
+                    key, context, node_ids, agent._variant_seed(context)
+                )
+            group.queries.append(query)
+            group.retrieval_costs[query] = cost
+        return list(groups.values())
+
+    # ── Execution ────────────────────────────────────────────────────────────
+
+    def run(self, queries: List[str],
+            lazy_explanation: Optional[bool] = None) -> List[Dict]:
+        """process_query results for `queries`, in order."""
+        agent = self.agent
+        start_time = time.time()
+        if lazy_explanation is None:
+            lazy_explanation = config.LAZY_EXPLANATIONS
+        snapshot = agent.snapshot    # the whole batch routes on one snapshot
+
+        keys = [" ".join(q.split()) for q in queries]
+        distinct = list(dict.fromkeys(keys))
+        results: Dict[str, Dict] = {}
+        self.stats = {"merged_candidates": 0}
+
+        # Decision memory first; only misses are planned
+        pending = []
+        groups: List[ContextGroup] = []
+        for query in distinct:
+            routing_result, memory_info = agent._recall(query, snapshot)
+            if routing_result is None:
+                pending.append((query, memory_info))
+            else:
+                results[query] = agent._package(query, routing_result, memory_info,
+                                                start_time, lazy_explanation, snapshot)
+
+        if pending:
+            print(f"  🌲 Retrieving context for {len(pending)} queries...")
+            groups = self.plan([q for q, _ in pending], snapshot)
+            misses = dict(pending)
+            group_of = {q: g for g in groups for q in g.queries}
+            print(f"  📦 {len(pending)} queries share {len(groups)} distinct contexts")
+
+            order = [q for q, _ in pending]
+            candidates = dict(zip(order, agent._candidate_actions_many(
+                order, [group_of[q].context for q in order],
+                [group_of[q].node_ids for q in order], snapshot,
+            )))
+
+            # One variant set per context group
+            router = agent.router
+            for group in groups:
+                group.variants = router.variant_generator.generate_variants(
+                    group.context, group.queries[0], n_variants=3, seed=group.seed
+                )
+
+            print("  🔀 Performing Contrastive Cognitive Routing...")
+            grids = self._score(order, group_of, candidates)
+            for query, grid in zip(order, grids):
+                group = group_of[query]
+                actions = candidates[query]
+                routing_result = router.select(
+                    {a: [grid[v][i] for v in range(len(grid))]
+                     for i, a in enumerate(actions)},
+                    group.variants,
+                )
+                agent._record(query, group.context, group.node_ids, group.seed,
+                              routing_result, snapshot)
+                results[query] = agent._package(query, routing_result,
+                                                misses[query], start_time,
+                                                lazy_explanation, snapshot,
+                                                group.retrieval_costs[query])
+
+        self.stats = {
+            **self.stats,
+            "queries": len(queries),
+            "distinct_queries": len(distinct),
+            "memory_hits": len(distinct) - len(pending),
+            "context_groups": len(groups),
+        }
+        return [results[key] for key in keys]
+
+    def _score(self, order: List[str], group_of: Dict[str, ContextGroup],
+               candidates: Dict[str, List[str]]) -> List[List[List[float]]]:
+        """
+        scores[query][variant][action] for every planned query. Only one
+        representative per cluster of near-duplicate candidates is scored.
+        """
+        router = self.agent.router
+        scorer = router.llm_scorer
+        clusters = {q: cluster_actions(candidates[q]) for q in order}
+        merged = sum(c.merged for c in clusters.values())
+        if merged:
+            print(f"  🔗 Merged {merged} near-duplicate candidate(s) before scoring")
+        self.stats["merged_candidates"] = merged
+
+        requests = [
+            (q, [v["context"] for v in group_of[q].variants],
+             clusters[q].representatives)
+            for q in order
+        ]
+        if hasattr(scorer, "score_grids"):
+            grids = scorer.score_grids(requests)
+        else:
+            grids = [
+                [scorer.score_actions(q, c, actions) for c in contexts]
+                for q, contexts, actions in requests
+            ]
+        return [
+            [clusters[q].expand(row) for row in grid]
+            for q, grid in zip(order, grids)
+        ]
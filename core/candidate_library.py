@@ -0,0 +1,278 @@
+"""
+Candidate action library — reuse mined candidates instead of generating.
+
+Recurring decision categories get near-identical candidate sets from the
+temperature-0.8 generation prompt. The library records every generated
+set under a key of
+
+    (query category, policy node_ids retrieved for the query)
+
+and counts how often each action (near-duplicate phrasings merged, see
+core/action_clustering.py) appears. A match is confident when the key
+has enough observations and the new query is similar (hashed bag of
+words, as in decision memory) to one of the queries the entry was
+learned from; `suggest` then returns the well-supported actions
+immediately and the generation call is skipped. Every REFRESH_EVERY-th
+hit returns None so the entry keeps learning from fresh generations.
+
+Queries that retrieve no policy nodes (cloud retrieval, the full-tree
+dump, identity-only hits) have no key: they are neither suggested for
+nor recorded, since one "<category>|" entry would cover every query of
+the category. Actions that quote amounts the query does not mention are
+never suggested.
+
+The category comes from keyword rules over the query (the categories of
+the evaluation suite, plus "general"); it only has to be consistent, not
+perfect, because the retrieved policy nodes are part of the key. Each
+entry also stores a digest of those nodes' text; when a policy is edited
+the entry stops matching and is rebuilt from fresh generations.
+
+Persisted as one JSON file:
+
+    {"<category>|POL-001,POL-004": {"category": ..., "policy_nodes": [...],
+                                    "policy_digest": "...",
+                                    "queries": ["Should we approve ...", ...],
+                                    "observations": 7, "hits": 12,
+                                    "actions": [["Approve with ...", 6], ...]}}
+
+Usage:
+    library = CandidateLibrary(config.CANDIDATE_LIBRARY_PATH)
+    actions = library.suggest(query, node_ids, node_hashes)     # None on a miss
+    if actions is None:
+        actions = generate(...)
+        library.observe(query, node_ids, actions, node_hashes)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import config
+from core.action_clustering import action_signature, action_similarity
+from core.decision_memory import query_vector
+
+# Keyword rules per category; the category with most hits wins
+CATEGORY_KEYWORDS = {
+    "financial_decision": ["$", "budget", "expenditure", "spend", "cost", "contract",
+                           "invest", "purchase", "price", "funding", "campaign"],
+    "data_security": ["data", "breach", "security", "access", "privacy", "password",
+                      "encrypt", "leak", "gdpr"],
+    "escalation": ["behind schedule", "delay", "blocking", "blocked", "conflict",
+                   "escalat", "deadline", "missed", "dispute"],
+    "ethics": ["conflict of interest", "consent", "ethic", "whistle", "harass",
+               "discriminat", "bribe", "fair", "misconduct"],
+    "policy_query": ["policy", "what is our", "what approval", "procedure", "rule",
+                     "guideline", "allowed", "required"],
+}
+
+_POLICY_NODE = re.compile(r"^POL-")
+_MAX_QUERIES = 20                      # example queries kept per entry
+
+
+def classify_query(query: str) -> str:
+    """Decision category of `query` by keyword hits ("general" if none)."""
+    text = query.lower()
+    best, best_hits = "general", 0
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        hits = sum(keyword in text for keyword in keywords)
+        if hits > best_hits:
+            best, best_hits = category, hits
+    return best
+
+
+class CandidateLibrary:
+
+    def __init__(self, path=None, min_observations: Optional[int] = None,
+                 min_support: Optional[float] = None,
+                 refresh_every: Optional[int] = None,
+                 query_similarity: Optional[float] = None):
+        self.path = Path(path) if path else None
+        self.min_observations = (config.CANDIDATE_LIBRARY_MIN_OBSERVATIONS
+                                 if min_observations is None else min_observations)
+        self.min_support = (config.CANDIDATE_LIBRARY_MIN_SUPPORT
+                            if min_support is None else min_support)
+        self.refresh_every = (config.CANDIDATE_LIBRARY_REFRESH_EVERY
+                              if refresh_every is None else refresh_every)
+        self.query_similarity = (config.CANDIDATE_LIBRARY_QUERY_SIMILARITY
+                                 if query_similarity is None else query_similarity)
+        self._entries: Dict[str, Dict] = {}
+        self._vectors: Dict[str, np.ndarray] = {}   # key → example query vectors
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def make_key(query: str, node_ids: Optional[List[str]]) -> Tuple[str, str, List[str]]:
+        """(key, category, policy node ids) for a query and its retrieval."""
+        category = classify_query(query)
+        policy_nodes = sorted({n for n in node_ids or [] if _POLICY_NODE.match(n)})
+        return f"{category}|{','.join(policy_nodes)}", category, policy_nodes
+
+    @staticmethod
+    def policy_digest(node_hashes: Optional[Dict[str, str]]) -> str:
+        """Digest of the policy node content hashes (see dependency_hashes)."""
+        items = sorted((n, h) for n, h in (node_hashes or {}).items()
+                       if _POLICY_NODE.match(n))
+        return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()[:12]
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def suggest(self, query: str, node_ids: Optional[List[str]],
+                node_hashes: Optional[Dict[str, str]] = None,
+                max_actions: int = 5) -> Optional[List[str]]:
+        """
+        Library candidates for a confident match, else None. A match is
+        confident when the query retrieved policy nodes, the policy text
+        behind them is unchanged, the query is similar to one the entry
+        was learned from, and at least three actions (not quoting amounts
+        foreign to the query) appear in min_support of min_observations
+        or more generated sets.
+        """
+        key, _, policy_nodes = self.make_key(query, node_ids)
+        digest = self.policy_digest(node_hashes)
+        with self._lock:
+            entry = self._entries.get(key) if policy_nodes else None
+            if entry is not None and (entry.get("policy_digest") != digest
+                                      or not self._similar(key, entry, query)):
+                entry = None
+            numbers = set(action_signature(query)[2])
+            actions = [a for a in self._supported(entry)
+                       if set(action_signature(a)[2]) <= numbers] if entry else []
+            if len(actions) < 3:
+                self.misses += 1
+                return None
+            entry["hits"] += 1
+            if self.refresh_every and entry["hits"] % self.refresh_every == 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return actions[:max_actions]
+
+    def _supported(self, entry: Dict) -> List[str]:
+        n = entry["observations"]
+        if n < self.min_observations:
+            return []
+        ranked = sorted(entry["actions"], key=lambda a: -a[1])
+        return [action for action, count in ranked if count / n >= self.min_support]
+
+    def _similar(self, key: str, entry: Dict, query: str) -> bool:
+        """True when `query` resembles one of the entry's example queries."""
+        queries = entry.get("queries") or []
+        if not queries:
+            return False
+        vectors = self._vectors.get(key)
+        if vectors is None or len(vectors) != len(queries):
+            vectors = self._vectors[key] = np.stack([query_vector(q) for q in queries])
+        return float((vectors @ query_vector(query)).max()) >= self.query_similarity
+
+    # ── Mining ───────────────────────────────────────────────────────────────
+
+    def observe(self, query: str, node_ids: Optional[List[str]],
+                actions: List[str], node_hashes: Optional[Dict[str, str]] = None,
+                save: bool = True):
+        """Record one generated candidate set (ignored without policy nodes)."""
+        key, category, policy_nodes = self.make_key(query, node_ids)
+        if not actions or not policy_nodes:
+            return
+        digest = self.policy_digest(node_hashes)
+        threshold = config.ACTION_DEDUP_THRESHOLD
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.get("policy_digest") != digest:
+                entry = self._entries[key] = {
+                    "category": category, "policy_nodes": policy_nodes,
+                    "policy_digest": digest, "queries": [],
+                    "observations": 0, "hits": 0, "actions": [],
+                }
+                self._vectors.pop(key, None)
+            queries = entry.setdefault("queries", [])
+            if query not in queries:
+                queries.append(query)
+                del queries[:-_MAX_QUERIES]
+                self._vectors.pop(key, None)
+            entry["observations"] += 1
+            signatures = [action_signature(a) for a, _ in entry["actions"]]
+            seen = set()
+            for action in actions:
+                signature = action_signature(action)
+                match = next(
+                    (i for i, (known, _) in enumerate(entry["actions"])
+                     if known == action or (
+                         threshold is not None
+                         and action_similarity(signature, signatures[i]) >= threshold)),
+                    None,
+                )
+                if match is None:
+                    entry["actions"].append([action, 0])
+                    signatures.append(signature)
+                    match = len(entry["actions"]) - 1
+                if match not in seen:           # once per generated set
+                    entry["actions"][match][1] += 1
+                    seen.add(match)
+        if save:
+            self.save()
+
+    def mine(self, records: Iterable[Dict]) -> int:
+        """
+        Bootstrap from past decisions (decision-memory records or any dicts
+        with "query", "actions" and optionally "node_ids" / "node_hashes").
+        Records should be in chronological order: a policy edit between
+        two records restarts the entry. Returns the number of records used.
+        """
+        n = 0
+        for record in records:
+            if record.get("query") and record.get("actions"):
+                self.observe(record["query"], record.get("node_ids"),
+                             list(record["actions"]), record.get("node_hashes"),
+                             save=False)
+                n += 1
+        self.save()
+        return n
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(str(self.path), "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  Candidate library unreadable ({e}) — starting empty")
+            self._entries = {}
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            payload = json.dumps(self._entries, ensure_ascii=False, indent=1)
+        with self._save_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            os.replace(str(tmp), str(self.path))
+
+    def summary(self) -> Dict[str, Dict]:
+        """key → {category, policy_nodes, observations, hits, confident actions}"""
+        with self._lock:
+            return {
+                key: {
+                    "category": e["category"],
+                    "policy_nodes": e["policy_nodes"],
+                    "observations": e["observations"],
+                    "hits": e["hits"],
+                    "actions": self._supported(e),
+                }
+                for key, e in self._entries.items()
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
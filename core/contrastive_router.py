@@ -1,35 +1,267 @@
-import numpy as np
-from typing import List, Dict, Tuple
-from dataclasses import dataclass
+import hashlib
 import sys
-import os
+import threading
+import numpy as np
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Optional, Tuple, Union
+
+from core.action_clustering import ActionClusters, cluster_actions
+from core.epistemic_variants import EpistemicVariantGenerator, VariantContext
+
+
+class VariantInfo:
+    """
+    Compact epistemic variant record. The context (a string or a lazy
+    VariantContext) is held by reference, never copied;
+    `release_context()` keeps only its hash.
+    """
+    __slots__ = ('id', 'strategy', 'degradation_level', 'epistemic_distance',
+                 'context', 'context_hash')
+
+    def __init__(self, id: str, strategy: str,
+                 context: Union[str, VariantContext, None] = None,
+                 degradation_level: float = 0.0, epistemic_distance: float = 0.0,
+                 context_hash: Optional[str] = None):
+        self.id = sys.intern(id)
+        self.strategy = sys.intern(strategy)
+        self.context = context
+        self.degradation_level = float(degradation_level)
+        self.epistemic_distance = float(epistemic_distance)
+        self.context_hash = context_hash
+
+    @classmethod
+    def from_dict(cls, variant: Dict) -> 'VariantInfo':
+        released = 'context_hash' in variant and not variant.get('context')
+        return cls(
+            variant.get('id', ''), variant.get('strategy', ''),
+            None if released else variant.get('context'),
+            variant.get('degradation_level', 0.0),
+            variant.get('epistemic_distance', 0.0),
+            variant.get('context_hash'),
+        )
 
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    def release_context(self):
+        if self.context is not None:
+            text = str(self.context)
+            self.context_hash = hashlib.sha256(text.encode()).hexdigest()[:16]
+            self.context = None
+
+    def to_dict(self, materialize: bool = True) -> Dict:
+        """Plain dict; with `materialize=False` a lazy context stays lazy."""
+        if self.context is None:
+            context = ''
+        else:
+            context = str(self.context) if materialize else self.context
+        variant = {
+            'id': self.id,
+            'strategy': self.strategy,
+            'context': context,
+            'degradation_level': self.degradation_level,
+            'epistemic_distance': self.epistemic_distance,
+        }
+        if self.context is None and self.context_hash is not None:
+            variant['context_hash'] = self.context_hash
+        return variant
 
-from core.epistemic_variants import EpistemicVariantGenerator
 
-@dataclass
 class RoutingResult:
-    selected_action: str
-    action_scores: Dict[str, Dict]
-    epistemic_variants: List[Dict]
-    robustness_score: float
-    epistemic_variance: float
-    worst_case_score: float
+    """
+    Outcome of one routing: a float32 action × variant score matrix plus
+    the selected row. Per-action DRO statistics are derived on access.
+
+    Cells an action was not scored on (re-validation scores only the top
+    actions on the extra column) are NaN and ignored by the statistics.
+
+    `action_scores` / `epistemic_variants` / `to_dict()` give the dict
+    view older callers expect; `from_dict()` rebuilds the result from it.
+    Exported scores are the shortest decimals that round-trip to the
+    stored float32 values (0.7, not 0.699999988), and the statistics are
+    computed from them, once per result.
+    """
+    __slots__ = ('actions', 'scores', 'variants', 'selected_index', 'variance_penalty',
+                 '_stats')
+
+    def __init__(self, actions, scores, variants, selected_index: int,
+                 variance_penalty: float):
+        self.actions: Tuple[str, ...] = tuple(sys.intern(a) for a in actions)
+        self.scores: np.ndarray = np.asarray(scores, dtype=np.float32)
+        self.variants: Tuple[VariantInfo, ...] = tuple(
+            v if isinstance(v, VariantInfo) else VariantInfo.from_dict(v)
+            for v in variants
+        )
+        self.selected_index = int(selected_index)
+        self.variance_penalty = variance_penalty
+        self._stats: Optional[List[Dict]] = None
+
+    # ── Derived statistics ───────────────────────────────────────────────────
+
+    def _row_stats(self, row: np.ndarray) -> Dict:
+        scores = np.asarray(_decimals(row[~np.isnan(row)]))
+        min_score = float(np.min(scores))
+        variance = float(np.var(scores))
+        return {
+            'dro_score': min_score - self.variance_penalty * variance,
+            'min_score': min_score,
+            'mean_score': float(np.mean(scores)),
+            'variance': variance,
+            'scores': scores.tolist(),
+        }
+
+    def _all_stats(self) -> List[Dict]:
+        """Per-row statistics, computed on first access and kept."""
+        if self._stats is None:
+            self._stats = [self._row_stats(row) for row in self.scores]
+        return self._stats
+
+    def score_rows(self) -> List[List[float]]:
+        """The score matrix as lists of exported decimals (NaN where unscored)."""
+        return [_decimals(row) for row in self.scores]
+
+    @property
+    def selected_action(self) -> str:
+        return self.actions[self.selected_index]
+
+    @property
+    def worst_case_score(self) -> float:
+        return self._all_stats()[self.selected_index]['min_score']
+
+    @property
+    def epistemic_variance(self) -> float:
+        return self._all_stats()[self.selected_index]['variance']
+
+    @property
+    def robustness_score(self) -> float:
+        stats = self._all_stats()[self.selected_index]
+        return ContrastiveCognitiveRouter._calculate_robustness(stats)
+
+    @property
+    def action_scores(self) -> Dict[str, Dict]:
+        """{action: {dro_score, min_score, mean_score, variance, scores}}"""
+        return {a: dict(stats, scores=list(stats['scores']))
+                for a, stats in zip(self.actions, self._all_stats())}
+
+    @property
+    def epistemic_variants(self) -> List[Dict]:
+        """Variant dicts; contexts are not materialized (slice them)."""
+        return [v.to_dict(materialize=False) for v in self.variants]
+
+    def release_contexts(self):
+        """Drop the variant context strings, keeping their hashes."""
+        for variant in self.variants:
+            variant.release_context()
+
+    # ── Dict view ────────────────────────────────────────────────────────────
+
+    def to_dict(self) -> Dict:
+        return {
+            'selected_action': self.selected_action,
+            'action_scores': self.action_scores,
+            'epistemic_variants': [v.to_dict() for v in self.variants],
+            'robustness_score': self.robustness_score,
+            'epistemic_variance': self.epistemic_variance,
+            'worst_case_score': self.worst_case_score,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict,
+                  variance_penalty: Optional[float] = None) -> 'RoutingResult':
+        actions = list(data['action_scores'])
+        rows = [data['action_scores'][a]['scores'] for a in actions]
+        if variance_penalty is None:
+            variance_penalty = ContrastiveCognitiveRouter.VARIANCE_PENALTY
+        return cls(actions, _pad_rows(rows), data['epistemic_variants'],
+                   actions.index(data['selected_action']), variance_penalty)
+
+    def __repr__(self):
+        return (f"RoutingResult(selected_action={self.selected_action!r}, "
+                f"scores={self.scores.shape[0]}x{self.scores.shape[1]}, "
+                f"robustness_score={self.robustness_score:.3f})")
+
+
+def _decimals(values: np.ndarray) -> List[float]:
+    """float32 values as the shortest decimals that round-trip to them."""
+    return [float(str(v)) for v in values]
+
+
+def _pad_rows(rows: List[List[float]]) -> np.ndarray:
+    """Ragged score rows → float32 matrix, NaN where a row is short."""
+    width = max((len(r) for r in rows), default=0)
+    matrix = np.full((len(rows), width), np.nan, dtype=np.float32)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+class SpeculativeRoute:
+    """
+    A routing answered early. `provisional` is the DRO selection over the
+    first variant alone; the remaining variants are scored in the
+    background and `result()` returns the full-grid RoutingResult.
+
+    `held` is True when the full grid selected the provisional action
+    (None while refinement is running). Update callbacks fire only when
+    the selection changed.
+    """
+
+    def __init__(self, provisional: RoutingResult):
+        self.provisional = provisional
+        self.held: Optional[bool] = None
+        self._final: Future = Future()
+        self._callbacks: List[Callable[[RoutingResult], None]] = []
+        self._lock = threading.Lock()
+
+    def result(self, timeout: Optional[float] = None) -> RoutingResult:
+        """Full-grid result (blocks until refinement finishes)."""
+        return self._final.result(timeout)
+
+    def done(self) -> bool:
+        return self._final.done()
+
+    @property
+    def future(self) -> Future:
+        return self._final
+
+    def on_update(self, callback: Callable[[RoutingResult], None]):
+        """Call `callback(final)` if the full grid selects another action."""
+        with self._lock:
+            if not self._final.done():
+                self._callbacks.append(callback)
+                return
+        if self.held is False:
+            callback(self._final.result())
+
+    def _resolve(self, final: RoutingResult):
+        with self._lock:
+            self.held = final.selected_action == self.provisional.selected_action
+            callbacks = [] if self.held else list(self._callbacks)
+            self._final.set_result(final)
+        for callback in callbacks:
+            try:
+                callback(final)
+            except Exception as e:
+                print(f"  ⚠️  Speculative update callback failed: {e}")
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self._final.set_exception(error)
+
 
 class ContrastiveCognitiveRouter:
     """
     Implements Contrastive Cognitive Routing (CCR)
     a* = arg max_a min_{C' ∈ E(C)} P(a | x, C')
     """
+
+    # λ in the DRO objective: min_score − λ·variance
+    VARIANCE_PENALTY = 0.3
     
     def __init__(self, llm_scorer):
         self.llm_scorer = llm_scorer
         self.variant_generator = EpistemicVariantGenerator()
     
     def route(self, query: str, context: str, 
-              candidate_actions: List[str]) -> RoutingResult:
+              candidate_actions: List[str],
+              seed: Optional[int] = None,
+              n_variants: int = 3) -> RoutingResult:
         """
         Perform contrastive cognitive routing
         
@@ -37,6 +269,8 @@ class ContrastiveCognitiveRouter:
             query (x): User query
             context (C): Original context
             candidate_actions: Possible actions [a1, a2, ..., an]
+            seed: Optional seed making the epistemic variants reproducible
+            n_variants: Number of epistemic variants |E(C)|
         
         Returns:
             RoutingResult with selected action and analysis
@@ -44,75 +278,137 @@ class ContrastiveCognitiveRouter:
         
         # Step 1: Generate epistemic variants E(C)
         epistemic_variants = self.variant_generator.generate_variants(
-            context, query, n_variants=3
+            context, query, n_variants=n_variants, seed=seed
         )
         
-        # Step 2: Score each action across all variants
+        # Step 2: Score each action across all variants (near-duplicate
+        # candidates share their representative's scores)
         action_scores = self._score_actions_across_variants(
-            query, candidate_actions, epistemic_variants
+            query, candidate_actions, epistemic_variants,
+            self._cluster(candidate_actions)
         )
         
+        # Steps 3-5: DRO selection over the score grid
+        return self.select(
+            {action: scores['variant_scores']
+             for action, scores in action_scores.items()},
+            epistemic_variants,
+        )
+
+    def route_speculative(self, query: str, context: str,
+                          candidate_actions: List[str],
+                          seed: Optional[int] = None,
+                          n_variants: int = 3) -> SpeculativeRoute:
+        """
+        Like `route`, but returns once the first variant has been scored on
+        every action. The provisional selection is DRO over that column;
+        the other variants are scored on a background thread and the full
+        result (identical to `route` with the same seed) resolves the
+        returned SpeculativeRoute.
+        """
+        epistemic_variants = self.variant_generator.generate_variants(
+            context, query, n_variants=n_variants, seed=seed
+        )
+        clusters = self._cluster(candidate_actions)
+        first = self._score_actions_across_variants(
+            query, candidate_actions, epistemic_variants[:1], clusters
+        )
+        first_scores = {a: s['variant_scores'] for a, s in first.items()}
+        speculation = SpeculativeRoute(
+            self.select(first_scores, epistemic_variants[:1])
+        )
+
+        def _refine():
+            try:
+                rest = self._score_actions_across_variants(
+                    query, candidate_actions, epistemic_variants[1:], clusters
+                ) if len(epistemic_variants) > 1 else {}
+                speculation._resolve(self.select(
+                    {a: first_scores[a] + rest.get(a, {}).get('variant_scores', [])
+                     for a in candidate_actions},
+                    epistemic_variants,
+                ))
+            except Exception as e:
+                speculation._fail(e)
+
+        threading.Thread(target=_refine, name="ccr-refine", daemon=True).start()
+        return speculation
+
+    def select(self, variant_scores: Dict[str, List[float]],
+               epistemic_variants: List[Dict]) -> RoutingResult:
+        """
+        Apply DRO to an already scored grid {action: [score per variant]}.
+        Also used to rebuild results from stored score matrices.
+        """
         # Step 3: Apply Distributionally Robust Optimization (DRO)
         # a* = arg max_a min_{C' ∈ E(C)} P(a | x, C')
-        dro_scores = {}
-        for action, scores in action_scores.items():
-            min_score = np.min(scores['variant_scores'])
-            variance = np.var(scores['variant_scores'])
-            
-            # DRO objective: maximize worst-case, penalize variance
-            dro_score = min_score - (0.3 * variance)  # Penalize instability
-            
-            dro_scores[action] = {
-                'dro_score': dro_score,
-                'min_score': min_score,
-                'mean_score': np.mean(scores['variant_scores']),
-                'variance': variance,
-                'scores': scores['variant_scores']
-            }
-        
+        actions = list(variant_scores)
+        matrix = _pad_rows([variant_scores[a] for a in actions])
+        values = matrix.astype(np.float64)
+        min_scores = np.nanmin(values, axis=1)
+        variances = np.nanvar(values, axis=1)
+
+        # DRO objective: maximize worst-case, penalize variance
+        dro_scores = min_scores - self.VARIANCE_PENALTY * variances  # Penalize instability
+
         # Step 4: Select action with highest DRO score
-        selected_action = max(dro_scores.items(), 
-                            key=lambda x: x[1]['dro_score'])[0]
-        
-        # Step 5: Calculate robustness metrics
-        robustness_score = self._calculate_robustness(
-            dro_scores[selected_action]
-        )
-        
+        # (Step 5, robustness metrics, are derived by RoutingResult)
         return RoutingResult(
-            selected_action=selected_action,
-            action_scores=dro_scores,
-            epistemic_variants=epistemic_variants,
-            robustness_score=robustness_score,
-            epistemic_variance=dro_scores[selected_action]['variance'],
-            worst_case_score=dro_scores[selected_action]['min_score']
+            actions=actions,
+            scores=matrix,
+            variants=epistemic_variants,
+            selected_index=int(np.argmax(dro_scores)),
+            variance_penalty=self.VARIANCE_PENALTY,
         )
     
+    @staticmethod
+    def _cluster(actions: List[str]) -> ActionClusters:
+        clusters = cluster_actions(actions)
+        if clusters.merged:
+            print(f"  🔗 Merged {clusters.merged} near-duplicate candidate(s) "
+                  f"before scoring ({len(clusters.representatives)} scored)")
+        return clusters
+
     def _score_actions_across_variants(self, query: str, 
                                       actions: List[str],
-                                      variants: List[Dict]) -> Dict:
+                                      variants: List[Dict],
+                                      clusters: Optional[ActionClusters] = None) -> Dict:
         """
         Score each action across all epistemic variants
         Returns P(a | x, C') for each action and variant
+
+        Only cluster representatives are scored; members of a cluster of
+        near-duplicates get their representative's scores.
         """
+        if clusters is None:
+            clusters = cluster_actions(actions)
+        representatives = clusters.representatives
         action_scores = {action: {'variant_scores': []} 
                         for action in actions}
+
+        contexts = [variant['context'] for variant in variants]
+        if hasattr(self.llm_scorer, 'score_grid'):
+            # Whole action × variant grid in one batch (parallel backends)
+            grid = self.llm_scorer.score_grid(query, contexts, representatives)
+        else:
+            grid = [self.llm_scorer.score_actions(query, c, representatives)
+                    for c in contexts]
         
-        for variant in variants:
-            variant_context = variant['context']
-            
-            # Score all actions for this variant
-            variant_scores = self.llm_scorer.score_actions(
-                query, variant_context, actions
-            )
-            
+        # One row per distinct action string (first occurrence)
+        first = {}
+        for i, action in enumerate(actions):
+            first.setdefault(action, i)
+
+        for variant_scores in grid:
             # Store scores
-            for action, score in zip(actions, variant_scores):
-                action_scores[action]['variant_scores'].append(score)
+            expanded = clusters.expand(variant_scores)
+            for action, i in first.items():
+                action_scores[action]['variant_scores'].append(expanded[i])
         
         return action_scores
     
-    def _calculate_robustness(self, action_scores: Dict) -> float:
+    @staticmethod
+    def _calculate_robustness(action_scores: Dict) -> float:
         """
         Calculate robustness score for an action
         Higher = more robust across epistemic variants
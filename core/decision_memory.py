@@ -0,0 +1,178 @@
+"""
+Decision memory — past routing decisions with near-duplicate lookup.
+
+Each record keeps the query, a fingerprint of the document corpus it was
+routed against, the retrieved context, the candidate actions, the full
+action × variant score matrix and the selected action. Incoming queries
+are matched against stored ones by cosine similarity of hashed word and
+character-trigram features; only records with the same corpus fingerprint,
+the same numbers in the query (amounts, durations) and the same negation
+and ordering words ("approve" vs "not approve", "before" vs "after") are
+eligible, with the guards candidate clustering uses.
+
+On-disk layout (no pickle):
+
+    <path>/records.jsonl   one JSON record per line
+    <path>/vectors.f4      float32 feature rows, one per record
+
+The store keeps at most `max_items` records; older ones are dropped when
+the files are compacted.
+"""
+
+import json
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.action_clustering import action_signature
+
+VECTOR_DIM = 512
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d[\d,.]*")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def _numbers(text: str) -> List[str]:
+    return sorted(n.rstrip(".,").replace(",", "") for n in _NUMBER_RE.findall(text))
+
+
+def _markers(text: str) -> Tuple[bool, frozenset]:
+    """(negated?, ordering words) — the decision-flipping words of a query."""
+    _, negated, _, ordering = action_signature(text)
+    return negated, ordering
+
+
+def query_vector(text: str) -> np.ndarray:
+    """
+    L2-normalized hashed bag of words + character trigrams. Uses crc32 so
+    vectors are stable across processes and can be persisted.
+    """
+    norm = _normalize(text)
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    features = norm.split() + [norm[i:i + 3] for i in range(max(0, len(norm) - 2))]
+    for feat in features:
+        vec[zlib.crc32(feat.encode("utf-8")) % VECTOR_DIM] += 1.0
+    n = np.linalg.norm(vec)
+    return vec / n if n else vec
+
+
+class DecisionMemory:
+
+    def __init__(self, path, max_items: int = 100,
+                 similarity_threshold: float = 0.92):
+        self.path = Path(path)
+        self.max_items = max_items
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self.records: List[Dict] = []
+        self._vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self._load()
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    @property
+    def _records_path(self) -> Path:
+        return self.path / "records.jsonl"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.path / "vectors.f4"
+
+    def _load(self):
+        if not self._records_path.exists():
+            return
+        with open(str(self._records_path), "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size:
+            vectors = np.fromfile(str(self._vectors_path), dtype=np.float32)
+            vectors = vectors.reshape(-1, VECTOR_DIM)
+        if len(vectors) != len(records):
+            # Vectors are derived data — rebuild them if the files disagree
+            vectors = np.stack([query_vector(r["query"]) for r in records]) \
+                if records else vectors
+        self.records = records
+        self._vectors = vectors
+
+    def _compact(self):
+        """Rewrite both files keeping only the newest `max_items` records."""
+        self.records = self.records[-self.max_items:]
+        self._vectors = self._vectors[-self.max_items:]
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(str(self._records_path), "w", encoding="utf-8") as f:
+            for r in self.records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        self._vectors.astype(np.float32).tofile(str(self._vectors_path))
+
+    def save(self):
+        """Rewrite both files, e.g. after records were updated in place."""
+        with self._lock:
+            self._compact()
+
+    # ── Write ────────────────────────────────────────────────────────────────
+
+    def add(self, query: str, fingerprint: str, context: str,
+            actions: List[str], score_matrix: List[List[float]],
+            selected_action: str, variants: List[Dict], **extra) -> Dict:
+        """Append one routed decision. `score_matrix[a][v]` per action/variant."""
+        record = {
+            "query": query,
+            "numbers": _numbers(query),
+            "fingerprint": fingerprint,
+            "context": context,
+            "actions": list(actions),
+            "score_matrix": [[float(s) for s in row] for row in score_matrix],
+            "selected_action": selected_action,
+            "variants": [
+                {k: v for k, v in variant.items() if k != "context"}
+                for variant in variants
+            ],
+            "created_at": time.time(),
+            **extra,
+        }
+        vec = query_vector(query)
+        with self._lock:
+            self.records.append(record)
+            self._vectors = np.vstack([self._vectors, vec[None, :]])
+            if len(self.records) > self.max_items:
+                self._compact()
+            else:
+                self.path.mkdir(parents=True, exist_ok=True)
+                with open(str(self._records_path), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                with open(str(self._vectors_path), "ab") as f:
+                    vec.astype(np.float32).tofile(f)
+        return record
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def lookup(self, query: str, fingerprint: str) -> Optional[Tuple[Dict, float]]:
+        """Most similar eligible record and its similarity, or None."""
+        with self._lock:
+            if not self.records:
+                return None
+            sims = self._vectors @ query_vector(query)
+            numbers = _numbers(query)
+            markers = _markers(query)
+            best, best_sim = None, self.similarity_threshold
+            for i in np.argsort(-sims):
+                if sims[i] < best_sim:
+                    break
+                record = self.records[i]
+                if (record["fingerprint"] == fingerprint
+                        and record["numbers"] == numbers
+                        and _markers(record["query"]) == markers):
+                    best, best_sim = record, float(sims[i])
+                    break
+        return (best, best_sim) if best is not None else None
+
+    def __len__(self) -> int:
+        return len(self.records)
@@ -1,6 +1,132 @@
 import numpy as np
-from typing import List, Dict, Callable
+import re
+from itertools import islice
+from typing import List, Dict, Callable, Optional, Tuple
 import random
+import threading
+
+_WORD = re.compile(r'\S+')
+
+
+def _word_count(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """Whitespace-separated words in text[start:end], without slicing it."""
+    end = len(text) if end is None else end
+    return sum(1 for _ in _WORD.finditer(text, start, end))
+
+
+class VariantContext:
+    """
+    Epistemic variant held as a reference to the base context plus edits.
+
+    `pieces` are (start, end) slices of `base` or inserted literal strings.
+    The variant text is only built when it is needed, and `variant[:n]`
+    builds just the first n characters — scoring prompts only show a short
+    leading window, so most variants are never materialized in full.
+    """
+    __slots__ = ('base', 'pieces')
+
+    def __init__(self, base: str, pieces: Optional[Tuple] = None):
+        self.base = base
+        self.pieces = tuple(pieces) if pieces is not None else ((0, len(base)),)
+
+    @classmethod
+    def appended(cls, base: str, text: str) -> 'VariantContext':
+        return cls(base, ((0, len(base)), text))
+
+    def __len__(self) -> int:
+        return sum(p[1] - p[0] if isinstance(p, tuple) else len(p)
+                   for p in self.pieces)
+
+    def materialize(self, limit: Optional[int] = None) -> str:
+        """The variant text, or only its first `limit` characters."""
+        out = []
+        remaining = limit
+        for piece in self.pieces:
+            if remaining is not None and remaining <= 0:
+                break
+            if isinstance(piece, tuple):
+                start, end = piece
+                if remaining is not None:
+                    end = min(end, start + remaining)
+                segment = self.base[start:end]
+            else:
+                segment = piece if remaining is None else piece[:remaining]
+            out.append(segment)
+            if remaining is not None:
+                remaining -= len(segment)
+        return ''.join(out)
+
+    def __str__(self) -> str:
+        return self.materialize()
+
+    def __getitem__(self, key):
+        if (isinstance(key, slice) and not key.start and key.step in (None, 1)
+                and key.stop is not None and key.stop >= 0):
+            return self.materialize(key.stop)
+        return self.materialize()[key]
+
+    def __repr__(self):
+        return f"VariantContext(len={len(self)}, pieces={len(self.pieces)})"
+
+    # ── Cheap statistics ─────────────────────────────────────────────────────
+
+    def _edges(self, piece) -> Tuple[bool, bool]:
+        """(starts with a word character, ends with one) for a non-empty piece."""
+        if isinstance(piece, tuple):
+            first, last = self.base[piece[0]], self.base[piece[1] - 1]
+        else:
+            first, last = piece[0], piece[-1]
+        return not first.isspace(), not last.isspace()
+
+    def word_count(self, base_words: Optional[int] = None) -> int:
+        """
+        Words in the variant, as `split()` would count them. With
+        `base_words` (the word count of the whole base) only the parts of
+        the base the variant leaves out are scanned.
+        """
+        base = self.base
+        slices = [p for p in self.pieces if isinstance(p, tuple) and p[0] < p[1]]
+        if base_words is not None and all(a[1] <= b[0] for a, b in zip(slices, slices[1:])):
+            # Each base word lies in a slice or a gap between slices; a
+            # word cut by a slice edge is counted on both sides of it
+            gaps, pos = [], 0
+            for start, end in slices:
+                if start > pos:
+                    gaps.append((pos, start))
+                pos = end
+            if pos < len(base):
+                gaps.append((pos, len(base)))
+            cuts = {p for piece in slices for p in piece if 0 < p < len(base)}
+            straddles = sum(1 for p in cuts
+                            if not base[p - 1].isspace() and not base[p].isspace())
+            count = base_words + straddles - sum(_word_count(base, *g) for g in gaps)
+        else:
+            count = sum(_word_count(base, *piece) for piece in slices)
+        count += sum(_word_count(p) for p in self.pieces if isinstance(p, str))
+
+        # A word split across two pieces of the variant counts once
+        previous_ends_in_word = False
+        for piece in self.pieces:
+            if (piece[0] >= piece[1]) if isinstance(piece, tuple) else not piece:
+                continue
+            starts_in_word, ends_in_word = self._edges(piece)
+            if previous_ends_in_word and starts_in_word:
+                count -= 1
+            previous_ends_in_word = ends_in_word
+        return count
+
+    def head_words(self, n: int) -> List[str]:
+        """First `n` words, materializing only a leading window."""
+        window = 512
+        while True:
+            head = self.materialize(window)
+            words = head.split()
+            if len(head) < window:
+                return words[:n]
+            if len(words) > n:
+                return words[:n]
+            window *= 2
+
 
 class EpistemicVariantGenerator:
     """
@@ -16,44 +142,89 @@ class EpistemicVariantGenerator:
             self._perspective_shift,
             self._noisy_information
         ]
+        self._local = threading.local()
+
+    @property
+    def _rng(self):
+        """Per-thread RNG; the global `random` module unless seeded."""
+        return getattr(self._local, "rng", random)
+
+    def _base_word_count(self, context: str) -> int:
+        """Word count of `context`, computed once per generate_variants call."""
+        cached = getattr(self._local, "words", None)
+        if cached is None or cached[0] is not context:
+            cached = (context, _word_count(context))
+            self._local.words = cached
+        return cached[1]
     
-    def generate_variants(self, context: str, query: str, n_variants: int = 3) -> List[Dict]:
+    def generate_variants(self, context: str, query: str, n_variants: int = 3,
+                          seed: Optional[int] = None) -> List[Dict]:
         """
         Generate n epistemic variants of the context
         Each variant represents a different 'possible world'
+
+        Each variant's 'context' is a VariantContext over `context` (slice
+        it or str() it for text). With `seed` the variants are reproducible
+        for the same context.
         """
+        self._local.rng = random.Random(seed) if seed is not None else random
+        self._local.words = None
         variants = []
+        base_words = self._base_word_count(context)
+        base_head = set(w.lower() for w in VariantContext(context).head_words(50))
         
         for i in range(n_variants):
             strategy = self.variant_strategies[i % len(self.variant_strategies)]
             variant = strategy(context, query)
+            if isinstance(variant, str):
+                variant = VariantContext(variant)
             
             variants.append({
                 'id': f'V{i+1}',
                 'strategy': strategy.__name__,
                 'context': variant,
-                'degradation_level': self._calculate_degradation(context, variant),
-                'epistemic_distance': self._calculate_epistemic_distance(context, variant)
+                'degradation_level': self._calculate_degradation(base_words, variant),
+                'epistemic_distance': self._calculate_epistemic_distance(base_head, variant)
             })
         
+        self._local.words = None
         return variants
     
-    def _partial_information(self, context: str, query: str) -> str:
+    def _partial_information(self, context: str, query: str) -> VariantContext:
         """Remove 30-50% of key information"""
-        sentences = context.split('. ')
-        if len(sentences) <= 2:
-            return context
+        # Sentence spans of context.split('. '), as offsets
+        spans = []
+        start = 0
+        while True:
+            end = context.find('. ', start)
+            if end < 0:
+                spans.append((start, len(context)))
+                break
+            spans.append((start, end))
+            start = end + 2
+        if len(spans) <= 2:
+            return VariantContext(context)
         
         # Remove random sentences
-        n_to_remove = max(1, len(sentences) // 3)
-        indices_to_remove = random.sample(range(len(sentences)), n_to_remove)
-        
-        degraded = [sentences[i] for i in range(len(sentences)) 
-                   if i not in indices_to_remove]
+        n_to_remove = max(1, len(spans) // 3)
+        indices_to_remove = set(self._rng.sample(range(len(spans)), n_to_remove))
         
-        return '. '.join(degraded) + '.'
+        # Runs of kept sentences stay one slice of the base, '. '-joined
+        pieces = []
+        run_start = None
+        for i, (s, e) in enumerate(spans):
+            if i in indices_to_remove:
+                if run_start is not None:
+                    pieces.extend([(run_start, spans[i - 1][1]), '. '])
+                    run_start = None
+            elif run_start is None:
+                run_start = s
+        if run_start is not None:
+            pieces.extend([(run_start, spans[-1][1]), '. '])
+        pieces[-1] = '.'
+        return VariantContext(context, pieces)
     
-    def _contradictory_information(self, context: str, query: str) -> str:
+    def _contradictory_information(self, context: str, query: str) -> VariantContext:
         """Add subtle contradictions"""
         contradictions = [
             " Note: Some reports suggest the opposite.",
@@ -62,16 +233,18 @@ class EpistemicVariantGenerator:
             " This information may not be fully reliable."
         ]
         
-        if len(context.split()) > 50:
-            # Insert contradiction at random point
-            words = context.split()
-            insert_point = random.randint(len(words)//3, 2*len(words)//3)
-            words.insert(insert_point, random.choice(contradictions))
-            return ' '.join(words)
+        n_words = self._base_word_count(context)
+        if n_words > 50:
+            # Insert contradiction at random point (before that word)
+            insert_point = self._rng.randint(n_words//3, 2*n_words//3)
+            phrase = self._rng.choice(contradictions)
+            word = next(islice(_WORD.finditer(context), insert_point, None))
+            at = word.start()
+            return VariantContext(context, ((0, at), phrase[1:] + ' ', (at, len(context))))
         
-        return context + random.choice(contradictions)
+        return VariantContext.appended(context, self._rng.choice(contradictions))
     
-    def _temporal_shift(self, context: str, query: str) -> str:
+    def _temporal_shift(self, context: str, query: str) -> VariantContext:
         """Shift temporal perspective"""
         temporal_shifts = [
             " This situation occurred 6 months ago under different market conditions.",
@@ -79,9 +252,9 @@ class EpistemicVariantGenerator:
             " Historical context from last year suggests different outcomes."
         ]
         
-        return context + random.choice(temporal_shifts)
+        return VariantContext.appended(context, self._rng.choice(temporal_shifts))
     
-    def _perspective_shift(self, context: str, query: str) -> str:
+    def _perspective_shift(self, context: str, query: str) -> VariantContext:
         """Shift stakeholder perspective"""
         perspectives = [
             " From a financial perspective, the priorities differ.",
@@ -89,9 +262,9 @@ class EpistemicVariantGenerator:
             " Customer feedback suggests alternative interpretations."
         ]
         
-        return context + random.choice(perspectives)
+        return VariantContext.appended(context, self._rng.choice(perspectives))
     
-    def _noisy_information(self, context: str, query: str) -> str:
+    def _noisy_information(self, context: str, query: str) -> VariantContext:
         """Add irrelevant or misleading information"""
         noise_phrases = [
             " Unrelated data suggests other factors may be at play.",
@@ -99,13 +272,13 @@ class EpistemicVariantGenerator:
             " External market conditions introduce additional uncertainty."
         ]
         
-        return context + random.choice(noise_phrases)
+        return VariantContext.appended(context, self._rng.choice(noise_phrases))
     
-    def _calculate_degradation(self, original: str, variant: str) -> float:
+    def _calculate_degradation(self, base_words: int, variant: VariantContext) -> float:
         """Calculate information degradation level (0-1)"""
         # Simple heuristic based on length difference
-        orig_len = len(original.split())
-        var_len = len(variant.split())
+        orig_len = base_words
+        var_len = variant.word_count(base_words)
         
         if orig_len == 0:
             return 0.0
@@ -113,11 +286,11 @@ class EpistemicVariantGenerator:
         degradation = abs(orig_len - var_len) / orig_len
         return min(1.0, degradation)
     
-    def _calculate_epistemic_distance(self, original: str, variant: str) -> float:
+    def _calculate_epistemic_distance(self, orig_words: set,
+                                      variant: VariantContext) -> float:
         """Calculate epistemic distance between contexts"""
-        # Simple word overlap distance
-        orig_words = set(original.lower().split()[:50])
-        var_words = set(variant.lower().split()[:50])
+        # Simple word overlap distance over the first 50 words
+        var_words = set(w.lower() for w in variant.head_words(50))
         
         if not orig_words:
             return 0.0
@@ -129,4 +302,4 @@ class EpistemicVariantGenerator:
             return 1.0
         
         distance = 1.0 - (intersection / union)
-        return distance
\ No newline at end of file
+        return distance
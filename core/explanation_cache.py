@@ -0,0 +1,118 @@
+"""
+Explanation memo cache.
+
+The decision memo from `_generate_explanation` depends only on the query,
+the selected action, the robustness / worst-case / variance figures and
+the agent role. Memos are cached under a key built from those inputs, with
+the three scores rounded to `precision` decimals so near-identical routing
+outcomes share one memo.
+
+Two tiers:
+  - an in-memory LRU of `max_items` entries
+  - an optional persistent tier (stdlib `sqlite3`, WAL mode) that survives
+    restarts and refills the LRU on hits. Several processes (Streamlit, the
+    server, evaluation) can share it: readers never block, writers wait up
+    to `timeout` seconds, and a persistent-tier error degrades to a miss
+    instead of failing the query.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class ExplanationCache:
+
+    def __init__(self, max_items: int = 256, precision: int = 2, path=None,
+                 timeout: float = 5.0):
+        self.max_items = max_items
+        self.precision = precision
+        self.path = Path(path) if path else None
+        self.timeout = timeout
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Persistent tier, opened on first use (None = memory only)."""
+        if self._db is None and self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(str(self.path), timeout=self.timeout,
+                                     check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS memos "
+                           "(key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+                db.commit()
+                self._db = db
+            except sqlite3.Error as e:
+                print(f"  ⚠️  Explanation cache unavailable ({e}) — memory only")
+                self.path = None
+        return self._db
+
+    def make_key(self, query: str, action: str, robustness: float,
+                 worst_case: float, variance: float, role: str) -> str:
+        p = self.precision
+        payload = json.dumps([
+            " ".join(query.lower().split()),
+            action.strip(),
+            round(float(robustness), p),
+            round(float(worst_case), p),
+            round(float(variance), p),
+            role,
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+            db = self._connect()
+            if db is not None:
+                try:
+                    row = db.execute("SELECT text FROM memos WHERE key = ?",
+                                     (key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"  ⚠️  Explanation cache read failed: {e}")
+                    row = None
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._remember(key, text)
+            db = self._connect()
+            if db is not None:
+                try:
+                    with db:
+                        db.execute("INSERT OR REPLACE INTO memos (key, text) "
+                                   "VALUES (?, ?)", (key, text))
+                except sqlite3.Error as e:
+                    print(f"  ⚠️  Explanation cache write failed: {e}")
+
+    def _remember(self, key: str, text: str):
+        self._lru[key] = text
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._lru)
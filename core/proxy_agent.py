@@ -1,26 +1,81 @@
+import hashlib
 import json
+import math
+import threading
 import time
 import re
-from typing import Dict, List
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
-import os
-import sys
-
-# Add project root to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import config
 from core.epistemic_variants import EpistemicVariantGenerator
 from core.contrastive_router import ContrastiveCognitiveRouter, RoutingResult
+from core.candidate_library import CandidateLibrary
+from core.decision_memory import DecisionMemory
+from core.explanation_cache import ExplanationCache
+from core.score_archive import ScoreArchive
+from utils.model_client import ModelClient, PromptSession
+from utils.pageindex_retriever import LocalDocumentTree, PageIndexRetriever
+from utils.structured_output import ACTIONS_SCHEMA, SCORE_SCHEMA, actions_schema
+
+class QueryResult(dict):
+    """
+    Result dict of `process_query`.
+
+    With lazy explanations the "response" key is absent until first read
+    through `result["response"]` or `result.get("response")`, at which
+    point the decision memo is generated and stored.
+    """
+
+    def __init__(self, *args, response_factory=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._response_factory = response_factory
+
+    def __missing__(self, key):
+        if key == "response" and self._response_factory is not None:
+            factory, self._response_factory = self._response_factory, None
+            self["response"] = factory()
+            return self["response"]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class AgentSnapshot:
+    """
+    The identity and documents a query is routed against. A query pins
+    the agent's snapshot when it starts and uses it throughout, so a
+    reload never changes the documents under an in-flight query.
+
+    The document tree is built on first use from the snapshot's own source
+    bytes, sharing unchanged documents with the previous snapshot's tree.
+    """
 
-try:
-    from utils.model_client import ModelClient
-    from utils.pageindex_retriever import PageIndexRetriever
-    from config import config
-except ImportError:
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from utils.model_client import ModelClient
-    from utils.pageindex_retriever import PageIndexRetriever
-    from config import config
+    def __init__(self, version: int, sources: Dict[str, Optional[bytes]],
+                 identity: Dict, fingerprint: str,
+                 previous: Optional["AgentSnapshot"] = None):
+        self.version = version
+        self.sources = sources
+        self.identity = identity
+        self.fingerprint = fingerprint
+        self._previous = previous
+        self._tree: Optional[LocalDocumentTree] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tree(self) -> LocalDocumentTree:
+        if self._tree is None:
+            with self._lock:
+                if self._tree is None:
+                    previous = self._previous._tree if self._previous else None
+                    self._tree = LocalDocumentTree(self.sources, previous=previous)
+                    self._previous = None    # don't keep old snapshots alive
+        return self._tree
 
 
 class EpistemicProxyAgent:
@@ -32,15 +87,52 @@ class EpistemicProxyAgent:
     (identity.json + company_policies.json) using hierarchical tree search.
     """
 
-    def __init__(self):
-        self.model_client = ModelClient()
+    def __init__(self, model_client: Optional[ModelClient] = None,
+                 use_memory: Optional[bool] = None,
+                 use_archive: Optional[bool] = None,
+                 use_library: Optional[bool] = None):
+        self.model_client = model_client or ModelClient()
         self.variant_generator = EpistemicVariantGenerator()
         self.router = ContrastiveCognitiveRouter(self.LLMScorer(self.model_client))
 
         # ── PageIndex retriever (replaces flat _build_context) ───────────────
         self.retriever = PageIndexRetriever(model_client=self.model_client)
 
-        self.load_identity()
+        self.explanation_cache = (
+            ExplanationCache(
+                max_items=config.EXPLANATION_CACHE_SIZE,
+                precision=config.EXPLANATION_CACHE_PRECISION,
+                path=config.EXPLANATION_CACHE_PATH,
+            )
+            if config.EXPLANATION_CACHE_SIZE else None
+        )
+
+        if use_memory is None:
+            use_memory = config.MEMORY_ENABLED
+        self.memory = (
+            DecisionMemory(
+                config.MEMORY_PATH,
+                max_items=config.MAX_MEMORY_ITEMS,
+                similarity_threshold=config.MEMORY_SIMILARITY_THRESHOLD,
+            )
+            if use_memory else None
+        )
+
+        if use_archive is None:
+            use_archive = config.SCORE_ARCHIVE_ENABLED
+        self.score_archive = ScoreArchive(config.SCORE_ARCHIVE_PATH) if use_archive else None
+
+        if use_library is None:
+            use_library = config.CANDIDATE_LIBRARY_ENABLED
+        self.candidate_library = (
+            CandidateLibrary(config.CANDIDATE_LIBRARY_PATH) if use_library else None
+        )
+
+        self._reload_lock = threading.Lock()
+        self._snapshot = self._make_snapshot(LocalDocumentTree.read_sources())
+        if self.retriever._mode == "cloud":
+            # Warm the local fallback: it answers until cloud indexing finishes
+            self.retriever.use_tree(self._snapshot.tree)
 
         print(f"✅ Epistemic Proxy Agent initialized")
         print(f"   Method  : Contrastive Cognitive Routing (CCR)")
@@ -54,28 +146,116 @@ class EpistemicProxyAgent:
     class LLMScorer:
         """Wrapper to score actions using LLM."""
 
+        # Leading context characters shown in a scoring prompt
+        CONTEXT_CHARS = 300
+
         def __init__(self, model_client):
             self.model = model_client
 
+        @classmethod
+        def context_key(cls, context: str) -> str:
+            """Hash of the part of `context` a scoring prompt actually sees."""
+            visible = context[:cls.CONTEXT_CHARS]
+            return hashlib.sha1(visible.encode("utf-8")).hexdigest()[:12]
+
         def score_actions(self, query: str, context: str,
                           actions: List[str]) -> List[float]:
-            scores = []
-            for action in actions:
-                prompt = self._create_scoring_prompt(query, context, action)
-                response = self.model.generate(prompt, temperature=0.1, max_tokens=10)
-                score = self._extract_score(response)
-                scores.append(score)
+            return self.score_grid(query, [context], actions)[0]
+
+        def score_grid(self, query: str, contexts: List[str],
+                       actions: List[str]) -> List[List[float]]:
+            """
+            Score every action under every context in one batch.
+            Returns scores[context_idx][action_idx].
+            """
+            return self.score_grids([(query, contexts, actions)])[0]
+
+        def score_grids(self, grids) -> List[List[List[float]]]:
+            """
+            score_grid for several (query, contexts, actions) at once, so a
+            batch of queries goes to the model as one request batch.
+            """
+            cells = [(query, context, action)
+                     for query, contexts, actions in grids
+                     for context in contexts for action in actions]
+            if config.SCORING_MODE == "logprob" and self.model.supports_logprobs:
+                scores = self._logprob_scores(cells)
+            else:
+                scores = self._text_scores(cells)
+
+            out, pos = [], 0
+            for _query, contexts, actions in grids:
+                n = len(actions)
+                out.append([scores[pos + i * n:pos + (i + 1) * n]
+                            for i in range(len(contexts))])
+                pos += n * len(contexts)
+            return out
+
+        def _sessions(self, prefixes: List[str]) -> List:
+            """One shared-prefix session per distinct prefix (per variant)."""
+            by_prefix: Dict[str, PromptSession] = {}
+            for prefix in prefixes:
+                if prefix not in by_prefix:
+                    by_prefix[prefix] = self.model.session(prefix)
+            return [by_prefix[prefix] for prefix in prefixes]
+
+        def _text_scores(self, cells) -> List[float]:
+            """Scores the model writes out as text, one per (query, context, action)."""
+            sessions = self._sessions([self._scoring_prefix(q, c) for q, c, _ in cells])
+            suffixes = [self._scoring_suffix(a) for _, _, a in cells]
+            if config.STRUCTURED_OUTPUT:
+                # Schema-validated {"score": x}; unrepairable replies raise
+                # instead of silently becoming a neutral 0.5
+                values = self.model.generate_json_many(
+                    suffixes, SCORE_SCHEMA, temperature=0.1, sessions=sessions
+                )
+                scores = [float(v["score"]) for v in values]
+            else:
+                responses = self.model.generate_many(
+                    suffixes, temperature=0.1, max_tokens=10, sessions=sessions
+                )
+                scores = [self._extract_score(r) for r in responses]
             return scores
 
-        def _create_scoring_prompt(self, query: str, context: str,
-                                   action: str) -> str:
-            return f"""Given this context and query, rate how appropriate the action is.
+        def _logprob_scores(self, cells) -> List[float]:
+            """
+            P(a | x, C') read from the first-token distribution: the expected
+            0-9 rating, or P(Yes) against P(No). Cells whose top tokens carry
+            no mass on the answer tokens are scored as text instead.
+            """
+            task = "judge the proposed action"
+            sessions = self._sessions([self._scoring_prefix(q, c, task) for q, c, _ in cells])
+            suffixes = [self._logprob_suffix(a) for _, _, a in cells]
+            dists = self.model.next_token_logprobs_many(
+                suffixes, top_k=config.LOGPROB_TOP_K, sessions=sessions
+            )
+            scores = [self._score_from_logprobs(d) for d in dists]
+            missing = [i for i, s in enumerate(scores) if s is None]
+            if missing:
+                fallback = self._text_scores([cells[i] for i in missing])
+                for i, score in zip(missing, fallback):
+                    scores[i] = score
+            return scores
 
-Context: {context[:300]}
+        # Prompts are split into a per-variant prefix (shared by every
+        # action through a scoring session) and a per-action suffix
+
+        def _scoring_prefix(self, query: str, context: str,
+                            task: str = "rate how appropriate the action is") -> str:
+            return f"""Given this context and query, {task}.
+
+Context: {context[:self.CONTEXT_CHARS]}
 
 Query: {query}
 
-Proposed Action: {action}
+"""
+
+        def _scoring_suffix(self, action: str) -> str:
+            answer = (
+                'Return ONLY JSON: {"score": <number from 0.0 to 1.0>}'
+                if config.STRUCTURED_OUTPUT else "Return ONLY a number:"
+            )
+            return f"""Proposed Action: {action}
 
 Rate appropriateness on scale 0.0 to 1.0 where:
 0.0 = Completely inappropriate
@@ -83,7 +263,42 @@ Rate appropriateness on scale 0.0 to 1.0 where:
 1.0 = Perfectly appropriate
 
 Consider alignment with context and practical feasibility.
-Return ONLY a number:"""
+{answer}"""
+
+        def _logprob_suffix(self, action: str) -> str:
+            if config.LOGPROB_TARGET == "yesno":
+                answer = "Is the action appropriate? Answer Yes or No:"
+            else:
+                answer = ("Rate appropriateness from 0 (completely inappropriate) "
+                          "to 9 (perfectly appropriate). Answer with a single digit:")
+            return f"""Proposed Action: {action}
+
+Consider alignment with context and practical feasibility.
+{answer}"""
+
+        def _create_scoring_prompt(self, query: str, context: str,
+                                   action: str) -> str:
+            return self._scoring_prefix(query, context) + self._scoring_suffix(action)
+
+        @staticmethod
+        def _score_from_logprobs(logprobs: Optional[Dict[str, float]]) -> Optional[float]:
+            """Normalized probability mass over the answer tokens, or None."""
+            if not logprobs:
+                return None
+            mass: Dict[str, float] = {}
+            for token, lp in logprobs.items():
+                key = token.strip().lstrip("▁Ġ").lower()
+                mass[key] = mass.get(key, 0.0) + math.exp(lp)
+
+            if config.LOGPROB_TARGET == "yesno":
+                yes, no = mass.get("yes", 0.0), mass.get("no", 0.0)
+                return yes / (yes + no) if yes + no > 0 else None
+
+            digits = {d: mass.get(str(d), 0.0) for d in range(10)}
+            total = sum(digits.values())
+            if total <= 0:
+                return None
+            return sum(d * p for d, p in digits.items()) / (9.0 * total)
 
         def _extract_score(self, response: str) -> float:
             numbers = re.findall(r"[-+]?\d*\.\d+|\d+", response)
@@ -100,54 +315,356 @@ Return ONLY a number:"""
     # Identity
     # ─────────────────────────────────────────────────────────────────────────
 
-    def load_identity(self):
+    @staticmethod
+    def _parse_identity(raw: Optional[bytes]) -> Dict:
         try:
-            with open(str(config.IDENTITY_PATH), "r") as f:
-                self.identity = json.load(f)
+            if raw is None:
+                raise OSError(f"cannot read {config.IDENTITY_PATH}")
+            identity = json.loads(raw)
             print(f"  ✓ Loaded identity from {config.IDENTITY_PATH}")
+            return identity
         except Exception as e:
             print(f"  ⚠️  Error loading identity: {e}")
-            self.identity = {
+            return {
                 "role": "Chief of Staff",
                 "company_values": ["Integrity", "Innovation", "Customer Focus"],
             }
 
+    def _make_snapshot(self, sources: Dict[str, Optional[bytes]],
+                       previous: Optional[AgentSnapshot] = None) -> AgentSnapshot:
+        return AgentSnapshot(
+            version=previous.version + 1 if previous else 0,
+            sources=sources,
+            identity=self._parse_identity(sources.get("identity")),
+            fingerprint=self._corpus_fingerprint(sources),
+            previous=previous,
+        )
+
+    @property
+    def snapshot(self) -> AgentSnapshot:
+        return self._snapshot
+
+    @property
+    def identity(self) -> Dict:
+        return self._snapshot.identity
+
+    @property
+    def corpus_fingerprint(self) -> str:
+        return self._snapshot.fingerprint
+
+    def reload(self) -> Dict:
+        """
+        Hot-reload identity.json / company_policies.json from disk.
+
+        Builds a new snapshot (rebuilding only the document trees whose
+        files changed) and swaps it in atomically. Queries already running
+        finish on the old snapshot; model client, caches, memory and score
+        archive stay warm. Returns what changed.
+        """
+        with self._reload_lock:
+            old = self._snapshot
+            sources = LocalDocumentTree.read_sources()
+            changed = [doc for doc, raw in sources.items() if raw != old.sources.get(doc)]
+            if not changed:
+                return {"version": old.version, "changed": [], "rebuilt_trees": []}
+
+            snapshot = self._make_snapshot(sources, previous=old)
+            tree = snapshot.tree                       # build before the swap
+            self.retriever.use_tree(tree)              # cloud: re-index changed docs
+            self._snapshot = snapshot
+        rebuilt = list(tree.rebuilt_docs)
+
+        print(f"  🔄 Reloaded {', '.join(changed)} (snapshot v{snapshot.version})")
+        return {"version": snapshot.version, "changed": changed, "rebuilt_trees": rebuilt}
+
+    def _tree(self, snapshot: AgentSnapshot) -> LocalDocumentTree:
+        """Document tree to retrieve from (the local fallback in cloud mode)."""
+        return snapshot.tree
+
     # ─────────────────────────────────────────────────────────────────────────
     # Core Query Processing
     # ─────────────────────────────────────────────────────────────────────────
 
-    def process_query(self, query: str) -> Dict:
+    def process_query(self, query: str,
+                      lazy_explanation: Optional[bool] = None,
+                      refresh_candidates: bool = False) -> Dict:
         """
         Process query using Contrastive Cognitive Routing.
         Context is now retrieved via PageIndex tree-search.
+
+        With lazy_explanation (default: config.LAZY_EXPLANATIONS) the
+        decision memo is only generated when result["response"] is read,
+        so callers that need just the selected action skip that call.
+        refresh_candidates generates candidate actions even when the
+        candidate library has a confident match.
         """
         start_time = time.time()
+        if lazy_explanation is None:
+            lazy_explanation = config.LAZY_EXPLANATIONS
+        snapshot = self._snapshot
+
+        # Step 0: Decision memory — reuse a near-duplicate past decision
+        routing_result, memory_info = self._recall(query, snapshot)
+
+        retrieval_cost = None
+        if routing_result is None:
+            # Step 1: Build context via PageIndex tree-search (replaces flat strings)
+            print("  🌲 Retrieving context via PageIndex tree-search...")
+            context, node_ids = self._retrieve_context(query, snapshot)
+            retrieval_cost = self.retriever.last_cost
+
+            # Step 2: Candidate actions (library match, else generated)
+            candidate_actions = self._candidate_actions(
+                query, context, node_ids, snapshot, refresh=refresh_candidates
+            )
+
+            # Step 3: Contrastive Cognitive Routing (seeded from the context,
+            # so the variants can be regenerated when the documents change)
+            print("  🔀 Performing Contrastive Cognitive Routing...")
+            seed = self._variant_seed(context)
+            routing_result = self.router.route(query, context, candidate_actions,
+                                               seed=seed)
+            self._record(query, context, node_ids, seed, routing_result, snapshot)
+
+        return self._package(query, routing_result, memory_info, start_time,
+                             lazy_explanation, snapshot, retrieval_cost)
+
+    def process_speculative(self, query: str,
+                            on_update: Optional[Callable[["QueryResult"], None]] = None
+                            ) -> "QueryResult":
+        """
+        Speculative process_query: returns as soon as the first epistemic
+        variant has been scored on every action, with that provisional
+        selection in "routing_result". The other variants are scored in the
+        background; when they finish, the result is updated in place
+        (routing_result, metrics, "speculation") and, only if the selected
+        action changed, `on_update(result)` is called.
+
+        result["speculation"]["settled"] is a Future resolved (to the same
+        result) once the update is applied, or with the error if refinement
+        or recording failed; it is already resolved for a memory hit. The memo (result["response"])
+        waits for the full routing and explains the final decision; only
+        the final decision is archived and remembered.
+        """
+        start_time = time.time()
+        snapshot = self._snapshot
+
+        routing_result, memory_info = self._recall(query, snapshot)
+        if routing_result is not None:
+            result = self._package(query, routing_result, memory_info, start_time,
+                                   True, snapshot)
+            done: Future = Future()
+            result["speculation"] = {
+                "pending": False, "held": True,
+                "provisional_action": routing_result.selected_action,
+                "final_action": routing_result.selected_action,
+                "settled": done,
+            }
+            done.set_result(result)
+            return result
 
-        # Step 1: Build context via PageIndex tree-search (replaces flat strings)
         print("  🌲 Retrieving context via PageIndex tree-search...")
-        context = self._build_context(query)
+        context, node_ids = self._retrieve_context(query, snapshot)
+        retrieval_cost = self.retriever.last_cost
+        candidate_actions = self._candidate_actions(query, context, node_ids, snapshot)
+
+        print("  🔀 Routing speculatively (first variant)...")
+        seed = self._variant_seed(context)
+        speculation = self.router.route_speculative(query, context, candidate_actions,
+                                                    seed=seed)
+        provisional = speculation.provisional
+        result = self._package(query, provisional, memory_info, start_time, True,
+                               snapshot, retrieval_cost, final=speculation.future)
+        settled: Future = Future()
+        result["speculation"] = {
+            "pending": True, "held": None,
+            "provisional_action": provisional.selected_action,
+            "final_action": None,
+            "provisional_s": round(time.time() - start_time, 3),
+            "settled": settled,
+        }
 
-        # Step 2: Generate candidate actions
-        candidate_actions = self._generate_candidate_actions(query, context)
+        def _finish(future):
+            # Runs as a done-callback, where exceptions are only logged:
+            # every path must resolve `settled` or its waiters block forever
+            try:
+                final = future.result()           # raises a refinement error
+                self._record(query, context, node_ids, seed, final, snapshot)
+                result["routing_result"] = final
+                result["metrics"] = self._calculate_ccr_metrics(final, time.time() - start_time)
+                result["speculation"].update(pending=False, held=speculation.held,
+                                             final_action=final.selected_action)
+            except Exception as e:
+                result["speculation"].update(pending=False, error=str(e))
+                settled.set_exception(e)
+                return
+            if not speculation.held:
+                print(f"  ↪️  Speculative decision revised: {final.selected_action}")
+                if on_update is not None:
+                    try:
+                        on_update(result)
+                    except Exception as e:
+                        print(f"  ⚠️  Speculative update callback failed: {e}")
+            settled.set_result(result)
+
+        speculation.future.add_done_callback(_finish)
+        return result
+
+    def process_batch(self, queries: List[str],
+                      lazy_explanation: Optional[bool] = None) -> List[Dict]:
+        """
+        process_query for many queries, sharing retrieval and epistemic
+        variants between queries with the same context (see BatchPlanner).
+        """
+        from core.batch_planner import BatchPlanner
+        return BatchPlanner(self).run(queries, lazy_explanation)
 
-        # Step 3: Contrastive Cognitive Routing
-        print("  🔀 Performing Contrastive Cognitive Routing...")
-        routing_result = self.router.route(query, context, candidate_actions)
+    @staticmethod
+    def _variant_seed(context: str) -> int:
+        """Variant seed derived from the context: same context, same variants."""
+        return int(hashlib.sha256(context.encode("utf-8")).hexdigest()[:8], 16)
 
-        # Step 4: Generate explanation
-        explanation = self._generate_explanation(query, routing_result)
+    def _record(self, query: str, context: str, node_ids: Optional[List[str]],
+                seed: int, routing_result: RoutingResult, snapshot: AgentSnapshot,
+                remember: bool = True):
+        """
+        Archive and remember a freshly routed decision. remember=False
+        keeps degraded decisions (see QueryScheduler) out of memory, so
+        they are never reused in place of a full routing.
+        """
+        if self.score_archive is not None:
+            self.score_archive.append(routing_result, query)
+
+        if self.memory is not None and remember:
+            variants = routing_result.epistemic_variants
+            self.memory.add(
+                query,
+                snapshot.fingerprint,
+                context,
+                list(routing_result.actions),
+                routing_result.score_rows(),
+                routing_result.selected_action,
+                variants,
+                **self._dependency_info(node_ids, seed, variants, snapshot),
+            )
+
+    def _package(self, query: str, routing_result: RoutingResult,
+                 memory_info: Dict, start_time: float,
+                 lazy_explanation: bool, snapshot: AgentSnapshot,
+                 retrieval_cost: Optional[Dict] = None,
+                 final: Optional[Future] = None) -> "QueryResult":
+        """
+        Steps 4-5: explanation (now or on first read) and metrics. With a
+        speculative `final` future the explanation waits for and explains
+        the final routing instead of `routing_result`.
+        """
+        # Step 4: Generate explanation (now, or on first read when lazy)
+        explain = lambda: self._generate_explanation(
+            query, final.result() if final is not None else routing_result, snapshot
+        )
+        explanation = None if lazy_explanation else explain()
 
         # Step 5: Metrics
         response_time = time.time() - start_time
         metrics = self._calculate_ccr_metrics(routing_result, response_time)
 
+        result = QueryResult(
+            query=query,
+            routing_result=routing_result,
+            metrics=metrics,
+            method="contrastive_cognitive_routing",
+            context_mode=self.retriever._mode,
+            memory=memory_info,
+            retrieval_cost=retrieval_cost,
+            snapshot_version=snapshot.version,
+            response_factory=explain if lazy_explanation else None,
+        )
+        if not lazy_explanation:
+            result["response"] = explanation
+        return result
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Decision Memory
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _corpus_fingerprint(self, sources: Optional[Dict[str, Optional[bytes]]] = None) -> str:
+        """Hash of the documents and model a decision was routed against."""
+        if sources is None:
+            sources = LocalDocumentTree.read_sources()
+        h = hashlib.sha256()
+        h.update(f"{self.model_client.provider}:{self.model_client.model_name}".encode())
+        for doc in ("identity", "policies"):
+            raw = sources.get(doc)
+            h.update(raw if raw is not None else b"-")
+        return h.hexdigest()[:16]
+
+    def _recall(self, query: str, snapshot: AgentSnapshot):
+        """
+        (RoutingResult, memory info) for a near-duplicate past query, or
+        (None, info) when the query has to be routed from scratch.
+        """
+        if self.memory is None:
+            return None, {"hit": False}
+        match = self.memory.lookup(query, snapshot.fingerprint)
+        if match is None:
+            return None, {"hit": False}
+
+        record, similarity = match
+        info = {
+            "hit": False,
+            "similarity": round(similarity, 3),
+            "matched_query": record["query"],
+            "revalidated": config.MEMORY_REVALIDATE,
+        }
+        variants = [{**v, "context": ""} for v in record["variants"]]
+        stored = {a: list(row) for a, row in zip(record["actions"], record["score_matrix"])}
+        prior = self.router.select(stored, variants)
+        if not config.MEMORY_REVALIDATE:
+            print(f"  🧠 Reusing past decision (similarity {similarity:.3f})")
+            info["hit"] = True
+            return prior, info
+
+        # Re-validation: score the two best stored actions once against the
+        # stored context. The fresh scores join the stored ones as an extra
+        # variant column for just that pair (every row gets the column, so
+        # DRO compares like with like) and the decision is reused only if
+        # the stored winner still beats the runner-up
+        ranked = sorted(stored, key=lambda a: prior.action_scores[a]["dro_score"],
+                        reverse=True)[:2]
+        fresh = self.router.llm_scorer.score_actions(query, record["context"], ranked)
+        pair = self.router.select(
+            {a: stored[a] + [score] for a, score in zip(ranked, fresh)},
+            variants + [{
+                "id": "MEM",
+                "strategy": "_memory_revalidation",
+                "context": record["context"],
+                "degradation_level": 0.0,
+                "epistemic_distance": 0.0,
+            }],
+        )
+        if pair.selected_action != prior.selected_action:
+            print("  🧠 Past decision did not survive re-validation — routing in full")
+            return None, info
+
+        print(f"  🧠 Reusing past decision (similarity {similarity:.3f}, re-validated)")
+        info["hit"] = True
+        info["revalidation_scores"] = dict(zip(ranked, (float(s) for s in fresh)))
+        return prior, info
+
+    def _dependency_info(self, node_ids: Optional[List[str]], seed: int,
+                         variants: List[Dict], snapshot: AgentSnapshot) -> Dict:
+        """
+        What a stored decision depends on, for incremental re-routing
+        (see core.rerouting): the retrieved node_ids and their content
+        hashes, the variant seed, and the scorer-visible hash per variant.
+        """
         return {
-            "query": query,
-            "response": explanation,
-            "routing_result": routing_result,
-            "metrics": metrics,
-            "method": "contrastive_cognitive_routing",
-            "context_mode": self.retriever._mode,
+            "node_ids": node_ids,
+            "seed": seed,
+            "variant_hashes": [
+                self.LLMScorer.context_key(v["context"]) for v in variants
+            ],
+            **self.retriever.dependencies(node_ids, self._tree(snapshot)),
         }
 
     # ─────────────────────────────────────────────────────────────────────────
@@ -164,38 +681,148 @@ Return ONLY a number:"""
         This mirrors how PageIndex achieved 98.7% on FinanceBench:
         relevance through reasoning, not similarity.
         """
-        retrieved = self.retriever.retrieve(query)
+        return self._retrieve_context(query, self._snapshot)[0]
 
-        # Prepend role header so the LLM has persona context
-        role_header = (
-            f"ROLE: {self.identity.get('role', 'Agent')}\n"
-            f"COMPANY: {self.identity.get('company_name', 'N/A')}\n"
-            f"VALUES: {', '.join(self.identity.get('company_values', []))}\n"
+    def _retrieve_context(self, query: str, snapshot: AgentSnapshot,
+                          lexical: bool = False):
+        """(context, node_ids) — node_ids as returned by retrieve_nodes."""
+        retrieved, node_ids = self.retriever.retrieve_nodes(
+            query, self._tree(snapshot), lexical=lexical
+        )
+        return self._role_header(snapshot) + retrieved, node_ids
+
+    def _role_header(self, snapshot: AgentSnapshot) -> str:
+        """Role header prepended so the LLM has persona context"""
+        identity = snapshot.identity
+        return (
+            f"ROLE: {identity.get('role', 'Agent')}\n"
+            f"COMPANY: {identity.get('company_name', 'N/A')}\n"
+            f"VALUES: {', '.join(identity.get('company_values', []))}\n"
             f"---\n"
         )
-        return role_header + retrieved
 
     # ─────────────────────────────────────────────────────────────────────────
-    # Candidate Action Generation (unchanged)
+    # Candidate Action Generation
     # ─────────────────────────────────────────────────────────────────────────
 
-    def _generate_candidate_actions(self, query: str, context: str) -> List[str]:
-        prompt = f"""Based on this situation, generate 4-5 possible decisions:
+    # Used when generation returns nothing; never recorded in the library
+    FALLBACK_ACTIONS = (
+        "Approve with standard conditions",
+        "Request additional information",
+        "Deny based on constraints",
+        "Approve with modified scope",
+    )
+
+    def _candidate_actions(self, query: str, context: str,
+                           node_ids: Optional[List[str]], snapshot: AgentSnapshot,
+                           refresh: bool = False, max_actions: int = 5) -> List[str]:
+        return self._candidate_actions_many([query], [context], [node_ids],
+                                            snapshot, refresh, max_actions)[0]
+
+    def _candidate_actions_many(self, queries: List[str], contexts: List[str],
+                                node_ids_list: List[Optional[List[str]]],
+                                snapshot: AgentSnapshot,
+                                refresh: bool = False,
+                                max_actions: int = 5) -> List[List[str]]:
+        """
+        Candidate actions per query: from the candidate library when it
+        has a confident match for (category, retrieved policy nodes),
+        otherwise generated (one batch for all misses) and recorded.
+        Fewer than five (see QueryScheduler) are asked of the model
+        directly; those shortened sets are not recorded.
+        """
+        library = self.candidate_library
+        if library is None:
+            return self._generate_candidate_actions_many(queries, contexts, max_actions)
+
+        node_hashes = [self._policy_hashes(ids, snapshot) for ids in node_ids_list]
+        results: List[Optional[List[str]]] = [
+            None if refresh else library.suggest(q, ids, hashes, max_actions)
+            for q, ids, hashes in zip(queries, node_ids_list, node_hashes)
+        ]
+        hits = sum(r is not None for r in results)
+        if hits:
+            print(f"  📚 Candidate actions from library ({hits}/{len(queries)})")
+
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            generated = self._generate_candidate_actions_many(
+                [queries[i] for i in misses], [contexts[i] for i in misses], max_actions
+            )
+            for i, actions in zip(misses, generated):
+                results[i] = actions
+                if max_actions >= 5 and actions != list(self.FALLBACK_ACTIONS):
+                    library.observe(queries[i], node_ids_list[i], actions,
+                                    node_hashes[i], save=False)
+            library.save()
+        return results
+
+    def _policy_hashes(self, node_ids: Optional[List[str]],
+                       snapshot: AgentSnapshot) -> Dict[str, str]:
+        """Content hashes of the retrieved nodes (library staleness check)."""
+        if not node_ids:
+            return {}
+        return self._tree(snapshot).dependency_hashes(node_ids)["node_hashes"]
+
+    def _generate_candidate_actions(self, query: str, context: str,
+                                    max_actions: int = 5) -> List[str]:
+        return self._generate_candidate_actions_many([query], [context], max_actions)[0]
+
+    def _generate_candidate_actions_many(self, queries: List[str],
+                                         contexts: List[str],
+                                         max_actions: int = 5) -> List[List[str]]:
+        """
+        Candidate actions per (query, context), generated as one batch.
+        With max_actions < 5 the prompt asks for that many and the reply
+        budget shrinks with it.
+        """
+        prompts = [self._candidate_prompt(q, c, max_actions)
+                   for q, c in zip(queries, contexts)]
+
+        if config.STRUCTURED_OUTPUT:
+            schema = ACTIONS_SCHEMA if max_actions >= 5 else actions_schema(max_actions)
+            values = self.model_client.generate_json_many(
+                [p + 'Return ONLY JSON: {"actions": ["<action>", ...]}' for p in prompts],
+                schema, temperature=0.8, strict=False,
+            )
+            batches = [[a.strip() for a in v["actions"]] if v is not None else []
+                       for v in values]
+        else:
+            responses = self.model_client.generate_many(
+                [p + "One per line:" for p in prompts], temperature=0.8,
+                max_tokens=30 * min(max_actions, 5),
+            )
+            batches = [self._parse_candidate_lines(r) for r in responses]
+
+        limit = min(max_actions, 5)
+        return [(actions or list(self.FALLBACK_ACTIONS))[:limit] for actions in batches]
+
+    # Option types the candidate prompt asks for, in order
+    CANDIDATE_APPROACHES = (
+        "Conservative/risk-averse approach",
+        "Ambitious/optimistic approach",
+        "Compromise/middle-ground approach",
+        "Deferral/more-info approach",
+    )
+
+    @classmethod
+    def _candidate_prompt(cls, query: str, context: str, max_actions: int = 5) -> str:
+        count = "4-5" if max_actions >= 5 else str(max_actions)
+        approaches = "\n".join(f"{i}. {a}" for i, a in
+                               enumerate(cls.CANDIDATE_APPROACHES[:max_actions], 1))
+        return f"""Based on this situation, generate {count} possible decisions:
 
 Situation: {query}
 Context: {context[:600]}
 
 Generate diverse options including:
-1. Conservative/risk-averse approach
-2. Ambitious/optimistic approach
-3. Compromise/middle-ground approach
-4. Deferral/more-info approach
+{approaches}
 
 Format each as a concise action starting with a verb.
-One per line:"""
-
-        response = self.model_client.generate(prompt, temperature=0.8, max_tokens=150)
+"""
 
+    @staticmethod
+    def _parse_candidate_lines(response: str) -> List[str]:
         actions = []
         for line in response.split("\n"):
             line = line.strip()
@@ -203,24 +830,30 @@ One per line:"""
                 if line[0].isdigit() and ". " in line[:5]:
                     line = line.split(". ", 1)[1]
                 actions.append(line)
-
-        if not actions:
-            actions = [
-                "Approve with standard conditions",
-                "Request additional information",
-                "Deny based on constraints",
-                "Approve with modified scope",
-            ]
-
-        return actions[:5]
+        return actions
 
     # ─────────────────────────────────────────────────────────────────────────
-    # Explanation Generation (unchanged)
+    # Explanation Generation (memoized)
     # ─────────────────────────────────────────────────────────────────────────
 
-    def _generate_explanation(self, query: str,
-                               routing_result: RoutingResult) -> str:
-        prompt = f"""As {self.identity['role']}, explain this decision with epistemic reasoning:
+    def _generate_explanation(self, query: str, routing_result: RoutingResult,
+                              snapshot: Optional[AgentSnapshot] = None) -> str:
+        identity = (snapshot or self._snapshot).identity
+        cache_key = None
+        if self.explanation_cache is not None:
+            cache_key = self.explanation_cache.make_key(
+                query,
+                routing_result.selected_action,
+                routing_result.robustness_score,
+                routing_result.worst_case_score,
+                routing_result.epistemic_variance,
+                identity["role"],
+            )
+            cached = self.explanation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        prompt = f"""As {identity['role']}, explain this decision with epistemic reasoning:
 
 Query: {query}
 
@@ -240,7 +873,12 @@ Explain:
 
 Decision Memo:"""
 
-        return self.model_client.generate(prompt, temperature=0.3)
+        # Queued behind scoring calls when the provider is rate limited
+        with self.model_client.priority("explanation"):
+            explanation = self.model_client.generate(prompt, temperature=0.3)
+        if cache_key is not None:
+            self.explanation_cache.put(cache_key, explanation)
+        return explanation
 
     # ─────────────────────────────────────────────────────────────────────────
     # Metrics (unchanged)
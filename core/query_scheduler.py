@@ -0,0 +1,270 @@
+"""
+Query scheduling: per-request deadlines and priorities in front of
+process_query.
+
+Queries wait in one queue ordered by priority, then earliest deadline.
+When a worker picks a query up, it plans the pipeline to fit the time
+left, degrading step by step until the estimated cost fits:
+
+    skip_explanation     no decision memo (the decision itself is unchanged)
+    variants=2           fewer epistemic variants
+    candidates=3         fewer candidate actions scored
+    lexical_retrieval    keyword retrieval instead of LLM tree search
+    variants=1
+    candidates=2
+
+The plan is re-fitted before scoring and before the explanation, using
+the time actually left. Stage costs start from SCHEDULER_STAGE_COSTS and
+follow observed timings (moving average). Results report the
+degradations applied under "degradations" and the timing under
+"schedule". Degraded decisions are archived but not remembered, so
+decision memory only ever serves full routings.
+
+Usage:
+    scheduler = QueryScheduler(agent)
+    result = scheduler.run(query, deadline=8.0, priority="high")
+    future = scheduler.submit(query, deadline=30.0)        # non-blocking
+
+    # Share an existing thread pool (and its concurrency cap) instead of
+    # starting worker threads; each submit queues one task that runs the
+    # highest-priority waiting query when a pool thread frees up
+    scheduler = QueryScheduler(agent, executor=pool)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+@dataclass
+class QueryPlan:
+    """How much of the CCR pipeline a query gets."""
+    n_variants: int = 3
+    max_candidates: int = 5
+    lexical: bool = False
+    explanation: bool = True
+    degradations: Dict[str, str] = field(default_factory=dict)  # knob → label
+
+    @property
+    def decision_degraded(self) -> bool:
+        """True when the degradations can change the selected action."""
+        return any(knob != "explanation" for knob in self.degradations)
+
+
+@dataclass
+class _Job:
+    query: str
+    priority: str
+    deadline: float                   # seconds allowed, from submission
+    submitted: float                  # time.monotonic()
+    future: Future
+
+    @property
+    def deadline_at(self) -> float:
+        return self.submitted + self.deadline
+
+
+class QueryScheduler:
+
+    # (label, stage, plan attribute, degraded value), cheapest loss first
+    LADDER: List[Tuple[str, str, str, object]] = [
+        ("skip_explanation", "explanation", "explanation", False),
+        ("variants=2", "scoring", "n_variants", 2),
+        ("candidates=3", "scoring", "max_candidates", 3),
+        ("lexical_retrieval", "retrieval", "lexical", True),
+        ("variants=1", "scoring", "n_variants", 1),
+        ("candidates=2", "scoring", "max_candidates", 2),
+    ]
+
+    def __init__(self, agent, workers: Optional[int] = None, executor=None):
+        self.agent = agent
+        self.costs: Dict[str, float] = dict(config.SCHEDULER_STAGE_COSTS)
+        self._costs_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._closed = False
+        self.stats = {"completed": 0, "degraded": 0, "deadline_missed": 0}
+        self._executor = executor
+        self._workers = [] if executor is not None else [
+            threading.Thread(target=self._work, name=f"ccr-sched-{i}", daemon=True)
+            for i in range(workers or config.SCHEDULER_WORKERS)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def submit(self, query: str, deadline: Optional[float] = None,
+               priority: str = "normal") -> Future:
+        """Queue `query`; the future resolves to its process_query-style result."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        if deadline is None:
+            deadline = config.SCHEDULER_DEFAULT_DEADLINE
+        if deadline <= 0:
+            raise ValueError("deadline must be positive (seconds)")
+
+        job = _Job(query, priority, float(deadline), time.monotonic(), Future())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("QueryScheduler is closed")
+            heapq.heappush(
+                self._queue,
+                (PRIORITIES[priority], job.deadline_at, next(self._seq), job),
+            )
+            self._cond.notify()
+        if self._executor is not None:
+            self._executor.submit(self._run_next)
+        return job.future
+
+    def run(self, query: str, deadline: Optional[float] = None,
+            priority: str = "normal") -> Dict:
+        return self.submit(query, deadline, priority).result()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def close(self, wait: bool = True):
+        """Stop the workers once the queued queries are done."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    # ── Planning ─────────────────────────────────────────────────────────────
+
+    def estimate(self, plan: QueryPlan, done=()) -> float:
+        """Estimated seconds for the stages of `plan` not in `done`."""
+        c = self.costs
+        total = 0.0
+        if "retrieval" not in done:
+            total += c["lexical"] if plan.lexical else c["tree_search"]
+        if "candidates" not in done:
+            # Generation time scales with the number of actions asked for
+            total += c["candidates"] * plan.max_candidates / 5
+        if "scoring" not in done:
+            total += c["score_cell"] * plan.n_variants * plan.max_candidates
+        if "explanation" not in done and plan.explanation:
+            total += c["explanation"]
+        return total
+
+    def fit(self, plan: QueryPlan, budget: float, done=()) -> QueryPlan:
+        """Degrade `plan` (in place) along LADDER until it fits `budget` seconds."""
+        for label, stage, knob, value in self.LADDER:
+            if self.estimate(plan, done) <= budget:
+                break
+            current = getattr(plan, knob)
+            if stage in done or current == value:
+                continue
+            if not isinstance(value, bool) and value > current:
+                continue
+            setattr(plan, knob, value)
+            plan.degradations[knob] = label
+        return plan
+
+    def _observe(self, stage: str, seconds: float):
+        alpha = config.SCHEDULER_COST_SMOOTHING
+        with self._costs_lock:
+            self.costs[stage] = (1 - alpha) * self.costs[stage] + alpha * seconds
+
+    # ── Execution ────────────────────────────────────────────────────────────
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = heapq.heappop(self._queue)[-1]
+            self._run_job(job)
+
+    def _run_next(self):
+        """Executor task: run whichever queued query is most urgent now."""
+        with self._cond:
+            if not self._queue:
+                return
+            job = heapq.heappop(self._queue)[-1]
+        self._run_job(job)
+
+    def _run_job(self, job: _Job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            job.future.set_result(self._execute(job))
+        except Exception as e:
+            job.future.set_exception(e)
+
+    def _budget(self, job: _Job) -> float:
+        return (job.deadline_at - time.monotonic()) * config.SCHEDULER_HEADROOM
+
+    def _execute(self, job: _Job) -> Dict:
+        agent = self.agent
+        query = job.query
+        started = time.monotonic()
+        start_time = time.time()
+        snapshot = agent.snapshot
+        plan = QueryPlan(n_variants=config.EPISTEMIC_N_VARIANTS)
+
+        routing_result, memory_info = agent._recall(query, snapshot)
+        retrieval_cost = None
+        if routing_result is None:
+            self.fit(plan, self._budget(job))
+
+            t = time.monotonic()
+            context, node_ids = agent._retrieve_context(query, snapshot, plan.lexical)
+            retrieval_cost = agent.retriever.last_cost
+            self._observe("lexical" if plan.lexical else "tree_search", time.monotonic() - t)
+
+            t = time.monotonic()
+            candidates = agent._candidate_actions(query, context, node_ids, snapshot,
+                                                  max_actions=plan.max_candidates)
+            self._observe("candidates", (time.monotonic() - t) * 5 / plan.max_candidates)
+
+            self.fit(plan, self._budget(job), done=("retrieval", "candidates"))
+            candidates = candidates[:plan.max_candidates]
+            t = time.monotonic()
+            seed = agent._variant_seed(context)
+            routing_result = agent.router.route(query, context, candidates,
+                                                seed=seed, n_variants=plan.n_variants)
+            self._observe("score_cell", (time.monotonic() - t)
+                          / max(1, len(candidates) * plan.n_variants))
+            agent._record(query, context, node_ids, seed, routing_result, snapshot,
+                          remember=not plan.decision_degraded)
+
+        self.fit(plan, self._budget(job), done=("retrieval", "candidates", "scoring"))
+        t = time.monotonic()
+        result = agent._package(query, routing_result, memory_info, start_time,
+                                not plan.explanation, snapshot, retrieval_cost)
+        if plan.explanation:
+            self._observe("explanation", time.monotonic() - t)
+        else:
+            result["response"] = None
+
+        finished = time.monotonic()
+        met = finished <= job.deadline_at
+        with self._cond:
+            self.stats["completed"] += 1
+            self.stats["degraded"] += bool(plan.degradations)
+            self.stats["deadline_missed"] += not met
+        result["degradations"] = list(plan.degradations.values())
+        result["schedule"] = {
+            "priority": job.priority,
+            "deadline_s": job.deadline,
+            "queue_wait_s": round(started - job.submitted, 3),
+            "elapsed_s": round(finished - job.submitted, 3),
+            "deadline_met": met,
+        }
+        return result
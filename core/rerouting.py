@@ -0,0 +1,173 @@
+"""
+Incremental re-routing of stored decisions after a document change.
+
+Every decision in DecisionMemory records what its context was built from
+(see EpistemicProxyAgent._dependency_info):
+
+  node_ids       — the [node_id] chunks tree search retrieved
+  node_hashes    — content hash of each of those nodes (+ ID-ROOT)
+  index_hashes   — hash of the child index the searcher saw at each
+                   expanded node
+  seed           — seed of the epistemic variant generator
+  variant_hashes — hash of the scorer-visible part of each variant
+
+After identity.json / company_policies.json change, the rerouter reloads
+the agent (EpistemicProxyAgent.reload) and compares hashes record by record:
+
+  - no dependency changed      → decision kept, fingerprint refreshed
+  - only node contents changed → context re-rendered from the stored
+                                 node_ids (no retrieval calls)
+  - a searched index changed   → tree search re-run for that query
+  - otherwise (cloud mode, records from before dependency tracking)
+                               → left untouched; routed in full on reuse
+
+For re-rendered contexts the variants are regenerated with the stored
+seed, and only variants whose scorer-visible text changed are re-scored;
+the remaining score columns are reused. The candidate actions are kept.
+
+Usage:
+    agent = EpistemicProxyAgent()
+    report = IncrementalRerouter(agent).reroute()
+"""
+
+from typing import Dict, List, Set
+
+from core.action_clustering import cluster_actions
+from core.contrastive_router import RoutingResult
+from utils.pageindex_retriever import LocalDocumentTree
+
+
+class IncrementalRerouter:
+
+    def __init__(self, agent):
+        if agent.memory is None:
+            raise ValueError("Incremental re-routing needs the agent's decision memory")
+        self.agent = agent
+
+    # ── Change detection ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def stale_dependencies(record: Dict, current: Dict) -> Dict[str, Set[str]]:
+        """
+        Node ids whose content (`nodes`) or child index (`index`) differs
+        between `record` and the `current` dependency hashes.
+        """
+        stale: Dict[str, Set[str]] = {}
+        for key, field in (("nodes", "node_hashes"), ("index", "index_hashes")):
+            now = current.get(field, {})
+            before = record.get(field) or {}
+            stale[key] = {
+                nid for nid in set(before) | set(now)
+                if now.get(nid, "") != before.get(nid, "")
+            }
+        return stale
+
+    # ── Re-routing ───────────────────────────────────────────────────────────
+
+    def reroute(self, dry_run: bool = False) -> List[Dict]:
+        """
+        Re-route every stored decision affected by the current documents.
+        Returns one report entry per record; with `dry_run` only reports
+        which records are affected.
+        """
+        agent = self.agent
+        if dry_run:
+            # Compare against the files on disk without swapping them in
+            snapshot = agent._make_snapshot(LocalDocumentTree.read_sources(),
+                                            previous=agent.snapshot)
+        else:
+            agent.reload()
+            snapshot = agent.snapshot
+        tree = snapshot.tree
+        fingerprint = snapshot.fingerprint
+
+        report = []
+        for record in agent.memory.records:
+            entry = {"query": record["query"], "selected_action": record["selected_action"]}
+            report.append(entry)
+
+            if record.get("node_hashes") is None or "seed" not in record:
+                entry["status"] = "untracked"
+                continue
+
+            current = tree.dependency_hashes(record["node_ids"], self._max_depth())
+            stale = self.stale_dependencies(record, current)
+            if not stale["nodes"] and not stale["index"]:
+                entry["status"] = "unchanged"
+                if not dry_run:
+                    record["fingerprint"] = fingerprint
+                continue
+
+            entry["changed_nodes"] = sorted(stale["nodes"] | stale["index"])
+            entry["status"] = "affected"
+            if dry_run:
+                continue
+
+            entry.update(self._reroute_record(record, snapshot,
+                                              research=bool(stale["index"])))
+            record["fingerprint"] = fingerprint
+
+        if not dry_run:
+            agent.memory.save()
+        return report
+
+    def _max_depth(self) -> int:
+        searcher = self.agent.retriever.searcher
+        return searcher.max_depth if searcher else 0
+
+    def _reroute_record(self, record: Dict, snapshot, research: bool) -> Dict:
+        """Recompute one decision in place; returns its report fields."""
+        agent = self.agent
+        query = record["query"]
+
+        if research:
+            context, node_ids = agent._retrieve_context(query, snapshot)
+        elif record["node_ids"] is None:
+            node_ids = None
+            context = agent._role_header(snapshot) + snapshot.tree.get_all_summaries()
+        else:
+            node_ids = record["node_ids"]
+            context = agent._role_header(snapshot) + snapshot.tree.render_nodes(node_ids)
+
+        scorer = agent.router.llm_scorer
+        variants = agent.router.variant_generator.generate_variants(
+            context, query, n_variants=len(record["variant_hashes"]), seed=record["seed"]
+        )
+        variant_hashes = [scorer.context_key(v["context"]) for v in variants]
+        changed = [
+            i for i, h in enumerate(variant_hashes)
+            if i >= len(record["variant_hashes"]) or h != record["variant_hashes"][i]
+        ]
+
+        # Re-score only the changed variant columns
+        actions = record["actions"]
+        matrix = [list(row) for row in record["score_matrix"]]
+        if changed:
+            clusters = cluster_actions(actions)
+            grid = scorer.score_grid(query, [variants[i]["context"] for i in changed],
+                                     clusters.representatives)
+            for col, variant_scores in zip(changed, grid):
+                for a_idx, score in enumerate(clusters.expand(variant_scores)):
+                    matrix[a_idx][col] = score
+
+        result: RoutingResult = agent.router.select(
+            {a: row for a, row in zip(actions, matrix)}, variants
+        )
+        previous = record["selected_action"]
+        record.update(
+            context=context,
+            score_matrix=[[float(s) for s in row] for row in matrix],
+            selected_action=result.selected_action,
+            variants=[{k: v for k, v in variant.items() if k != "context"}
+                      for variant in variants],
+            **agent._dependency_info(node_ids, record["seed"], variants, snapshot),
+        )
+        return {
+            "status": "rerouted",
+            "retrieval": "re-searched" if research else "re-rendered",
+            "variants_rescored": len(changed),
+            "n_variants": len(variants),
+            "selected_action": result.selected_action,
+            "previous_action": previous,
+            "decision_changed": result.selected_action != previous,
+        }
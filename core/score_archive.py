@@ -0,0 +1,355 @@
+"""
+Score Archive — append-only, memory-mapped store of routing score matrices.
+
+Each routed decision appends its action × variant score matrix, the
+metadata of its epistemic variants and the selected action. Analyses over
+months of traffic run chunk by chunk on memory-mapped arrays, so millions
+of decisions never have to be loaded at once.
+
+On-disk layout:
+
+    <path>/scores.f4     float32, every matrix flattened row-major (action, variant)
+    <path>/variants.f4   float32 rows [strategy_code, degradation_level, epistemic_distance]
+    <path>/index.i8      int64 rows, one per decision (see INDEX_FIELDS)
+    <path>/decisions.jsonl  {"i", "query", "actions"} per decision number i
+    <path>/strategies.json  strategy_code → variant strategy name
+    <path>/archive.lock     held (flock) for the whole of each append
+
+The index row is written last, so a decision interrupted mid-append is
+never visible to readers. Several processes may append to one archive:
+each append holds an exclusive lock on archive.lock (POSIX; on Windows
+appends are serialized within a process only), re-reads strategies.json
+under it and replaces that file atomically.
+
+Usage:
+    archive = ScoreArchive("data/score_archive")
+    archive.append(routing_result, query)
+    summary = archive.summary(since="2026-01-01")
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core.contrastive_router import ContrastiveCognitiveRouter, RoutingResult
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+INDEX_FIELDS = (
+    "score_offset",    # first score of the matrix in scores.f4
+    "n_actions",
+    "n_variants",
+    "variant_offset",  # first variant row in variants.f4
+    "selected_idx",    # row of the selected action
+    "created_ms",      # unix time in milliseconds
+)
+_N_INDEX = len(INDEX_FIELDS)
+_N_VARIANT = 3
+
+# An action is "robust" when its score range across variants is below this
+# (same threshold as ContrastiveCognitiveRouter.analyze_epistemic_sensitivity)
+ROBUST_RANGE = 0.3
+
+
+def _to_ms(when) -> int:
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if isinstance(when, datetime):
+        return int(when.timestamp() * 1000)
+    return int(when)
+
+
+class ScoreArchive:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._strategies: List[str] = []
+        self._stale = False
+        self._index: np.ndarray = np.zeros((0, _N_INDEX), dtype=np.int64)
+        self._scores: np.ndarray = np.zeros(0, dtype=np.float32)
+        self._variants: np.ndarray = np.zeros((0, _N_VARIANT), dtype=np.float32)
+        self.refresh()
+
+    # ── Files ────────────────────────────────────────────────────────────────
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    @staticmethod
+    def _map(path: Path, dtype, width: Optional[int] = None) -> np.ndarray:
+        """Read-only memmap of a flat binary file (empty array if absent)."""
+        itemsize = np.dtype(dtype).itemsize * (width or 1)
+        n = path.stat().st_size // itemsize if path.exists() else 0
+        if n == 0:
+            shape = (0, width) if width else (0,)
+            return np.zeros(shape, dtype=dtype)
+        shape = (n, width) if width else (n,)
+        return np.memmap(str(path), dtype=dtype, mode="r", shape=shape)
+
+    def _read_strategies(self):
+        strategies = self._file("strategies.json")
+        if strategies.exists():
+            self._strategies = json.loads(strategies.read_text())
+
+    def _write_strategies(self):
+        """Replace strategies.json atomically: readers never see a partial file."""
+        path = self._file("strategies.json")
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._strategies))
+        os.replace(str(tmp), str(path))
+
+    @contextmanager
+    def _locked(self):
+        """This process's lock plus an exclusive flock on archive.lock."""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(str(self._file("archive.lock")), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Re-map the files to see decisions appended by other writers."""
+        with self._lock:
+            self._read_strategies()
+            self._index = self._map(self._file("index.i8"), np.int64, _N_INDEX)
+            self._scores = self._map(self._file("scores.f4"), np.float32)
+            self._variants = self._map(self._file("variants.f4"), np.float32, _N_VARIANT)
+            self._stale = False
+
+    def _fresh(self):
+        if self._stale:
+            self.refresh()
+
+    def __len__(self) -> int:
+        self._fresh()
+        return len(self._index)
+
+    def _size(self, name: str, itemsize: int) -> int:
+        path = self._file(name)
+        return path.stat().st_size // itemsize if path.exists() else 0
+
+    # ── Write ────────────────────────────────────────────────────────────────
+
+    def append(self, routing_result: RoutingResult, query: str = ""):
+        """Archive one routing decision."""
+        actions = list(routing_result.actions)
+        matrix = routing_result.scores
+        variants = routing_result.variants[:matrix.shape[1]]
+
+        with self._locked():
+            # Another process may have added strategies since we last read
+            self._read_strategies()
+            new = [v.strategy for v in variants if v.strategy not in self._strategies]
+            if new:
+                self._strategies.extend(dict.fromkeys(new))
+                self._write_strategies()
+            codes = [self._strategies.index(v.strategy) for v in variants]
+            meta = np.asarray(
+                [[c, v.degradation_level, v.epistemic_distance]
+                 for c, v in zip(codes, variants)],
+                dtype=np.float32,
+            ).reshape(-1, _N_VARIANT)
+
+            # Offsets from the file sizes, so bytes of an append that never
+            # reached the index are skipped rather than misaligning later rows;
+            # a torn index row is cut off
+            index_path = self._file("index.i8")
+            n_decisions = self._size("index.i8", 8 * _N_INDEX)
+            if index_path.exists() and index_path.stat().st_size != n_decisions * 8 * _N_INDEX:
+                with open(str(index_path), "r+b") as f:
+                    f.truncate(n_decisions * 8 * _N_INDEX)
+            row = np.asarray([[
+                self._size("scores.f4", 4), matrix.shape[0], matrix.shape[1],
+                self._size("variants.f4", 4 * _N_VARIANT),
+                routing_result.selected_index,
+                int(time.time() * 1000),
+            ]], dtype=np.int64)
+
+            with open(str(self._file("scores.f4")), "ab") as f:
+                matrix.tofile(f)
+            with open(str(self._file("variants.f4")), "ab") as f:
+                meta.tofile(f)
+            with open(str(self._file("decisions.jsonl")), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"i": n_decisions, "query": query, "actions": actions},
+                                   ensure_ascii=False) + "\n")
+            with open(str(index_path), "ab") as f:
+                row.tofile(f)
+            self._stale = True
+
+    # ── Random access ────────────────────────────────────────────────────────
+
+    def matrix(self, i: int) -> np.ndarray:
+        """Score matrix (n_actions × n_variants) of decision `i` (a view)."""
+        self._fresh()
+        offset, n_a, n_v = (int(x) for x in self._index[i, :3])
+        return self._scores[offset:offset + n_a * n_v].reshape(n_a, n_v)
+
+    def variant_meta(self, i: int) -> List[Dict]:
+        self._fresh()
+        offset, n_v = int(self._index[i, 3]), int(self._index[i, 2])
+        return [
+            {
+                "strategy": self._strategies[int(code)] if int(code) < len(self._strategies) else "",
+                "degradation_level": float(deg),
+                "epistemic_distance": float(dist),
+            }
+            for code, deg, dist in self._variants[offset:offset + n_v]
+        ]
+
+    def decision_range(self, since=None, until=None) -> Tuple[int, int]:
+        """[start, stop) of decisions created between `since` and `until`
+        (ISO strings, datetimes or unix ms); appends are time-ordered."""
+        self._fresh()
+        created = self._index[:, 5] if len(self._index) else np.zeros(0, dtype=np.int64)
+        start = int(np.searchsorted(created, _to_ms(since), "left")) if since else 0
+        stop = int(np.searchsorted(created, _to_ms(until), "right")) if until else len(created)
+        return start, stop
+
+    # ── Chunked analysis ─────────────────────────────────────────────────────
+
+    def iter_stats(self, start: int = 0, stop: Optional[int] = None,
+                   chunk_size: int = 100_000) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Per-decision statistics, `chunk_size` decisions at a time.
+
+        Every action row of every matrix is a contiguous segment of
+        scores.f4, so row min / max / mean / variance are segment
+        reductions over one slice of the memmap per chunk. Segments are
+        bounded by each row's own length, so floats left between
+        decisions by a torn append are skipped.
+        """
+        self._fresh()
+        stop = len(self) if stop is None else min(stop, len(self))
+        lam = ContrastiveCognitiveRouter.VARIANCE_PENALTY
+        for lo in range(start, stop, chunk_size):
+            idx = np.asarray(self._index[lo:min(lo + chunk_size, stop)])
+            if not len(idx):
+                continue
+            offsets, n_a, n_v, _, selected, created = idx.T
+            base = int(offsets[0])
+            end = int(offsets[-1] + n_a[-1] * n_v[-1])
+            flat = np.asarray(self._scores[base:end], dtype=np.float64)
+
+            # One segment per action row
+            row_decision = np.repeat(np.arange(len(idx)), n_a)
+            row_in_decision = np.arange(len(row_decision)) - np.repeat(np.cumsum(n_a) - n_a, n_a)
+            row_len = n_v[row_decision]
+            row_start = offsets[row_decision] - base + row_in_decision * row_len
+
+            # Reduce over explicit [start, end) pairs: orphan floats from a
+            # torn append sit between decisions and must not join the last
+            # row before them. The even results are the rows; one padding
+            # element keeps the final end index in range.
+            bounds = np.empty(2 * len(row_start), dtype=np.int64)
+            bounds[0::2] = row_start
+            bounds[1::2] = row_start + row_len
+            flat = np.append(flat, 0.0)
+
+            row_min = np.minimum.reduceat(flat, bounds)[0::2]
+            row_max = np.maximum.reduceat(flat, bounds)[0::2]
+            row_mean = np.add.reduceat(flat, bounds)[0::2] / row_len
+            row_var = np.maximum(np.add.reduceat(flat ** 2, bounds)[0::2] / row_len - row_mean ** 2, 0.0)
+            row_range = row_max - row_min
+            row_dro = row_min - lam * row_var
+
+            first_row = np.cumsum(n_a) - n_a
+            sel = first_row + selected
+            yield {
+                "decision": np.arange(lo, lo + len(idx)),
+                "created_ms": created,
+                "n_actions": n_a,
+                "n_variants": n_v,
+                "selected_min": row_min[sel],
+                "selected_mean": row_mean[sel],
+                "selected_var": row_var[sel],
+                "selected_range": row_range[sel],
+                "robust_actions": np.add.reduceat((row_range < ROBUST_RANGE).astype(np.int64), first_row),
+                "dro_agrees": _segment_argmax(row_dro, first_row) == selected,
+                "mean_agrees": _segment_argmax(row_mean, first_row) == selected,
+            }
+
+    def decision_metrics(self, since=None, until=None,
+                         chunk_size: int = 100_000) -> Dict[str, np.ndarray]:
+        """
+        Per-decision CCR metrics (same definitions as the agent's
+        `_calculate_ccr_metrics`) plus sensitivity of the selected action.
+        """
+        start, stop = self.decision_range(since, until)
+        parts: Dict[str, List[np.ndarray]] = {}
+        for stats in self.iter_stats(start, stop, chunk_size):
+            robustness = np.clip(stats["selected_min"] * (1.0 - stats["selected_var"]), 0.0, 1.0)
+            metrics = {
+                "decision": stats["decision"],
+                "created_ms": stats["created_ms"],
+                "robustness_score": robustness,
+                "worst_case_score": stats["selected_min"],
+                "epistemic_variance": stats["selected_var"],
+                "epistemic_stability": 1.0 - stats["selected_var"],
+                "decision_quality": robustness * 0.7 + stats["selected_min"] * 0.3,
+                "sensitivity": stats["selected_range"],
+                "is_robust": stats["selected_range"] < ROBUST_RANGE,
+                "dro_agrees": stats["dro_agrees"],
+            }
+            for key, value in metrics.items():
+                parts.setdefault(key, []).append(value)
+        return {key: np.concatenate(chunks) for key, chunks in parts.items()}
+
+    def summary(self, since=None, until=None, chunk_size: int = 100_000) -> Dict:
+        """Streaming aggregate over a time window; O(chunk) memory."""
+        start, stop = self.decision_range(since, until)
+        n = 0
+        sums = {"robustness_score": 0.0, "worst_case_score": 0.0, "epistemic_variance": 0.0,
+                "sensitivity": 0.0, "robust_selected": 0, "robust_actions": 0,
+                "total_actions": 0, "dro_agrees": 0, "mean_agrees": 0}
+        worst = np.inf
+        for s in self.iter_stats(start, stop, chunk_size):
+            n += len(s["decision"])
+            sums["robustness_score"] += float(np.clip(s["selected_min"] * (1 - s["selected_var"]), 0, 1).sum())
+            sums["worst_case_score"] += float(s["selected_min"].sum())
+            sums["epistemic_variance"] += float(s["selected_var"].sum())
+            sums["sensitivity"] += float(s["selected_range"].sum())
+            sums["robust_selected"] += int((s["selected_range"] < ROBUST_RANGE).sum())
+            sums["robust_actions"] += int(s["robust_actions"].sum())
+            sums["total_actions"] += int(s["n_actions"].sum())
+            sums["dro_agrees"] += int(s["dro_agrees"].sum())
+            sums["mean_agrees"] += int(s["mean_agrees"].sum())
+            worst = min(worst, float(s["selected_min"].min()))
+        if not n:
+            return {"n_decisions": 0}
+        return {
+            "n_decisions": n,
+            "mean_robustness": sums["robustness_score"] / n,
+            "mean_worst_case": sums["worst_case_score"] / n,
+            "min_worst_case": worst,
+            "mean_epistemic_variance": sums["epistemic_variance"] / n,
+            "mean_epistemic_stability": 1.0 - sums["epistemic_variance"] / n,
+            "mean_sensitivity": sums["sensitivity"] / n,
+            "robust_selected_rate": sums["robust_selected"] / n,
+            "robust_action_rate": sums["robust_actions"] / max(sums["total_actions"], 1),
+            "dro_agreement_rate": sums["dro_agrees"] / n,
+            "greedy_agreement_rate": sums["mean_agrees"] / n,
+        }
+
+
+def _segment_argmax(values: np.ndarray, seg_starts: np.ndarray) -> np.ndarray:
+    """Index within each segment of its maximum (first on ties)."""
+    seg_id = np.repeat(np.arange(len(seg_starts)), np.diff(np.append(seg_starts, len(values))))
+    order = np.lexsort((-values, seg_id))
+    first = np.searchsorted(seg_id[order], np.arange(len(seg_starts)))
+    return order[first] - seg_starts
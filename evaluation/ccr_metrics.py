@@ -1,4 +1,5 @@
 import numpy as np
+from statistics import NormalDist
 from typing import Dict, List, Optional
 
 
@@ -54,16 +55,126 @@ class CCRMetrics:
 
     @staticmethod
     def bootstrap_confidence_interval(
-        scores: List[float], n_bootstrap: int = 1000, ci: float = 0.95
+        scores: List[float],
+        n_bootstrap: int = 1000,
+        ci: float = 0.95,
+        method: str = "percentile",
+        seed: Optional[int] = 0,
     ) -> Dict[str, float]:
-        if not scores:
-            return {"mean": 0.0, "lower": 0.0, "upper": 0.0}
-        arr = np.array(scores)
-        boot_means = [
-            np.mean(np.random.choice(arr, size=len(arr), replace=True))
-            for _ in range(n_bootstrap)
-        ]
+        """
+        Bootstrap CI of the mean of `scores`.
+
+        All resamples are drawn in one pass as an n_bootstrap × n index
+        matrix from a seeded Generator. `method` is "percentile" or "bca"
+        (bias-corrected and accelerated).
+        """
+        return CCRMetrics.bootstrap_confidence_intervals(
+            [scores], n_bootstrap=n_bootstrap, ci=ci, method=method, seed=seed
+        )[0]
+
+    @staticmethod
+    def bootstrap_confidence_intervals(
+        score_arrays: List[List[float]],
+        n_bootstrap: int = 1000,
+        ci: float = 0.95,
+        method: str = "percentile",
+        seed: Optional[int] = 0,
+    ) -> List[Dict[str, float]]:
+        """
+        Batched bootstrap CIs of the mean, one dict per input array.
+
+        Arrays of equal length share one resampling matrix: the resample
+        counts (n_bootstrap × n) are multiplied against the stacked data
+        (k × n), giving all k × n_bootstrap bootstrap means in one matmul.
+        """
+        if method not in ("percentile", "bca"):
+            raise ValueError(f"Unknown bootstrap method: {method!r}")
+
+        rng = np.random.default_rng(seed)
         alpha = 1 - ci
-        lower = float(np.percentile(boot_means, 100 * alpha / 2))
-        upper = float(np.percentile(boot_means, 100 * (1 - alpha / 2)))
-        return {"mean": float(np.mean(arr)), "lower": lower, "upper": upper}
+        out: List[Dict[str, float]] = [
+            {"mean": 0.0, "lower": 0.0, "upper": 0.0} for _ in score_arrays
+        ]
+
+        by_length: Dict[int, List[int]] = {}
+        for i, scores in enumerate(score_arrays):
+            if len(scores):
+                by_length.setdefault(len(scores), []).append(i)
+
+        for n, rows in by_length.items():
+            data = np.asarray([score_arrays[i] for i in rows], dtype=np.float64)
+            idx = rng.integers(0, n, size=(n_bootstrap, n))
+            if len(rows) == 1:
+                boot = data[0][idx].mean(axis=1)[None, :]
+            else:
+                flat = idx + (np.arange(n_bootstrap) * n)[:, None]
+                counts = np.bincount(flat.ravel(), minlength=n_bootstrap * n)
+                counts = counts.reshape(n_bootstrap, n)
+                boot = data @ counts.T / n
+            boot.sort(axis=1)
+            means = data.mean(axis=1)
+
+            if method == "bca":
+                q_lo, q_hi = _bca_quantiles(data, boot, means, alpha)
+            else:
+                q_lo = np.full(len(rows), alpha / 2)
+                q_hi = np.full(len(rows), 1 - alpha / 2)
+
+            lower = _row_quantiles(boot, q_lo)
+            upper = _row_quantiles(boot, q_hi)
+            for j, i in enumerate(rows):
+                out[i] = {
+                    "mean": float(means[j]),
+                    "lower": float(lower[j]),
+                    "upper": float(upper[j]),
+                }
+        return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bootstrap helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+_NORMAL = NormalDist()
+_norm_cdf = np.vectorize(_NORMAL.cdf, otypes=[float])
+_norm_ppf = np.vectorize(_NORMAL.inv_cdf, otypes=[float])
+
+
+def _row_quantiles(sorted_rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Linear-interpolated quantile q[i] of each pre-sorted row i."""
+    n_boot = sorted_rows.shape[1]
+    pos = np.clip(q, 0.0, 1.0) * (n_boot - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, n_boot - 1)
+    frac = pos - lo
+    low = np.take_along_axis(sorted_rows, lo[:, None], axis=1)[:, 0]
+    high = np.take_along_axis(sorted_rows, hi[:, None], axis=1)[:, 0]
+    return low + (high - low) * frac
+
+
+def _bca_quantiles(data: np.ndarray, boot: np.ndarray, means: np.ndarray,
+                   alpha: float):
+    """Adjusted (lower, upper) quantile levels for BCa intervals of the mean."""
+    n_boot = boot.shape[1]
+    n = data.shape[1]
+
+    # Bias correction: share of bootstrap means below the point estimate
+    below = (boot < means[:, None]).mean(axis=1)
+    below = np.clip(below, 1.0 / (n_boot + 1), n_boot / (n_boot + 1))
+    z0 = _norm_ppf(below)
+
+    # Acceleration from the jackknife means
+    if n > 1:
+        jack = (data.sum(axis=1, keepdims=True) - data) / (n - 1)
+        diff = jack.mean(axis=1, keepdims=True) - jack
+        num = (diff ** 3).sum(axis=1)
+        den = 6.0 * (diff ** 2).sum(axis=1) ** 1.5
+        accel = np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+    else:
+        accel = np.zeros(len(data))
+
+    def adjust(level):
+        z = _NORMAL.inv_cdf(level)
+        return _norm_cdf(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+
+    return adjust(alpha / 2), adjust(1 - alpha / 2)
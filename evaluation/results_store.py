@@ -0,0 +1,261 @@
+"""
+Columnar, append-friendly store for evaluation results.
+
+Each evaluation run is a directory of per-column files, so results can be
+streamed to disk case by case and later scanned one column at a time:
+
+    <root>/<run_id>/
+        manifest.json          run metadata (created_at, row counts)
+        cases/<column>.<ext>   one row per test case
+        scores/<column>.<ext>  one row per (case, action, variant) score
+
+Numeric columns are raw little-endian arrays (`.f8` float64, `.i8` int64,
+`.u1` bool) that can be memory-mapped; text columns are JSON-lines
+(`.jsonl`, one JSON value per row). Queries by category or date read the
+manifests and the `category` column only, then load just the requested
+columns for the matching rows.
+"""
+
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# column name → storage type
+CASE_COLUMNS: Dict[str, str] = {
+    "id": "str",
+    "category": "str",
+    "query": "str",
+    "selected_action": "str",
+    "actions": "json",
+    "keyword_alignment": "f8",
+    "robustness_score": "f8",
+    "robustness_pass": "u1",
+    "worst_case_score": "f8",
+    "epistemic_variance": "f8",
+    "epistemic_stability": "f8",
+    "decision_quality": "f8",
+    "response_time_s": "f8",
+    "ci_mean": "f8",
+    "ci_lower": "f8",
+    "ci_upper": "f8",
+}
+
+SCORE_COLUMNS: Dict[str, str] = {
+    "case_row": "i8",
+    "action_idx": "i8",
+    "variant_idx": "i8",
+    "score": "f8",
+}
+
+_NUMPY_DTYPES = {"f8": "<f8", "i8": "<i8", "u1": "u1"}
+_TEXT_KINDS = ("str", "json")
+
+
+def _column_path(table_dir: Path, name: str, kind: str) -> Path:
+    return table_dir / f"{name}.{'jsonl' if kind in _TEXT_KINDS else kind}"
+
+
+def _append_column(path: Path, kind: str, values: List):
+    if kind in _TEXT_KINDS:
+        with open(str(path), "a", encoding="utf-8") as f:
+            for v in values:
+                f.write(json.dumps(v, ensure_ascii=False) + "\n")
+    else:
+        with open(str(path), "ab") as f:
+            np.asarray(values, dtype=_NUMPY_DTYPES[kind]).tofile(f)
+
+
+def _read_column(path: Path, kind: str):
+    if not path.exists():
+        return [] if kind in _TEXT_KINDS else np.empty(0, dtype=_NUMPY_DTYPES[kind])
+    if kind in _TEXT_KINDS:
+        with open(str(path), "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=_NUMPY_DTYPES[kind])
+    return np.memmap(str(path), dtype=_NUMPY_DTYPES[kind], mode="r")
+
+
+def _take(column, rows: Optional[np.ndarray]):
+    if rows is None:
+        return column
+    if isinstance(column, list):
+        return [column[i] for i in rows]
+    return np.asarray(column[rows])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Writer
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RunWriter:
+    """
+    Streams per-case result dicts (as produced by `evaluate_single`) into
+    the column files of one run. Rows are buffered and flushed every
+    `flush_every` cases, and always on `close()`.
+    """
+
+    def __init__(self, run_dir: Path, manifest: Dict, flush_every: int = 50):
+        self.run_dir = run_dir
+        self.manifest = manifest
+        self.flush_every = flush_every
+        self._cases: Dict[str, List] = {c: [] for c in CASE_COLUMNS}
+        self._scores: Dict[str, List] = {c: [] for c in SCORE_COLUMNS}
+        (run_dir / "cases").mkdir(parents=True, exist_ok=True)
+        (run_dir / "scores").mkdir(parents=True, exist_ok=True)
+
+    def append(self, result: Dict):
+        case_row = self.manifest["n_cases"] + len(self._cases["id"])
+        ci = result.get("bootstrap_ci_95") or {}
+        row = dict(result)
+        row["ci_mean"] = ci.get("mean", 0.0)
+        row["ci_lower"] = ci.get("lower", 0.0)
+        row["ci_upper"] = ci.get("upper", 0.0)
+        for col in CASE_COLUMNS:
+            self._cases[col].append(row.get(col))
+
+        for a_idx, variant_scores in enumerate(result.get("score_matrix", [])):
+            for v_idx, score in enumerate(variant_scores):
+                self._scores["case_row"].append(case_row)
+                self._scores["action_idx"].append(a_idx)
+                self._scores["variant_idx"].append(v_idx)
+                self._scores["score"].append(score)
+
+        if len(self._cases["id"]) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        n_new = len(self._cases["id"])
+        if not n_new:
+            return
+        for table, columns, schema in (
+            ("cases", self._cases, CASE_COLUMNS),
+            ("scores", self._scores, SCORE_COLUMNS),
+        ):
+            for col, kind in schema.items():
+                _append_column(
+                    _column_path(self.run_dir / table, col, kind), kind, columns[col]
+                )
+                columns[col] = []
+        self.manifest["n_cases"] += n_new
+        (self.run_dir / "manifest.json").write_text(json.dumps(self.manifest, indent=2))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Store
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ColumnarResultStore:
+    """
+    Directory of evaluation runs in columnar layout.
+
+    Usage:
+        store = ColumnarResultStore("results/store")
+        with store.open_run() as writer:
+            writer.append(evaluate_single(agent, tc))
+        cases = store.query(category="ethics", columns=["robustness_score"])
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def open_run(self, run_id: Optional[str] = None, **metadata) -> RunWriter:
+        created = datetime.now()
+        run_id = run_id or f"{created:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        run_dir = self.root / run_id
+        manifest = {
+            "run_id": run_id,
+            "created_at": created.isoformat(timespec="seconds"),
+            "n_cases": 0,
+            **metadata,
+        }
+        run_dir.mkdir(parents=True, exist_ok=True)
+        (run_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        return RunWriter(run_dir, manifest)
+
+    # ── Run discovery ────────────────────────────────────────────────────────
+
+    def runs(self, since: Optional[str] = None,
+             until: Optional[str] = None) -> List[Dict]:
+        """Manifests of stored runs, oldest first, filtered by ISO date."""
+        manifests = []
+        if not self.root.exists():
+            return manifests
+        for path in sorted(self.root.glob("*/manifest.json")):
+            m = json.loads(path.read_text())
+            if since and m["created_at"] < since:
+                continue
+            if until and m["created_at"] > until:
+                continue
+            manifests.append(m)
+        manifests.sort(key=lambda m: m["created_at"])
+        return manifests
+
+    # ── Column access ────────────────────────────────────────────────────────
+
+    def read_cases(self, run_id: str, columns: Optional[Iterable[str]] = None,
+                   category: Optional[str] = None) -> Dict:
+        """
+        Read case columns of one run. When `category` is given only the
+        category column is scanned to select rows.
+        """
+        table = self.root / run_id / "cases"
+        columns = list(columns or CASE_COLUMNS)
+        rows = None
+        if category is not None:
+            cats = _read_column(_column_path(table, "category", "str"), "str")
+            rows = np.array([i for i, c in enumerate(cats) if c == category], dtype=int)
+        out = {
+            col: _take(_read_column(_column_path(table, col, CASE_COLUMNS[col]),
+                                    CASE_COLUMNS[col]), rows)
+            for col in columns
+        }
+        out["case_row"] = (
+            rows if rows is not None
+            else np.arange(len(next(iter(out.values()), [])))
+        )
+        return out
+
+    def read_scores(self, run_id: str,
+                    case_rows: Optional[Iterable[int]] = None) -> Dict[str, np.ndarray]:
+        """Read the (case, action, variant) score table of one run."""
+        table = self.root / run_id / "scores"
+        cols = {
+            col: np.asarray(_read_column(_column_path(table, col, kind), kind))
+            for col, kind in SCORE_COLUMNS.items()
+        }
+        if case_rows is not None:
+            mask = np.isin(cols["case_row"], np.asarray(list(case_rows), dtype=int))
+            cols = {k: v[mask] for k, v in cols.items()}
+        return cols
+
+    def query(self, category: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None,
+              columns: Optional[Iterable[str]] = None) -> Dict:
+        """Concatenate case columns across runs matching category / date."""
+        columns = list(columns or CASE_COLUMNS)
+        merged: Dict[str, List] = {c: [] for c in columns}
+        merged["run_id"] = []
+        for m in self.runs(since=since, until=until):
+            part = self.read_cases(m["run_id"], columns, category=category)
+            n = len(part["case_row"])
+            for c in columns:
+                merged[c].extend(list(part[c]))
+            merged["run_id"].extend([m["run_id"]] * n)
+        return {
+            c: (v if CASE_COLUMNS.get(c, "str") in _TEXT_KINDS else np.asarray(v))
+            for c, v in merged.items()
+        }
@@ -7,7 +7,7 @@ Covers:
   - Baseline (greedy / mean-score) vs CCR comparison
   - Per-query and aggregate metrics
   - Bootstrap confidence intervals
-  - JSON + human-readable report output
+  - Columnar results store + JSON summary + human-readable report output
 """
 
 import json
@@ -21,8 +21,16 @@ import numpy as np
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from core.contrastive_router import ContrastiveCognitiveRouter
 from core.proxy_agent import EpistemicProxyAgent
 from evaluation.ccr_metrics import CCRMetrics
+from evaluation.results_store import (
+    CASE_COLUMNS,
+    SCORE_COLUMNS,
+    ColumnarResultStore,
+)
+from utils.model_client import ModelClient
+from utils.transcript_store import TranscriptMissError
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Expanded Test Suite
@@ -128,6 +136,75 @@ class BaselineGreedyRouter:
         best = max(action_scores.items(), key=lambda kv: kv[1]["mean_score"])
         return best[0]
 
+    @staticmethod
+    def select_batch(score_tensor: np.ndarray) -> np.ndarray:
+        """Action index per case from a (cases × actions × variants) tensor."""
+        return select_greedy_mean(score_tensor)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Vectorized selectors over NaN-padded (cases × actions × variants) tensors
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _nan_argmax(values: np.ndarray) -> np.ndarray:
+    return np.argmax(np.where(np.isnan(values), -np.inf, values), axis=1)
+
+
+def select_greedy_mean(t: np.ndarray) -> np.ndarray:
+    """Highest mean score across variants."""
+    return _nan_argmax(np.nanmean(t, axis=2))
+
+
+def select_max_min(t: np.ndarray) -> np.ndarray:
+    """Highest worst-case score across variants (pure max-min)."""
+    return _nan_argmax(np.nanmin(t, axis=2))
+
+
+def select_ccr_dro(t: np.ndarray) -> np.ndarray:
+    """CCR objective: worst-case score minus λ·variance."""
+    lam = ContrastiveCognitiveRouter.VARIANCE_PENALTY
+    return _nan_argmax(np.nanmin(t, axis=2) - lam * np.nanvar(t, axis=2))
+
+
+SELECTORS = {
+    "greedy_mean": select_greedy_mean,
+    "max_min": select_max_min,
+    "ccr_dro": select_ccr_dro,
+}
+
+
+def build_score_tensor(cases: Dict, scores: Dict) -> np.ndarray:
+    """
+    Scatter the (case_row, action_idx, variant_idx, score) table into a
+    NaN-padded tensor aligned with the rows of `cases`. Cases differ in
+    their action and variant counts; padding keeps each case's matrix intact.
+    """
+    case_rows = np.asarray(cases["case_row"], dtype=int)
+    score_case = np.asarray(scores["case_row"], dtype=int)
+    action_idx = np.asarray(scores["action_idx"], dtype=int)
+    variant_idx = np.asarray(scores["variant_idx"], dtype=int)
+
+    n_actions = int(action_idx.max()) + 1 if len(action_idx) else 0
+    n_variants = int(variant_idx.max()) + 1 if len(variant_idx) else 0
+    tensor = np.full((len(case_rows), n_actions, n_variants), np.nan)
+    if not len(case_rows):
+        return tensor
+
+    order = np.argsort(case_rows)
+    pos = np.minimum(np.searchsorted(case_rows[order], score_case), len(case_rows) - 1)
+    known = case_rows[order][pos] == score_case
+    rows = order[pos[known]]
+    tensor[rows, action_idx[known], variant_idx[known]] = np.asarray(
+        scores["score"], dtype=float
+    )[known]
+    return tensor
+
+
+def _selected_stats(t: np.ndarray, choice: np.ndarray):
+    """Worst-case score and variance of the chosen action of each case."""
+    chosen = t[np.arange(len(t)), choice]
+    return np.nanmin(chosen, axis=1), np.nanvar(chosen, axis=1)
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Per-query evaluation
@@ -151,6 +228,7 @@ def evaluate_single(agent: EpistemicProxyAgent, test_case: Dict) -> Dict:
 
     routing = result["routing_result"]
     metrics = result["metrics"]
+    actions = list(routing.actions)
 
     selected = routing.selected_action
     explanation = result.get("response", "")
@@ -166,10 +244,12 @@ def evaluate_single(agent: EpistemicProxyAgent, test_case: Dict) -> Dict:
         "robustness_threshold", 0.60
     )
 
-    # Collect raw variant scores for statistical analysis
-    raw_scores: List[float] = []
-    for action_data in routing.action_scores.values():
-        raw_scores.extend(action_data.get("scores", []))
+    # Full action × variant score matrix, rows in `actions` order
+    score_matrix: List[List[float]] = [
+        [float(s) for s in action_data.get("scores", [])]
+        for action_data in routing.action_scores.values()
+    ]
+    raw_scores: List[float] = [s for row in score_matrix for s in row]
 
     ci = CCRMetrics.bootstrap_confidence_interval(raw_scores)
 
@@ -188,6 +268,8 @@ def evaluate_single(agent: EpistemicProxyAgent, test_case: Dict) -> Dict:
         "response_time_s": round(elapsed, 2),
         "bootstrap_ci_95": ci,
         "raw_variant_scores": raw_scores,
+        "actions": actions,
+        "score_matrix": score_matrix,
     }
 
 
@@ -195,9 +277,34 @@ def evaluate_single(agent: EpistemicProxyAgent, test_case: Dict) -> Dict:
 # Aggregate statistics
 # ─────────────────────────────────────────────────────────────────────────────
 
+def _results_to_columns(results: List[Dict]) -> Dict:
+    """Transpose per-case dicts into the case/score columns of the store."""
+    cases: Dict[str, List] = {col: [] for col in CASE_COLUMNS}
+    scores: Dict[str, List] = {col: [] for col in SCORE_COLUMNS}
+    for row, r in enumerate(results):
+        ci = r.get("bootstrap_ci_95") or {}
+        for col in CASE_COLUMNS:
+            cases[col].append(
+                ci.get(col[3:], 0.0) if col.startswith("ci_") else r.get(col)
+            )
+        for a_idx, variant_scores in enumerate(r.get("score_matrix", [])):
+            for v_idx, score in enumerate(variant_scores):
+                scores["case_row"].append(row)
+                scores["action_idx"].append(a_idx)
+                scores["variant_idx"].append(v_idx)
+                scores["score"].append(score)
+    cases["case_row"] = np.arange(len(results))
+    return {"cases": cases, "scores": {k: np.asarray(v) for k, v in scores.items()}}
+
+
 def aggregate(results: List[Dict]) -> Dict:
+    return aggregate_columns(_results_to_columns(results)["cases"])
+
+
+def aggregate_columns(cases: Dict) -> Dict:
+    """Aggregate metrics from case columns (lists or arrays, one row per case)."""
     def _arr(key):
-        return [r[key] for r in results]
+        return np.asarray(cases[key], dtype=float)
 
     robustness = _arr("robustness_score")
     variance = _arr("epistemic_variance")
@@ -206,20 +313,20 @@ def aggregate(results: List[Dict]) -> Dict:
     alignment = _arr("keyword_alignment")
     times = _arr("response_time_s")
 
-    pass_rate = sum(r["robustness_pass"] for r in results) / len(results)
+    pass_rate = float(np.mean(_arr("robustness_pass")))
 
     # Per-category breakdown
-    categories: Dict[str, List] = {}
-    for r in results:
-        categories.setdefault(r["category"], []).append(r["robustness_score"])
-
-    cat_summary = {
-        cat: {"mean_robustness": round(float(np.mean(vals)), 3), "n": len(vals)}
-        for cat, vals in categories.items()
-    }
+    categories = np.asarray(cases["category"])
+    cat_summary = {}
+    for cat in dict.fromkeys(cases["category"]):
+        vals = robustness[categories == cat]
+        cat_summary[cat] = {
+            "mean_robustness": round(float(np.mean(vals)), 3),
+            "n": int(len(vals)),
+        }
 
     return {
-        "n_queries": len(results),
+        "n_queries": int(len(robustness)),
         "robustness_pass_rate": round(pass_rate, 3),
         "mean_robustness": round(float(np.mean(robustness)), 3),
         "std_robustness": round(float(np.std(robustness)), 3),
@@ -229,7 +336,7 @@ def aggregate(results: List[Dict]) -> Dict:
         "mean_keyword_alignment": round(float(np.mean(alignment)), 3),
         "mean_response_time_s": round(float(np.mean(times)), 2),
         "bootstrap_ci_robustness": CCRMetrics.bootstrap_confidence_interval(
-            robustness
+            list(robustness)
         ),
         "category_breakdown": cat_summary,
     }
@@ -240,53 +347,85 @@ def aggregate(results: List[Dict]) -> Dict:
 # ─────────────────────────────────────────────────────────────────────────────
 
 def baseline_comparison(results: List[Dict]) -> Dict:
+    cols = _results_to_columns(results)
+    return baseline_comparison_columns(cols["cases"], cols["scores"])
+
+
+def baseline_comparison_columns(cases: Dict, scores: Dict,
+                                selectors: Optional[Dict] = None) -> Dict:
     """
     Simulates what a greedy (mean-score) router would have chosen
     and computes worst-case improvement for each query.
+
+    Works on the full per-case action × variant score matrices, padded into
+    one tensor, so every selector in `selectors` (default: SELECTORS) is
+    evaluated for the whole suite in a few vectorized passes without any
+    LLM calls.
     """
-    improvements: List[float] = []
-    variance_reductions: List[float] = []
+    selectors = SELECTORS if selectors is None else selectors
+    tensor = build_score_tensor(cases, scores)
+
+    # Cases need at least two scores to compare (errors have none)
+    valid = (~np.isnan(tensor)).sum(axis=(1, 2)) >= 2
+    if not valid.any():
+        return {
+            "mean_worst_case_improvement_vs_greedy": 0.0,
+            "mean_variance_reduction_vs_greedy": 0.0,
+            "selectors": {},
+        }
 
-    for r in results:
-        raw = r["raw_variant_scores"]
-        if len(raw) < 2:
-            continue
-
-        # Split raw scores evenly across actions (3 variants each assumed)
-        chunk = max(1, len(raw) // 3)
-        action_chunks = [raw[i : i + chunk] for i in range(0, len(raw), chunk)]
-
-        if not action_chunks:
-            continue
-
-        # CCR chose max worst-case
-        ccr_worst = r["worst_case_score"]
-        # Baseline: choose action with max mean → its worst-case
-        means = [np.mean(c) for c in action_chunks if c]
-        best_mean_idx = int(np.argmax(means))
-        baseline_worst = float(np.min(action_chunks[best_mean_idx]))
-
-        improvement = CCRMetrics.calculate_worst_case_improvement(
-            [baseline_worst], [ccr_worst]
-        )
-        improvements.append(improvement)
+    tensor = tensor[valid]
+    ccr_worst = np.asarray(cases["worst_case_score"], dtype=float)[valid]
+    ccr_var = np.asarray(cases["epistemic_variance"], dtype=float)[valid]
+    ccr_choice = select_ccr_dro(tensor)
 
-        baseline_var = float(np.var(action_chunks[best_mean_idx]))
-        ccr_var = r["epistemic_variance"]
-        variance_reductions.append(
-            CCRMetrics.calculate_variance_reduction(baseline_var, ccr_var)
+    def _compare(base_worst, base_var):
+        improvement = np.divide(
+            ccr_worst - base_worst, base_worst,
+            out=np.zeros_like(base_worst), where=base_worst != 0,
         )
+        reduction = np.divide(
+            base_var - ccr_var, base_var,
+            out=np.zeros_like(base_var), where=base_var != 0,
+        )
+        return float(np.mean(improvement)), float(np.mean(np.clip(reduction, -1.0, 1.0)))
+
+    summary = {}
+    for name, select in selectors.items():
+        choice = select(tensor)
+        worst, var = _selected_stats(tensor, choice)
+        improvement, reduction = _compare(worst, var)
+        summary[name] = {
+            "mean_worst_case": round(float(np.mean(worst)), 3),
+            "mean_variance": round(float(np.mean(var)), 3),
+            "agreement_with_ccr": round(float(np.mean(choice == ccr_choice)), 3),
+            "ccr_worst_case_improvement": round(improvement, 3),
+            "ccr_variance_reduction": round(reduction, 3),
+        }
 
+    greedy_worst, greedy_var = _selected_stats(
+        tensor, BaselineGreedyRouter.select_batch(tensor)
+    )
+    improvement, reduction = _compare(greedy_worst, greedy_var)
     return {
-        "mean_worst_case_improvement_vs_greedy": round(
-            float(np.mean(improvements)) if improvements else 0.0, 3
-        ),
-        "mean_variance_reduction_vs_greedy": round(
-            float(np.mean(variance_reductions)) if variance_reductions else 0.0, 3
-        ),
+        "mean_worst_case_improvement_vs_greedy": round(improvement, 3),
+        "mean_variance_reduction_vs_greedy": round(reduction, 3),
+        "selectors": summary,
     }
 
 
+def compare_selectors(store: ColumnarResultStore, run_id: str,
+                      selectors: Optional[Dict] = None,
+                      category: Optional[str] = None) -> Dict:
+    """Re-run selector comparison on a stored run — no agent, no LLM calls."""
+    cases = store.read_cases(
+        run_id, ["category", "worst_case_score", "epistemic_variance"],
+        category=category,
+    )
+    scores = store.read_scores(run_id, case_rows=cases["case_row"])
+    return baseline_comparison_columns(cases, scores, selectors)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Report
 # ─────────────────────────────────────────────────────────────────────────────
@@ -360,48 +499,87 @@ def run_evaluation(
     test_cases: Optional[List[Dict]] = None,
     output_dir: str = "results",
     save_json: bool = True,
+    transcript_mode: Optional[str] = None,
+    transcript_path: Optional[str] = None,
 ) -> Dict:
+    """
+    Run the test suite through a fresh agent.
+
+    With transcript_mode="record" every LLM response is written to the
+    transcript; transcript_mode="replay" reruns the suite from it without
+    calling the model. The agent seeds variant generation from each case's
+    context, so replays issue exactly the prompts that were recorded.
+
+    Per-case results, including every (action, variant) score, are streamed
+    to a columnar store under `<output_dir>/store`; aggregates are computed
+    by scanning its columns. Only slim per-case summaries stay in memory and
+    go into the JSON report.
+    """
     if test_cases is None:
         test_cases = TEST_SUITE
 
     os.makedirs(output_dir, exist_ok=True)
 
     print("Initializing EpistemicProxyAgent...")
-    agent = EpistemicProxyAgent()
+    # Decision memory stays off: every case must be routed in full; the
+    # candidate library too, so every case generates its own candidates
+    agent = EpistemicProxyAgent(
+        model_client=ModelClient(transcript_mode, transcript_path),
+        use_memory=False,
+        use_archive=False,
+        use_library=False,
+    )
+
+    store = ColumnarResultStore(Path(output_dir) / "store")
 
     print(f"\nRunning evaluation on {len(test_cases)} test cases...\n")
     results: List[Dict] = []
-    for tc in test_cases:
-        print(f"  → [{tc['id']}] {tc['query'][:60]}...")
-        try:
-            res = evaluate_single(agent, tc)
-        except Exception as e:
-            print(f"    ⚠️  Error: {e}")
-            res = {
-                "id": tc["id"],
-                "category": tc["category"],
-                "query": tc["query"],
-                "selected_action": "ERROR",
-                "keyword_alignment": 0.0,
-                "robustness_score": 0.0,
-                "robustness_pass": False,
-                "worst_case_score": 0.0,
-                "epistemic_variance": 1.0,
-                "epistemic_stability": 0.0,
-                "decision_quality": 0.0,
-                "response_time_s": 0.0,
-                "bootstrap_ci_95": {"mean": 0.0, "lower": 0.0, "upper": 0.0},
-                "raw_variant_scores": [],
-            }
-        results.append(res)
-
-    agg = aggregate(results)
-    baseline = baseline_comparison(results)
+    # The writer is closed (flushed) even when a strict replay misses, so
+    # the run is never left half-written
+    with store.open_run(n_planned=len(test_cases)) as writer:
+        for tc in test_cases:
+            print(f"  → [{tc['id']}] {tc['query'][:60]}...")
+            try:
+                res = evaluate_single(agent, tc)
+            except TranscriptMissError:
+                # A strict replay that misses is not a result: fail the run
+                raise
+            except Exception as e:
+                print(f"    ⚠️  Error: {e}")
+                res = {
+                    "id": tc["id"],
+                    "category": tc["category"],
+                    "query": tc["query"],
+                    "selected_action": "ERROR",
+                    "keyword_alignment": 0.0,
+                    "robustness_score": 0.0,
+                    "robustness_pass": False,
+                    "worst_case_score": 0.0,
+                    "epistemic_variance": 1.0,
+                    "epistemic_stability": 0.0,
+                    "decision_quality": 0.0,
+                    "response_time_s": 0.0,
+                    "bootstrap_ci_95": {"mean": 0.0, "lower": 0.0, "upper": 0.0},
+                    "raw_variant_scores": [],
+                    "actions": [],
+                    "score_matrix": [],
+                }
+            writer.append(res)
+            results.append(
+                {k: v for k, v in res.items()
+                 if k not in ("raw_variant_scores", "actions", "score_matrix")}
+            )
+
+    run_id = writer.manifest["run_id"]
+    cases = store.read_cases(run_id)
+    agg = aggregate_columns(cases)
+    baseline = baseline_comparison_columns(cases, store.read_scores(run_id))
 
     print_report(results, agg, baseline)
 
     if save_json:
         output = {
+            "run_id": run_id,
             "results": results,
             "aggregate": agg,
             "baseline_comparison": baseline,
@@ -411,7 +589,12 @@ def run_evaluation(
             json.dump(output, f, indent=2, default=lambda x: bool(x) if isinstance(x, np.bool_) else str(x))
         print(f"JSON report saved to {out_path}")
 
-    return {"results": results, "aggregate": agg, "baseline_comparison": baseline}
+    return {
+        "run_id": run_id,
+        "results": results,
+        "aggregate": agg,
+        "baseline_comparison": baseline,
+    }
 
 
 if __name__ == "__main__":
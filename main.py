@@ -6,6 +6,7 @@ Main entry point for Contrastive Cognitive Routing Agent
 import argparse
 import os
 import sys
+from pathlib import Path
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -20,7 +21,14 @@ def _generate_demo_queries(agent: EpistemicProxyAgent) -> list:
         "Cover different domains: one financial/budget decision and one operational/ethical decision. "
         "Return ONLY the 2 queries, one per line, no numbering, no extra text."
     )
-    response = agent.model_client.generate(prompt, temperature=0.9, max_tokens=100)
+    from utils.rate_limiter import ProviderError
+
+    try:
+        with agent.model_client.priority("demo"):
+            response = agent.model_client.generate(prompt, temperature=0.9, max_tokens=100)
+    except ProviderError as e:
+        print(f"  ⚠️  Could not generate demo queries ({e}); using defaults")
+        response = ""
     queries = [line.strip() for line in response.strip().split("\n") if line.strip()]
     # Guarantee exactly 2 fallback queries if generation fails
     fallbacks = [
@@ -62,27 +70,149 @@ def run_demo():
         print(f"{result['response']}")
 
 
+def run_reroute():
+    """Re-route stored decisions affected by edited identity / policy files."""
+    from core.rerouting import IncrementalRerouter
+
+    agent = EpistemicProxyAgent(use_memory=True)
+    report = IncrementalRerouter(agent).reroute()
+
+    print(f"\n🔁 Re-routing {len(report)} stored decisions")
+    for entry in report:
+        if entry["status"] != "rerouted":
+            continue
+        flag = "CHANGED" if entry["decision_changed"] else "kept"
+        print(f"  [{flag}] {entry['query'][:60]}")
+        print(f"     nodes: {', '.join(entry['changed_nodes'])} | "
+              f"{entry['retrieval']}, {entry['variants_rescored']}/"
+              f"{entry['n_variants']} variants re-scored")
+    counts = {}
+    for entry in report:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(f"\n  {counts}")
+
+
+def run_mine_candidates():
+    """Bootstrap the candidate library from the decisions in memory."""
+    agent = EpistemicProxyAgent(use_memory=True, use_library=True)
+    library = agent.candidate_library
+    n = library.mine(agent.memory.records)
+    print(f"\n📚 Mined {n} past decisions into {len(library)} library entries")
+    for key, entry in library.summary().items():
+        state = f"{len(entry['actions'])} confident actions" if entry["actions"] else "learning"
+        print(f"  {key:50s} {entry['observations']:3d} sets, {state}")
+
+
+def run_batch(input_path: str, output_path: str = None):
+    """Route every query in a file (one per line, or a JSON list) as one batch."""
+    import json
+
+    text = Path(input_path).read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        queries = json.loads(text)
+    else:
+        queries = [line.strip() for line in text.splitlines() if line.strip()]
+
+    agent = EpistemicProxyAgent()
+    print(f"\n📦 Routing {len(queries)} queries as one batch")
+    results = agent.process_batch(queries, lazy_explanation=True)
+
+    rows = []
+    for result in results:
+        routing = result["routing_result"]
+        rows.append({
+            "query": result["query"],
+            "selected_action": routing.selected_action,
+            "memory_hit": result["memory"].get("hit", False),
+            **result["metrics"],
+        })
+        print(f"  {routing.selected_action[:50]:50s} ← {result['query'][:60]}")
+
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        print(f"\n  Results written to {output_path}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Contrastive Cognitive Routing for Epistemic-Aware Proxy Agents"
     )
     parser.add_argument(
         "--mode",
-        choices=["demo", "single", "eval"],
+        choices=["demo", "single", "eval", "serve", "reroute", "batch",
+                 "mine-candidates"],
         default="demo",
         help="Mode to run",
     )
     parser.add_argument("--query", type=str, help="Query to process (single mode)")
+    parser.add_argument("--input", type=str, help="Query file (batch mode)")
+    parser.add_argument("--output", type=str, help="JSONL results file (batch mode)")
+    parser.add_argument(
+        "--deadline", type=float,
+        help="Seconds the single query may take; the pipeline degrades to fit",
+    )
+    parser.add_argument(
+        "--priority", choices=["high", "normal", "low"], default="normal",
+        help="Scheduling priority (with --deadline)",
+    )
+    parser.add_argument(
+        "--speculative", action="store_true",
+        help="Show a provisional action after the first variant (single mode)",
+    )
+    parser.add_argument(
+        "--refresh-candidates", action="store_true",
+        help="Generate candidate actions even on a candidate library match",
+    )
+    parser.add_argument(
+        "--transcripts",
+        choices=["record", "replay"],
+        help="Record LLM responses to, or replay them from, the transcript store",
+    )
+    parser.add_argument(
+        "--transcript-path", type=str, help="Transcript file (default: config)"
+    )
+    parser.add_argument(
+        "--lenient-replay", action="store_true",
+        help="On a replay miss call the model and record it instead of failing",
+    )
 
     args = parser.parse_args()
 
+    if args.transcripts:
+        from config import config
+        config.TRANSCRIPT_MODE = args.transcripts
+        if args.transcript_path:
+            config.TRANSCRIPT_PATH = Path(args.transcript_path)
+        if args.lenient_replay:
+            config.TRANSCRIPT_STRICT = False
+
     if args.query:
         agent = EpistemicProxyAgent()
-        result = agent.process_query(args.query)
+        if args.deadline:
+            from core.query_scheduler import QueryScheduler
+            scheduler = QueryScheduler(agent, workers=1)
+            result = scheduler.run(args.query, args.deadline, args.priority)
+            scheduler.close()
+        elif args.speculative:
+            result = agent.process_speculative(args.query)
+            spec = result["speculation"]
+            print(f"\nProvisional Action: {spec['provisional_action']}")
+            spec["settled"].result()
+            print("Provisional action held" if spec["held"]
+                  else f"Revised after all variants: {spec['final_action']}")
+        else:
+            result = agent.process_query(args.query,
+                                         refresh_candidates=args.refresh_candidates)
         print(f"\nQuery: {args.query}")
         print(f"\nSelected Action: {result['routing_result'].selected_action}")
         print(f"\nResponse: {result['response']}")
         print(f"\nMetrics: {result['metrics']}")
+        print(f"\nRetrieval cost: {result['retrieval_cost']}")
+        if args.deadline:
+            print(f"\nDegradations: {result['degradations'] or 'none'}")
+            print(f"Schedule: {result['schedule']}")
 
     elif args.mode == "demo":
         run_demo()
@@ -91,6 +221,21 @@ def main():
         from evaluation.run_eval import run_evaluation
         run_evaluation()
 
+    elif args.mode == "serve":
+        from server import run_server
+        run_server()
+
+    elif args.mode == "reroute":
+        run_reroute()
+
+    elif args.mode == "batch":
+        if not args.input:
+            parser.error("--mode batch needs --input")
+        run_batch(args.input, args.output)
+
+    elif args.mode == "mine-candidates":
+        run_mine_candidates()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+HTTP serving mode for the Contrastive Cognitive Routing agent.
+
+One long-running asyncio process holds a single warm EpistemicProxyAgent
+(model client, retriever, document tree) shared by every client:
+
+    POST /route         {"query": "..."}             → one routing result
+                        optional "deadline" (seconds) and "priority"
+                        ("high" | "normal" | "low") on any /route*
+                        endpoint: the plan is degraded to finish in time
+    POST /route/batch   {"queries": ["...", ...]}    → {"results": [...]}
+    POST /route/stream  {"queries": ["...", ...]}    → NDJSON events as
+                                                        each query finishes
+    POST /reload                                     → re-read identity /
+                                                        policies (in-flight
+                                                        queries keep theirs)
+    GET  /health                                     → queue / worker state
+
+Identical in-flight queries are coalesced into one pipeline execution.
+When more than SERVER_MAX_QUEUE queries are pending, or the model
+provider's rate limit is exhausted, the server answers 503 with
+Retry-After instead of queueing unboundedly; a batch or stream is
+admitted whole or rejected whole. SIGINT / SIGTERM
+stop accepting connections and drain in-flight work before exiting.
+
+Run: python server.py  (or python main.py --mode serve)
+"""
+
+import asyncio
+import dataclasses
+import json
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import config  # noqa: E402
+from core.proxy_agent import EpistemicProxyAgent  # noqa: E402
+from core.query_scheduler import PRIORITIES, QueryScheduler  # noqa: E402
+from utils.rate_limiter import RateLimitError  # noqa: E402
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class Overloaded(Exception):
+    """Raised when the pending-query limit is reached."""
+
+
+def _jsonable(obj):
+    """JSON default hook for routing results (dataclasses, numpy scalars)."""
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def serialize_result(result: Dict) -> Dict:
+    """Plain-JSON view of a process_query result (forces a lazy memo)."""
+    payload = {**result, "response": result.get("response")}
+    return json.loads(json.dumps(payload, default=_jsonable))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Routing service (coalescing + back-pressure)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RoutingService:
+    """
+    Runs process_query on a bounded thread pool around one shared agent.
+
+    Concurrent requests for the same query share a single future, so the
+    pipeline runs once per distinct in-flight query. Requests with a
+    deadline or priority go through a QueryScheduler that runs on the same
+    thread pool, so `workers` caps every pipeline execution together.
+    """
+
+    def __init__(self, agent: EpistemicProxyAgent, workers: int,
+                 max_queue: int):
+        self.agent = agent
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ccr-route"
+        )
+        self.scheduler = QueryScheduler(agent, executor=self._executor)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+        self.completed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._inflight)
+
+    def route(self, query: str, deadline: Optional[float] = None,
+              priority: Optional[str] = None) -> asyncio.Future:
+        """Future for the serialized result of `query` (shared if in flight)."""
+        query = " ".join(query.split())
+        scheduled = deadline is not None or priority is not None
+        key = self._key(query, deadline, priority)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        if len(self._inflight) >= self.max_queue:
+            raise Overloaded(f"{len(self._inflight)} queries pending")
+
+        if scheduled:
+            future = asyncio.ensure_future(
+                self._scheduled(query, deadline, priority or "normal")
+            )
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._run, query)
+        self._inflight[key] = future
+        future.add_done_callback(lambda _f: self._finish(key))
+        return future
+
+    def route_many(self, queries: List[str], deadline: Optional[float] = None,
+                   priority: Optional[str] = None) -> List[asyncio.Future]:
+        """Futures for a batch, admitted as a whole or not at all."""
+        new = {self._key(q, deadline, priority) for q in queries} - set(self._inflight)
+        if len(self._inflight) + len(new) > self.max_queue:
+            raise Overloaded(
+                f"{len(self._inflight)} queries pending, batch needs {len(new)} more"
+            )
+        return [self.route(q, deadline, priority) for q in queries]
+
+    @staticmethod
+    def _key(query: str, deadline: Optional[float], priority: Optional[str]) -> str:
+        """In-flight key: the normalized query, plus its schedule if any."""
+        query = " ".join(query.split())
+        if deadline is None and priority is None:
+            return query
+        return f"{query}\x00{deadline}\x00{priority}"
+
+    async def reload(self) -> Dict:
+        """Swap in edited identity / policy files without a restart."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.agent.reload)
+
+    def _run(self, query: str) -> Dict:
+        return serialize_result(self.agent.process_query(query))
+
+    async def _scheduled(self, query: str, deadline: Optional[float],
+                         priority: str) -> Dict:
+        result = await asyncio.wrap_future(
+            self.scheduler.submit(query, deadline, priority)
+        )
+        return serialize_result(result)
+
+    def _finish(self, key: str):
+        self._inflight.pop(key, None)
+        self.completed += 1
+
+    async def drain(self, timeout: float):
+        pending = list(self._inflight.values())
+        if pending:
+            print(f"  Draining {len(pending)} in-flight queries...")
+            await asyncio.wait(pending, timeout=timeout)
+        self.scheduler.close(wait=False)
+        self._executor.shutdown(wait=False)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# HTTP layer (minimal HTTP/1.1 over asyncio streams)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RoutingServer:
+
+    def __init__(self, service: RoutingService, host: str, port: int):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set = set()
+
+    async def serve(self, drain_timeout: float):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"✅ CCR server listening on http://{self.host}:{self.port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # pragma: no cover - Windows
+                pass
+
+        async with self._server:
+            await stop.wait()
+            print("\n  Shutting down: no longer accepting connections")
+            self._server.close()
+            await self.service.drain(drain_timeout)
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=drain_timeout)
+        print("  Server stopped")
+
+    # ── Connection handling ──────────────────────────────────────────────────
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, path, body = request
+            await self._dispatch(method, path, body, writer)
+        except Overloaded as e:
+            await self._send_json(writer, 503, {"error": "overloaded", "detail": str(e)},
+                                  extra_headers={"Retry-After": "1"})
+        except RateLimitError as e:
+            # Provider quota exhausted: push back on clients rather than
+            # answering with degraded decisions
+            await self._send_json(writer, 503, {"error": "rate_limited", "detail": str(e)},
+                                  extra_headers={"Retry-After": "30"})
+        except ValueError as e:
+            await self._send_json(writer, 400, {"error": str(e)})
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": str(e)[:200]})
+        finally:
+            self._handlers.discard(task)
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ValueError("Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], body
+
+    async def _dispatch(self, method: str, path: str, body: bytes,
+                        writer: asyncio.StreamWriter):
+        if path == "/health":
+            await self._send_json(writer, 200, {
+                "status": "ok",
+                "queue_depth": self.service.queue_depth,
+                "max_queue": self.service.max_queue,
+                "completed": self.service.completed,
+                "coalesced": self.service.coalesced,
+                "scheduler": self.service.scheduler.stats,
+                "snapshot_version": self.service.agent.snapshot.version,
+                "cloud_index": self.service.agent.retriever.cloud_status,
+            })
+            return
+
+        routes = {
+            "/route": self._route_one,
+            "/route/batch": self._route_batch,
+            "/route/stream": self._route_stream,
+            "/reload": self._reload,
+        }
+        if path not in routes:
+            await self._send_json(writer, 404, {"error": f"No route {path}"})
+            return
+        if method != "POST":
+            await self._send_json(writer, 405, {"error": "Use POST"})
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise ValueError("Body must be JSON")
+        await routes[path](payload, writer)
+
+    # ── Endpoints ────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _queries(payload: Dict) -> List[str]:
+        queries = payload.get("queries")
+        if queries is None and payload.get("query"):
+            queries = [payload["query"]]
+        if not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            raise ValueError("Provide 'query' or a non-empty list of 'queries'")
+        return queries
+
+    @staticmethod
+    def _schedule(payload: Dict) -> Dict:
+        """Optional deadline / priority of a request, validated."""
+        deadline = payload.get("deadline")
+        priority = payload.get("priority")
+        if deadline is not None and (
+            isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+            or deadline <= 0
+        ):
+            raise ValueError("'deadline' must be a positive number of seconds")
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError(f"'priority' must be one of {', '.join(PRIORITIES)}")
+        return {"deadline": deadline, "priority": priority}
+
+    async def _route_one(self, payload: Dict, writer):
+        query = payload.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("Provide a non-empty 'query'")
+        result = await self.service.route(query, **self._schedule(payload))
+        await self._send_json(writer, 200, result)
+
+    async def _reload(self, payload: Dict, writer):
+        await self._send_json(writer, 200, await self.service.reload())
+
+    async def _route_batch(self, payload: Dict, writer):
+        schedule = self._schedule(payload)
+        futures = self.service.route_many(self._queries(payload), **schedule)
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await self._send_json(writer, 200, {
+            "results": [
+                {"error": str(r)} if isinstance(r, Exception) else r
+                for r in results
+            ]
+        })
+
+    async def _route_stream(self, payload: Dict, writer):
+        queries = self._queries(payload)
+        schedule = self._schedule(payload)
+
+        # Duplicates inside one batch coalesce onto the same future
+        by_future: Dict[asyncio.Future, List[int]] = {}
+        for i, future in enumerate(self.service.route_many(queries, **schedule)):
+            by_future.setdefault(future, []).append(i)
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await self._send_chunk(writer, {"event": "accepted", "n_queries": len(queries)})
+
+        async def _tagged(future):
+            try:
+                return future, {"event": "result", "result": await future}
+            except Exception as e:
+                return future, {"event": "error", "error": str(e)}
+
+        for next_done in asyncio.as_completed([_tagged(f) for f in by_future]):
+            future, event = await next_done
+            for i in by_future[future]:
+                await self._send_chunk(writer, {**event, "index": i})
+
+        await self._send_chunk(writer, {"event": "done"})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    # ── Response helpers ─────────────────────────────────────────────────────
+
+    async def _send_json(self, writer, status: int, payload: Dict,
+                         extra_headers: Optional[Dict] = None):
+        body = json.dumps(payload, default=_jsonable).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "close",
+            **(extra_headers or {}),
+        }
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n" + "".join(
+            f"{k}: {v}\r\n" for k, v in headers.items()
+        )
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _send_chunk(self, writer, event: Dict):
+        data = (json.dumps(event, default=_jsonable) + "\n").encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Entry point
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run_server(host: Optional[str] = None, port: Optional[int] = None):
+    agent = EpistemicProxyAgent()
+    service = RoutingService(
+        agent,
+        workers=config.SERVER_WORKERS,
+        max_queue=config.SERVER_MAX_QUEUE,
+    )
+    server = RoutingServer(
+        service, host or config.SERVER_HOST, port or config.SERVER_PORT
+    )
+    asyncio.run(server.serve(drain_timeout=config.SERVER_DRAIN_TIMEOUT))
+
+
+if __name__ == "__main__":
+    run_server()
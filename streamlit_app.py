@@ -108,14 +108,20 @@ with st.sidebar:
         dest.parent.mkdir(parents=True, exist_ok=True)
         dest.write_bytes(uploaded_identity.read())
         st.success("✅ identity.json saved")
-        st.cache_resource.clear()
 
     if uploaded_policies is not None:
         dest = Path("data/policies/company_policies.json")
         dest.parent.mkdir(parents=True, exist_ok=True)
         dest.write_bytes(uploaded_policies.read())
         st.success("✅ company_policies.json saved")
-        st.cache_resource.clear()
+
+    if uploaded_identity is not None or uploaded_policies is not None:
+        # Swap the new files into the warm agent; unchanged documents keep
+        # their trees and a repeat upload is a no-op
+        reload_info = load_agent().reload()
+        if reload_info["changed"]:
+            st.info(f"🔄 Agent reloaded (snapshot v{reload_info['version']}): "
+                    f"{', '.join(reload_info['changed'])}")
 
     st.markdown("---")
     st.subheader("🔧 Model Settings")
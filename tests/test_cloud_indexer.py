@@ -0,0 +1,152 @@
+"""
+Offline tests for CloudIndexer against the local PageIndex stand-in
+(utils/pageindex_local.py): submit, status polling, hash changes and
+lost doc ids.
+
+Run:
+    python -m pytest -q tests
+"""
+
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import config
+from utils.pageindex_local import LocalPageIndexClient
+from utils.pageindex_retriever import CloudIndexer
+
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    """Copies of identity.json / company_policies.json the test may edit."""
+    paths = {}
+    for attr in ("IDENTITY_PATH", "POLICIES_PATH"):
+        path = tmp_path / Path(getattr(config, attr)).name
+        shutil.copy(str(getattr(config, attr)), str(path))
+        monkeypatch.setattr(config, attr, path)
+        paths[attr] = path
+    return paths
+
+
+def make_indexer(tmp_path, client):
+    return CloudIndexer(lambda: client, cache_path=tmp_path / "doc_ids.json",
+                        poll_interval=0.01, timeout=10.0)
+
+
+def stand_in():
+    return LocalPageIndexClient(processing_delay=0.05)
+
+
+def test_submits_and_polls_until_ready(tmp_path, docs):
+    client = stand_in()
+    indexer = make_indexer(tmp_path, client)
+    assert indexer.ready_doc_ids() == []
+
+    indexer.refresh()
+    assert indexer.wait(5.0)
+
+    doc_ids = indexer.ready_doc_ids()
+    assert len(doc_ids) == 2
+    assert all(client.is_retrieval_ready(d) for d in doc_ids)
+    assert client.calls["submit"] == 2
+    assert set(indexer.status().values()) == {"ready"}
+
+    cached = json.loads((tmp_path / "doc_ids.json").read_text())
+    assert {entry["doc_id"] for entry in cached.values()} == set(doc_ids)
+
+
+def test_hash_change_resubmits_only_the_edited_document(tmp_path, docs):
+    client = stand_in()
+    indexer = make_indexer(tmp_path, client)
+    indexer.refresh()
+    assert indexer.wait(5.0)
+    before = dict(zip(("identity", "policies"), indexer.ready_doc_ids()))
+
+    policies = docs["POLICIES_PATH"]
+    data = json.loads(policies.read_text())
+    data["edited_by_test"] = True
+    policies.write_text(json.dumps(data))
+
+    indexer.refresh()
+    assert indexer.wait(5.0)
+    after = dict(zip(("identity", "policies"), indexer.ready_doc_ids()))
+
+    assert client.calls["submit"] == 3
+    assert after["identity"] == before["identity"]
+    assert after["policies"] != before["policies"]
+    with pytest.raises(KeyError):                  # superseded copy deleted
+        client.get_document(before["policies"])
+
+
+def test_cached_doc_ids_are_reused_after_restart(tmp_path, docs):
+    client = stand_in()
+    first = make_indexer(tmp_path, client)
+    first.refresh()
+    assert first.wait(5.0)
+
+    second = make_indexer(tmp_path, client)
+    assert second.ready_doc_ids() == []            # re-verified before use
+    second.refresh()
+    assert second.wait(5.0)
+
+    assert sorted(second.ready_doc_ids()) == sorted(first.ready_doc_ids())
+    assert client.calls["submit"] == 2
+
+
+def test_unknown_doc_ids_are_submitted_again(tmp_path, docs):
+    first = make_indexer(tmp_path, stand_in())
+    first.refresh()
+    assert first.wait(5.0)
+
+    fresh = stand_in()                             # knows none of the cached ids
+    second = make_indexer(tmp_path, fresh)
+    second.refresh()
+    assert second.wait(5.0)
+
+    assert fresh.calls["submit"] == 2
+    assert all(fresh.is_retrieval_ready(d) for d in second.ready_doc_ids())
+
+
+def test_transient_status_errors_are_retried_not_resubmitted(tmp_path, docs):
+    client = stand_in()
+    get_document = client.get_document
+    errors = {"left": 3}
+
+    def flaky_get_document(doc_id):
+        if errors["left"]:
+            errors["left"] -= 1
+            raise ConnectionError("connection reset")
+        return get_document(doc_id)
+
+    client.get_document = flaky_get_document
+    indexer = make_indexer(tmp_path, client)
+    indexer.refresh()
+    assert indexer.wait(5.0)
+
+    assert errors["left"] == 0
+    assert client.calls["submit"] == 2
+    assert len(client._docs) == 2
+
+
+def test_doc_ids_that_keep_vanishing_are_resubmitted_a_bounded_number_of_times(
+        tmp_path, docs, monkeypatch):
+    monkeypatch.setattr(config, "PAGEINDEX_MAX_RESUBMITS", 2)
+    client = stand_in()
+
+    def forgetful_get_document(doc_id):
+        if client._docs[doc_id]["name"] == docs["POLICIES_PATH"].name:
+            raise KeyError(doc_id)
+        return LocalPageIndexClient.get_document(client, doc_id)
+
+    client.get_document = forgetful_get_document
+    indexer = make_indexer(tmp_path, client)
+    indexer.refresh()
+    assert not indexer.wait(5.0)
+
+    assert client.calls["submit"] == 2 + 2         # identity once, policies 1 + 2 retries
+    assert indexer.status() == {"identity": "ready", "policies": "pending"}
@@ -0,0 +1,66 @@
+"""
+Offline tests for DecisionMemory near-duplicate lookup: rephrasings hit,
+queries that differ in numbers, negation or ordering never do.
+
+Run:
+    python -m pytest -q tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.decision_memory import DecisionMemory
+
+QUERY = "Should we approve the $45,000 marketing campaign for Q3?"
+
+
+@pytest.fixture
+def memory(tmp_path):
+    mem = DecisionMemory(tmp_path / "memory")
+    mem.add(
+        QUERY, fingerprint="fp", context="ctx",
+        actions=["Approve the campaign", "Deny the campaign"],
+        score_matrix=[[0.8, 0.7], [0.3, 0.4]],
+        selected_action="Approve the campaign", variants=[],
+    )
+    return mem
+
+
+def test_near_duplicate_query_hits(memory):
+    hit = memory.lookup("should we approve the $45,000 marketing campaign for Q3", "fp")
+    assert hit is not None
+    record, similarity = hit
+    assert record["selected_action"] == "Approve the campaign"
+    assert similarity >= memory.similarity_threshold
+
+
+def test_other_corpus_or_amount_misses(memory):
+    assert memory.lookup(QUERY, "other-fp") is None
+    assert memory.lookup(QUERY.replace("45,000", "54,000"), "fp") is None
+
+
+def test_negated_query_misses(memory):
+    # Similar enough to match on features alone (cosine ≈ 0.95)
+    negated = "Should we not approve the $45,000 marketing campaign for Q3?"
+    assert memory.lookup(negated, "fp") is None
+
+
+def test_reordered_query_misses(memory):
+    after = ("Should we approve the annual software vendor contract renewal "
+             "with the current supplier after the legal review?")
+    memory.add(
+        after, fingerprint="fp", context="ctx", actions=["Approve"],
+        score_matrix=[[0.9]], selected_action="Approve", variants=[],
+    )
+    assert memory.lookup(after, "fp") is not None
+    assert memory.lookup(after.replace("after", "before"), "fp") is None
+
+
+def test_records_survive_reload(memory):
+    reloaded = DecisionMemory(memory.path)
+    assert len(reloaded) == 1
+    assert reloaded.lookup(QUERY, "fp") is not None
@@ -0,0 +1,66 @@
+"""
+Offline tests for ScoreArchive: several processes appending to one
+archive at once must leave every decision readable and every variant
+strategy decodable.
+
+Run:
+    python -m pytest -q tests
+"""
+
+import multiprocessing
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import score_archive
+from core.contrastive_router import RoutingResult, VariantInfo
+from core.score_archive import ScoreArchive
+
+N_WRITERS = 4
+N_APPENDS = 25
+
+
+def _strategies(writer: int, i: int):
+    return ["original", f"writer{writer}_{i % 5}", f"shared_{i % 3}"]
+
+
+def _append_many(path: str, writer: int):
+    archive = ScoreArchive(path)
+    for i in range(N_APPENDS):
+        value = writer * 1000 + i
+        variants = [VariantInfo(f"v{k}", name)
+                    for k, name in enumerate(_strategies(writer, i))]
+        result = RoutingResult(["approve", "defer"], np.full((2, 3), value),
+                               variants, selected_index=i % 2, variance_penalty=0.3)
+        archive.append(result, query=f"writer {writer} query {i}")
+
+
+@pytest.mark.skipif(score_archive.fcntl is None, reason="needs fcntl.flock")
+def test_concurrent_writer_processes(tmp_path):
+    path = str(tmp_path / "archive")
+    ctx = multiprocessing.get_context("fork")
+    writers = [ctx.Process(target=_append_many, args=(path, w)) for w in range(N_WRITERS)]
+    for p in writers:
+        p.start()
+    for p in writers:
+        p.join(60)
+        assert p.exitcode == 0
+
+    archive = ScoreArchive(path)
+    assert len(archive) == N_WRITERS * N_APPENDS
+    seen = set()
+    for d in range(len(archive)):
+        matrix = archive.matrix(d)
+        assert matrix.shape == (2, 3)
+        value = int(matrix[0, 0])
+        assert (matrix == value).all()
+        writer, i = divmod(value, 1000)
+        seen.add((writer, i))
+        strategies = [v["strategy"] for v in archive.variant_meta(d)]
+        assert strategies == _strategies(writer, i)
+    assert len(seen) == N_WRITERS * N_APPENDS
+    assert archive.summary()["n_decisions"] == N_WRITERS * N_APPENDS
@@ -1,27 +1,100 @@
+import atexit
+import importlib.util
+import json
+import threading
 import time
-import requests
-from typing import Optional
-import os
-import sys
-
-# Add project root to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-try:
-    from config import config
-except ImportError:
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from config import config
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from config import config
+from utils.structured_output import (
+    OutputSchema,
+    StructuredOutputError,
+    extract_json,
+    repair_prompt,
+    validate,
+)
+from utils.rate_limiter import ProviderError, RateLimitError, RequestScheduler
+from utils.transcript_store import TranscriptStore, TranscriptMissError
+
+# HTTP statuses worth retrying with backoff
+_RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+def _sdk_available(module: str) -> bool:
+    """True if an optional SDK is installed, without importing it."""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class PromptSession:
+    """
+    A prompt prefix shared by many requests, e.g. one epistemic variant's
+    context scored against N actions.
+
+    Every request is sent as prefix + suffix, the same prompt (and
+    transcript key) as without a session; no provider-side session state
+    is created. Requests sharing a prefix are issued back to back, which
+    only saves work on servers that reuse the KV cache of a repeated
+    prompt prefix (Ollama, llama.cpp server). Gemini and local
+    transformers models evaluate the full prompt on every request.
+    """
+
+    def __init__(self, client: "ModelClient", prefix: str):
+        self.client = client
+        self.prefix = prefix
+
+    def generate_many(self, suffixes: List[str], temperature: float = 0.7,
+                      max_tokens: int = 500,
+                      json_schema: Optional[Dict] = None) -> List[str]:
+        return self.client.generate_many(suffixes, temperature, max_tokens,
+                                         json_schema, sessions=[self] * len(suffixes))
+
+    def generate_json_many(self, suffixes: List[str], schema: OutputSchema,
+                           temperature: float = 0.0, strict: bool = True) -> List[Any]:
+        return self.client.generate_json_many(suffixes, schema, temperature, strict,
+                                              sessions=[self] * len(suffixes))
+
 
 class ModelClient:
-    """Unified client for different model providers"""
+    """
+    Unified client for different model providers.
+
+    Provider SDKs (google-genai, huggingface_hub, transformers, requests)
+    are imported only when that provider is selected, and SDK clients are
+    created on the first generation call rather than at construction.
+
+    Live calls go through a RequestScheduler (config.RATE_LIMITS) and
+    failures raise ProviderError / RateLimitError. Callers tag the
+    priority of their calls with `with client.priority("explanation"):`.
+    """
     
-    def __init__(self):
+    def __init__(self, transcript_mode: Optional[str] = None,
+                 transcript_path=None):
         self.provider = config.MODEL_PROVIDER
         self.model_name = ""
+        self._client = None
+        self._local = threading.local()
         self._setup_client()
+        self._setup_transcripts(transcript_mode, transcript_path)
+        self.scheduler = RequestScheduler(
+            self.provider,
+            max_retries=config.RATE_LIMIT_MAX_RETRIES,
+            max_wait=config.RATE_LIMIT_MAX_WAIT,
+            **config.RATE_LIMITS.get(self.provider, {}),
+        )
+
+    @contextmanager
+    def priority(self, name: str):
+        """Scheduler priority class ("scoring", "explanation", "demo") for
+        calls made by this thread inside the block"""
+        previous = getattr(self._local, "priority", "scoring")
+        self._local.priority = name
+        try:
+            yield
+        finally:
+            self._local.priority = previous
     
     def _setup_client(self):
         """Setup client based on provider"""
@@ -31,31 +104,37 @@ class ModelClient:
             print(f"  Using Ollama model: {self.model_name}")
             
         elif self.provider == "gemini" and config.GEMINI_API_KEY:
-            try:
-                from google import genai
-                self.client = genai.Client(api_key=config.GEMINI_API_KEY)
+            if _sdk_available("google.genai"):
                 self.model_name = config.GEMINI_MODEL
                 print(f"  Using Gemini model: {self.model_name}")
-            except ImportError:
+            else:
                 print("  ⚠️  Google Generative AI not installed, falling back to Ollama")
                 self.provider = "ollama"
                 self.model_name = config.OLLAMA_MODEL
                 self.base_url = config.OLLAMA_BASE_URL
                 
         elif self.provider == "huggingface" and config.HF_TOKEN:
-            try:
-                from huggingface_hub import InferenceApi
-                self.client = InferenceApi(
-                    repo_id=config.HF_MODEL,
-                    token=config.HF_TOKEN
-                )
+            if _sdk_available("huggingface_hub"):
                 self.model_name = config.HF_MODEL
                 print(f"  Using Hugging Face model: {self.model_name}")
-            except ImportError:
+            else:
                 print("  ⚠️  Hugging Face Hub not installed, falling back to Ollama")
                 self.provider = "ollama"
                 self.model_name = config.OLLAMA_MODEL
                 self.base_url = config.OLLAMA_BASE_URL
+
+        elif self.provider == "local":
+            # Locally hosted transformers model; weights load on first use,
+            # in-process or once per worker when LOCAL_WORKERS > 0
+            from utils.worker_pool import LocalHFBackend
+
+            self.model_name = config.LOCAL_MODEL_PATH
+            self._local_backend = LocalHFBackend(self.model_name)
+            self._pool = None
+            workers = (f"{config.LOCAL_WORKERS} workers × "
+                       f"{config.LOCAL_THREADS_PER_WORKER} threads"
+                       if config.LOCAL_WORKERS else "in-process")
+            print(f"  Using local model: {self.model_name} ({workers})")
                 
         else:
             # Fallback to Ollama
@@ -64,68 +143,361 @@ class ModelClient:
             self.base_url = config.OLLAMA_BASE_URL
             print(f"  Falling back to Ollama: {self.model_name}")
     
+    @property
+    def client(self):
+        """Provider SDK client, created on first use"""
+        if self._client is None:
+            if self.provider == "gemini":
+                from google import genai
+                self._client = genai.Client(api_key=config.GEMINI_API_KEY)
+            elif self.provider == "huggingface":
+                from huggingface_hub import InferenceApi
+                self._client = InferenceApi(
+                    repo_id=config.HF_MODEL,
+                    token=config.HF_TOKEN
+                )
+        return self._client
+
+    def _setup_transcripts(self, mode: Optional[str], path):
+        """
+        Setup record/replay of LLM calls.
+
+        Modes:
+          ""       — live calls only (default)
+          "record" — live calls, every response appended to the transcript
+          "replay" — serve from the transcript; on a miss either raise
+                     (config.TRANSCRIPT_STRICT) or call live and record it
+        """
+        self.transcript_mode = (mode if mode is not None
+                                else config.TRANSCRIPT_MODE) or ""
+        self.transcript_strict = config.TRANSCRIPT_STRICT
+        self.transcripts = None
+
+        if self.transcript_mode not in ("", "record", "replay"):
+            raise ValueError(f"Unknown transcript mode: {self.transcript_mode!r}")
+
+        if self.transcript_mode:
+            self.transcripts = TranscriptStore(path or config.TRANSCRIPT_PATH)
+            print(f"  Transcripts: {self.transcript_mode} "
+                  f"({len(self.transcripts)} entries, {self.transcripts.path})")
+
+    def session(self, prefix: str) -> PromptSession:
+        """Shared-prefix session; see PromptSession"""
+        return PromptSession(self, prefix)
+
+    @staticmethod
+    def _full_prompts(prompts: List[str], sessions) -> List[str]:
+        if sessions is None:
+            return list(prompts)
+        return [(s.prefix if s is not None else "") + p
+                for p, s in zip(prompts, sessions)]
+
     def generate(self, prompt: str, temperature: float = 0.7, 
                 max_tokens: int = 500) -> str:
-        """Generate text from model"""
-        
+        """Generate text from model, honouring transcript record/replay"""
+        return self.generate_many([prompt], temperature, max_tokens)[0]
+
+    def generate_many(self, prompts: List[str], temperature: float = 0.7,
+                      max_tokens: int = 500,
+                      json_schema: Optional[Dict] = None,
+                      sessions: Optional[List[Optional[PromptSession]]] = None) -> List[str]:
+        """
+        Generate one response per prompt, in order.
+
+        Transcript hits are served first; the remaining prompts go to the
+        provider together, so a local worker pool can run them in parallel.
+        With `json_schema`, providers that support it constrain decoding
+        to JSON (see generate_json_many for validated output). `sessions`
+        optionally gives each prompt a shared prefix (see PromptSession).
+        """
+        responses: List[Optional[str]] = [None] * len(prompts)
+        keys: List[Optional[str]] = [None] * len(prompts)
+        params = {"temperature": temperature, "max_tokens": max_tokens}
+        if json_schema is not None:
+            params["json_schema"] = json_schema
+        full_prompts = self._full_prompts(prompts, sessions)
+
+        if self.transcripts is not None:
+            for i, prompt in enumerate(full_prompts):
+                keys[i] = TranscriptStore.make_key(
+                    self.provider, self.model_name, prompt, **params
+                )
+                if self.transcript_mode == "replay":
+                    responses[i] = self.transcripts.get(keys[i])
+                    if responses[i] is None and self.transcript_strict:
+                        raise TranscriptMissError(
+                            f"No recorded response for prompt {prompt[:60]!r}"
+                        )
+
+        missing = [i for i, r in enumerate(responses) if r is None]
+        live = self._generate_live_many(
+            [full_prompts[i] for i in missing], temperature, max_tokens, json_schema
+        )
+        for i, response in zip(missing, live):
+            responses[i] = response
+            if self.transcripts is not None:
+                self.transcripts.append(keys[i], response)
+        return responses
+
+    def generate_json(self, prompt: str, schema: OutputSchema,
+                      temperature: float = 0.0, strict: bool = True) -> Any:
+        """Single-prompt form of generate_json_many"""
+        return self.generate_json_many([prompt], schema, temperature, strict)[0]
+
+    def generate_json_many(self, prompts: List[str], schema: OutputSchema,
+                           temperature: float = 0.0, strict: bool = True,
+                           sessions: Optional[List[Optional[PromptSession]]] = None
+                           ) -> List[Any]:
+        """
+        Generate one schema-valid JSON value per prompt.
+
+        Replies are capped at `schema.max_tokens`, parsed and validated;
+        invalid ones are re-prompted with their validation errors up to
+        config.STRUCTURED_REPAIR_RETRIES times (provider errors are not
+        retried). Values still invalid after that raise
+        StructuredOutputError, or are returned as None when not `strict`.
+        """
+        values: List[Any] = [None] * len(prompts)
+        current = list(prompts)
+        pending = list(range(len(prompts)))
+        problems: Dict[int, str] = {}
+
+        for _ in range(config.STRUCTURED_REPAIR_RETRIES + 1):
+            replies = self.generate_many(
+                [current[i] for i in pending], temperature, schema.max_tokens,
+                json_schema=schema.schema,
+                sessions=[sessions[i] for i in pending] if sessions else None,
+            )
+            retry = []
+            for i, reply in zip(pending, replies):
+                try:
+                    value = extract_json(reply)
+                    errors = validate(value, schema.schema)
+                except ValueError as e:
+                    errors = [str(e)]
+                if not errors:
+                    values[i] = value
+                    problems.pop(i, None)
+                    continue
+                problems[i] = "; ".join(errors)
+                current[i] = repair_prompt(prompts[i], reply, errors, schema)
+                retry.append(i)
+            pending = retry
+            if not pending:
+                break
+
+        if problems and strict:
+            first = min(problems)
+            raise StructuredOutputError(
+                f"{len(problems)}/{len(prompts)} {schema.name} replies invalid "
+                f"after {config.STRUCTURED_REPAIR_RETRIES} repairs: {problems[first][:200]}"
+            )
+        return values
+
+    # ── Token log-probabilities ──────────────────────────────────────────────
+
+    @property
+    def supports_logprobs(self) -> bool:
+        """True if next-token log-probabilities are available"""
+        return self.provider in ("ollama", "local")
+
+    def next_token_logprobs_many(self, prompts: List[str], top_k: int = 20,
+                                 sessions: Optional[List[Optional[PromptSession]]] = None
+                                 ) -> List[Optional[Dict[str, float]]]:
+        """
+        {token: logprob} for the `top_k` most likely first tokens of the
+        reply to each prompt — one forward pass, no sampling. None where
+        the provider returned no log-probabilities. Session prefixes are
+        prepended; there is no prefix reuse for local models.
+        """
+        prompts = self._full_prompts(prompts, sessions)
+        results: List[Optional[Dict[str, float]]] = [None] * len(prompts)
+        keys: List[Optional[str]] = [None] * len(prompts)
+
+        if self.transcripts is not None:
+            for i, prompt in enumerate(prompts):
+                keys[i] = TranscriptStore.make_key(
+                    self.provider, self.model_name, prompt, logprobs=top_k
+                )
+                if self.transcript_mode == "replay":
+                    cached = self.transcripts.get(keys[i])
+                    if cached is not None:
+                        results[i] = json.loads(cached)
+                    elif self.transcript_strict:
+                        raise TranscriptMissError(
+                            f"No recorded logprobs for prompt {prompt[:60]!r}"
+                        )
+
+        missing = [i for i, r in enumerate(results) if r is None]
+        if self.provider == "local" and config.LOCAL_WORKERS and len(missing) > 1:
+            try:
+                live = self._get_pool().map_logprobs([prompts[i] for i in missing], top_k)
+            except Exception as e:
+                print(f"  ⚠️  Local logprobs failed: {str(e)[:100]}")
+                live = [None] * len(missing)
+        else:
+            live = [self._logprobs_live(prompts[i], top_k) for i in missing]
+
+        for i, logprobs in zip(missing, live):
+            results[i] = logprobs or None
+            if self.transcripts is not None and results[i] is not None:
+                self.transcripts.append(keys[i], json.dumps(results[i]))
+        return results
+
+    def _logprobs_live(self, prompt: str, top_k: int) -> Optional[Dict[str, float]]:
+        try:
+            if self.provider == "ollama":
+                return self._scheduled(lambda: self._ollama_logprobs(prompt, top_k),
+                                       prompt, 1)
+            if self.provider == "local":
+                if config.LOCAL_WORKERS:
+                    return self._get_pool().map_logprobs([prompt], top_k)[0]
+                return self._local_backend.next_token_logprobs(prompt, top_k)
+        except ProviderError:
+            raise
+        except Exception as e:
+            print(f"  ⚠️  Logprob request failed: {str(e)[:100]}")
+        return None
+
+    def _ollama_logprobs(self, prompt: str, top_k: int) -> Optional[Dict[str, float]]:
+        """First-token top logprobs via Ollama's `logprobs` option"""
+        import requests
+
+        response = requests.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": False,
+                "logprobs": True,
+                "top_logprobs": top_k,
+                "options": {"temperature": 0.0, "num_predict": 1},
+            },
+            timeout=60,
+        )
+        if response.status_code in _RETRYABLE_STATUS:
+            raise ProviderError("ollama", f"HTTP {response.status_code}",
+                                status=response.status_code, retryable=True)
+        if response.status_code != 200:
+            return None    # e.g. a server without logprobs support
+        tokens = response.json().get("logprobs") or []
+        if not tokens:
+            return None
+        out: Dict[str, float] = {}
+        for cand in tokens[0].get("top_logprobs") or [tokens[0]]:
+            token, lp = cand["token"], float(cand["logprob"])
+            out[token] = max(out.get(token, float("-inf")), lp)
+        return out
+
+    def _generate_live_many(self, prompts: List[str], temperature: float,
+                            max_tokens: int,
+                            json_schema: Optional[Dict] = None) -> List[str]:
+        """Fan prompts out to the worker pool if configured, else sequential"""
+        if self.provider == "local" and config.LOCAL_WORKERS and len(prompts) > 1:
+            try:
+                return self._get_pool().map(
+                    [(p, temperature, max_tokens) for p in prompts]
+                )
+            except Exception as e:
+                raise ProviderError("local", str(e)[:200]) from e
+        return [self._generate_live(p, temperature, max_tokens, json_schema)
+                for p in prompts]
+
+    def _generate_live(self, prompt: str, temperature: float,
+                       max_tokens: int, json_schema: Optional[Dict] = None) -> str:
+        """
+        Send one generation request through the rate-limit scheduler.
+        `json_schema` constrains decoding where the provider supports it;
+        Hugging Face and local models rely on the prompt and validation.
+        """
+        return self._scheduled(
+            lambda: self._dispatch(prompt, temperature, max_tokens, json_schema),
+            prompt, max_tokens,
+        )
+
+    def _scheduled(self, fn, prompt: str, max_tokens: int):
+        """Run one provider call under the scheduler at this thread's priority"""
+        return self.scheduler.call(
+            fn,
+            priority=getattr(self._local, "priority", "scoring"),
+            tokens=RequestScheduler.estimate_tokens(prompt, max_tokens),
+        )
+
+    def _dispatch(self, prompt: str, temperature: float, max_tokens: int,
+                  json_schema: Optional[Dict]) -> str:
+        """Call the configured provider once"""
         if self.provider == "ollama":
-            return self._generate_ollama(prompt, temperature, max_tokens)
+            return self._generate_ollama(prompt, temperature, max_tokens, json_schema)
         
         elif self.provider == "gemini":
-            return self._generate_gemini(prompt, temperature, max_tokens)
+            return self._generate_gemini(prompt, temperature, max_tokens, json_schema)
         
         elif self.provider == "huggingface":
             return self._generate_huggingface(prompt, temperature, max_tokens)
+
+        elif self.provider == "local":
+            return self._generate_local(prompt, temperature, max_tokens)
         
         else:
-            return f"Error: No model provider configured"
+            raise ProviderError(self.provider, "no model provider configured")
     
     def _generate_ollama(self, prompt: str, temperature: float, 
-                        max_tokens: int) -> str:
+                        max_tokens: int, json_schema: Optional[Dict] = None) -> str:
         """Generate using Ollama"""
+        import requests
+
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+        }
+        if json_schema is not None:
+            # Grammar-constrained decoding to the schema (Ollama >= 0.5)
+            payload["format"] = json_schema
+
         try:
             response = requests.post(
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens
-                    }
-                },
+                json=payload,
                 timeout=60
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "No response from Ollama")
-            else:
-                return f"Ollama error: {response.status_code}"
-                
-        except Exception as e:
-            return f"Ollama connection error: {str(e)[:100]}"
+        except requests.RequestException as e:
+            raise ProviderError("ollama", f"connection error: {str(e)[:100]}",
+                                retryable=isinstance(e, requests.Timeout)) from e
+
+        if response.status_code != 200:
+            raise ProviderError(
+                "ollama", f"HTTP {response.status_code}: {response.text[:100]}",
+                status=response.status_code,
+                retryable=response.status_code in _RETRYABLE_STATUS,
+            )
+        return response.json().get("response", "")
     
     def _generate_gemini(self, prompt: str, temperature: float,
-                        max_tokens: int) -> str:
+                        max_tokens: int, json_schema: Optional[Dict] = None) -> str:
         """Generate using Gemini"""
         try:
             from google.genai import types
             
+            json_mode = {"response_mime_type": "application/json"} if json_schema else {}
             response = self.client.models.generate_content(
                 model=self.model_name,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     temperature=temperature,
-                    max_output_tokens=max_tokens
+                    max_output_tokens=max_tokens,
+                    **json_mode
                 )
             )
             
-            return response.text if hasattr(response, 'text') else "No text response"
-            
+            return response.text or ""
+
         except Exception as e:
-            return f"Gemini error: {str(e)[:100]}"
+            raise self._classify_error("gemini", e) from e
     
     def _generate_huggingface(self, prompt: str, temperature: float,
                              max_tokens: int) -> str:
@@ -139,21 +511,72 @@ class ModelClient:
             }
             
             result = self.client(inputs=prompt, params=params)
-            
-            if isinstance(result, list) and len(result) > 0:
-                item = result[0]
-                if isinstance(item, dict) and 'generated_text' in item:
-                    return item['generated_text']
-            
-            return str(result)[:200] if result else "No response"
-            
         except Exception as e:
-            return f"Hugging Face error: {str(e)[:100]}"
+            raise self._classify_error("huggingface", e) from e
+
+        if isinstance(result, list) and len(result) > 0:
+            item = result[0]
+            if isinstance(item, dict) and 'generated_text' in item:
+                return item['generated_text']
+        if isinstance(result, dict) and "error" in result:
+            # The Inference API reports rate limits / model loading in-band
+            message = str(result["error"])
+            raise self._classify_error("huggingface", RuntimeError(message))
+        raise ProviderError("huggingface", f"unexpected response: {str(result)[:100]}")
+
+    @staticmethod
+    def _classify_error(provider: str, error: Exception) -> ProviderError:
+        """ProviderError for an SDK exception, flagging 429 / quota / 5xx"""
+        status = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if not isinstance(status, int):
+            status = None
+        text = str(error)
+        lowered = text.lower()
+        if status is None and ("429" in text or "resource_exhausted" in lowered
+                               or "rate limit" in lowered or "quota" in lowered):
+            status = 429
+        if status is None and ("currently loading" in lowered or "503" in text):
+            status = 503
+        retry_after = getattr(error, "retry_after", None)
+        return ProviderError(
+            provider, text[:200], status=status,
+            retryable=status in _RETRYABLE_STATUS,
+            retry_after=retry_after if isinstance(retry_after, (int, float)) else None,
+        )
     
+    def _get_pool(self):
+        """Start the local worker pool on first use"""
+        if self._pool is None:
+            from utils.worker_pool import ScoringWorkerPool
+
+            self._pool = ScoringWorkerPool(
+                self._local_backend,
+                n_workers=config.LOCAL_WORKERS,
+                threads_per_worker=config.LOCAL_THREADS_PER_WORKER,
+            )
+            atexit.register(self._pool.close)
+        return self._pool
+
+    def _generate_local(self, prompt: str, temperature: float,
+                        max_tokens: int) -> str:
+        """Generate using the local model, via the worker pool if enabled"""
+        try:
+            if config.LOCAL_WORKERS:
+                return self._get_pool().submit(prompt, temperature, max_tokens).get()
+            return self._local_backend.generate(prompt, temperature, max_tokens)
+        except Exception as e:
+            raise ProviderError("local", str(e)[:200]) from e
+
+    def close(self):
+        """Shut down the local worker pool, if one was started"""
+        if getattr(self, "_pool", None) is not None:
+            self._pool.close()
+            self._pool = None
+
     def check_connection(self) -> bool:
         """Check if model connection works"""
         try:
-            test_response = self.generate("Test", max_tokens=10)
-            return "error" not in test_response.lower()
-        except:
+            self.generate("Test", max_tokens=10)
+            return True
+        except Exception:
             return False
\ No newline at end of file
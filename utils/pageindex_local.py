@@ -0,0 +1,117 @@
+"""
+Local PageIndex stand-in — offline replacement for pageindex.PageIndexClient.
+
+Implements the subset of the SDK the retriever uses, with the same
+response shapes, so cloud mode (background indexing, status polling,
+doc-id caching, chat retrieval) can run without a key or network:
+
+    submit_document(path)            → {"doc_id": "..."}
+    get_document(doc_id)             → {"id", "name", "status"}   processing → completed
+    is_retrieval_ready(doc_id)       → bool
+    delete_document(doc_id)
+    chat_completions(messages, doc_id) → {"choices": [{"message": {...}}]}
+
+Documents are built with LocalDocumentTree; chat answers are the
+best-matching nodes by keyword overlap with the last user message
+(LocalDocumentTree.lexical_ranking).
+
+Enable with PAGEINDEX_CLIENT=local, or pass an instance as
+PageIndexRetriever(cloud_client=...).
+"""
+
+import hashlib
+import itertools
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from config import config
+from utils.pageindex_retriever import LocalDocumentTree
+
+
+class LocalPageIndexClient:
+
+    def __init__(self, api_key: Optional[str] = None,
+                 processing_delay: Optional[float] = None, top_k: int = 3):
+        self.processing_delay = (config.PAGEINDEX_LOCAL_DELAY
+                                 if processing_delay is None else processing_delay)
+        self.top_k = top_k
+        self._docs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self.calls = {"submit": 0, "status": 0, "chat": 0}
+
+    # ── Documents ────────────────────────────────────────────────────────────
+
+    def submit_document(self, file_path: str) -> Dict:
+        doc_name = self._doc_name(file_path)
+        raw = Path(file_path).read_bytes()
+        tree = LocalDocumentTree(sources={doc_name: raw})
+        if doc_name not in tree.trees:
+            raise ValueError(f"Could not index {file_path}")
+
+        n = next(self._counter)
+        doc_id = "pi-local-" + hashlib.sha1(raw + str(n).encode()).hexdigest()[:12]
+        with self._lock:
+            self.calls["submit"] += 1
+            self._docs[doc_id] = {
+                "name": Path(file_path).name,
+                "tree": tree,
+                "ready_at": time.monotonic() + self.processing_delay,
+            }
+        return {"doc_id": doc_id}
+
+    def get_document(self, doc_id: str) -> Dict:
+        with self._lock:
+            self.calls["status"] += 1
+            doc = self._docs.get(doc_id)
+        if doc is None:
+            raise KeyError(f"Unknown document {doc_id}")
+        ready = time.monotonic() >= doc["ready_at"]
+        return {"id": doc_id, "name": doc["name"],
+                "status": "completed" if ready else "processing"}
+
+    def is_retrieval_ready(self, doc_id: str) -> bool:
+        return self.get_document(doc_id)["status"] == "completed"
+
+    def delete_document(self, doc_id: str) -> Dict:
+        with self._lock:
+            self._docs.pop(doc_id, None)
+        return {"id": doc_id, "deleted": True}
+
+    @staticmethod
+    def _doc_name(file_path: str) -> str:
+        path = Path(file_path).resolve()
+        for doc_name, attr in LocalDocumentTree.SOURCES.items():
+            if Path(getattr(config, attr)).resolve() == path:
+                return doc_name
+        raise ValueError(f"Unsupported document {file_path}")
+
+    # ── Retrieval ────────────────────────────────────────────────────────────
+
+    def chat_completions(self, messages: List[Dict],
+                         doc_id: Union[str, List[str]], stream: bool = False) -> Dict:
+        doc_ids = [doc_id] if isinstance(doc_id, str) else list(doc_id)
+        for d in doc_ids:
+            if not self.is_retrieval_ready(d):
+                raise RuntimeError(f"Document {d} is still processing")
+        with self._lock:
+            self.calls["chat"] += 1
+            trees = [self._docs[d]["tree"] for d in doc_ids]
+
+        query = next((m["content"] for m in reversed(messages)
+                      if m.get("role") == "user"), "")
+        ranked = sorted(
+            ((overlap, i, node_id) for i, tree in enumerate(trees)
+             for overlap, node_id in tree.lexical_ranking(query)),
+            key=lambda r: -r[0],
+        )[:self.top_k]
+
+        parts = []
+        for i, tree in enumerate(trees):
+            chosen = [node_id for _, j, node_id in ranked if j == i]
+            if chosen:
+                parts.append(tree.render_nodes(chosen))
+        content = "\n".join(parts) or "No relevant sections found."
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
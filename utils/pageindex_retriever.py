@@ -12,25 +12,35 @@ hierarchical tree-search retrieval. Two modes:
   2. CLOUD  — uses the PageIndex SDK (pip install -U pageindex) for
               richer tree construction on real PDFs.
               Requires: PAGEINDEX_API_KEY in .env
+              Documents are indexed in the background at startup (and
+              re-indexed when their content hash changes); local
+              tree-search answers until the cloud index is ready.
+              PAGEINDEX_CLIENT=local swaps in an offline stand-in.
 
 The agent always falls back to local mode if the SDK / key is absent.
 """
 
+import hashlib
+import importlib.util
 import json
 import os
+import random
 import re
-import sys
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
-from config import config  # noqa: E402
+from config import config
+from utils.rate_limiter import RequestScheduler
+from utils.structured_output import node_ids_schema
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────────────────────────────────────
 
+_WORD = re.compile(r"[a-z0-9$]{3,}")
+
+
 def _load_json(path) -> Any:
     with open(str(path), "r") as f:
         return json.load(f)
@@ -47,6 +57,28 @@ def _flatten_tree(node: Dict, depth: int = 0) -> str:
     return "\n".join(parts)
 
 
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _source_digest(raw: Optional[bytes]) -> str:
+    """Content hash of a source document's raw bytes ("" if unreadable)."""
+    return hashlib.sha1(raw).hexdigest()[:12] if raw is not None else ""
+
+
+def _node_chunk(node: Dict) -> str:
+    """Retrieved-context chunk for one node, as produced by tree search."""
+    return f"[{node['node_id']}] {node['title']}:\n{node.get('summary', '')}"
+
+
+def _index_text(node: Dict) -> str:
+    """Child index the tree searcher shows the LLM when expanding `node`."""
+    return "\n".join(
+        f"[{c['node_id']}] {c['title']}: {c.get('summary', '')[:150]}"
+        for c in node.get("nodes", [])
+    )
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Local Tree Builder  (JSON → PageIndex-style tree without the SDK)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -60,118 +92,161 @@ class LocalDocumentTree:
       {title, node_id, summary, nodes: [...]}
     """
 
-    def __init__(self):
+    # Source file of each document tree (config attribute, read at build time)
+    SOURCES = {"identity": "IDENTITY_PATH", "policies": "POLICIES_PATH"}
+
+    def __init__(self, sources: Optional[Dict[str, Optional[bytes]]] = None,
+                 previous: Optional["LocalDocumentTree"] = None):
+        """
+        Build from `sources` (raw file bytes per document; read from disk
+        when None). With `previous`, documents whose bytes are unchanged
+        reuse its trees and node indexes instead of being rebuilt — trees
+        are never mutated after construction, so sharing them is safe.
+        """
         self.trees: Dict[str, Dict] = {}  # doc_name → tree root
-        self._build_from_repo()
+        self.source_hashes: Dict[str, str] = {}
+        self.rebuilt_docs: List[str] = []
+        self._doc_indexes: Dict[str, Dict[str, Tuple[str, int, Dict]]] = {}
+        self._node_index: Optional[Dict[str, Tuple[str, int, Dict]]] = None
+        self._build_from_repo(self.read_sources() if sources is None else sources,
+                              previous)
+
+    @classmethod
+    def read_sources(cls) -> Dict[str, Optional[bytes]]:
+        """Raw bytes of every source document (None if unreadable)."""
+        sources: Dict[str, Optional[bytes]] = {}
+        for doc_name, attr in cls.SOURCES.items():
+            try:
+                sources[doc_name] = getattr(config, attr).read_bytes()
+            except OSError:
+                sources[doc_name] = None
+        return sources
 
-    def _build_from_repo(self):
+    def _build_from_repo(self, sources: Dict[str, Optional[bytes]],
+                         previous: Optional["LocalDocumentTree"]):
         """Build trees from identity.json and company_policies.json."""
-
-        # ── Identity tree ────────────────────────────────────────────────────
-        try:
-            identity = _load_json(config.IDENTITY_PATH)
-            self.trees["identity"] = {
-                "title": f"Agent Identity — {identity.get('role', 'Agent')}",
-                "node_id": "ID-ROOT",
-                "summary": (
-                    f"Role: {identity.get('role')}. "
-                    f"Company: {identity.get('company_name', 'N/A')}. "
-                    f"Values: {', '.join(identity.get('company_values', []))}."
-                ),
-                "nodes": [
-                    {
-                        "title": "Core Responsibilities",
-                        "node_id": "ID-01",
-                        "summary": "; ".join(identity.get("core_responsibilities", [])),
-                        "nodes": [],
-                    },
-                    {
-                        "title": "Constraints",
-                        "node_id": "ID-02",
-                        "summary": json.dumps(identity.get("constraints", {})),
-                        "nodes": [
-                            {
-                                "title": f"Constraint: {k.capitalize()}",
-                                "node_id": f"ID-02-{i}",
-                                "summary": "; ".join(v) if isinstance(v, list) else str(v),
-                                "nodes": [],
-                            }
-                            for i, (k, v) in enumerate(
-                                identity.get("constraints", {}).items()
-                            )
-                        ],
-                    },
-                    {
-                        "title": "Decision Framework",
-                        "node_id": "ID-03",
-                        "summary": (
-                            "Steps: "
-                            + "; ".join(
-                                identity.get("decision_framework", {}).get("steps", [])
-                            )
-                            + " | Escalation triggers: "
-                            + "; ".join(
-                                identity.get("decision_framework", {}).get(
-                                    "escalation_triggers", []
-                                )
-                            )
-                        ),
-                        "nodes": [],
-                    },
-                ],
-            }
-        except Exception as e:
-            print(f"  ⚠️  LocalDocumentTree: identity load failed — {e}")
-
-        # ── Policies tree ────────────────────────────────────────────────────
-        try:
-            policies_doc = _load_json(config.POLICIES_PATH)
-            policy_nodes = [
+        builders = {"identity": self._identity_tree, "policies": self._policies_tree}
+        for doc_name, raw in sources.items():
+            digest = _source_digest(raw)
+            self.source_hashes[doc_name] = digest
+            if (previous is not None and doc_name in previous.trees
+                    and previous.source_hashes.get(doc_name) == digest):
+                self.trees[doc_name] = previous.trees[doc_name]
+                if doc_name in previous._doc_indexes:
+                    self._doc_indexes[doc_name] = previous._doc_indexes[doc_name]
+                continue
+
+            self.rebuilt_docs.append(doc_name)
+            try:
+                if raw is None:
+                    raise OSError(f"cannot read {getattr(config, self.SOURCES[doc_name])}")
+                self.trees[doc_name] = builders[doc_name](json.loads(raw))
+            except Exception as e:
+                print(f"  ⚠️  LocalDocumentTree: {doc_name} load failed — {e}")
+
+    # ── Identity tree ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _identity_tree(identity: Dict) -> Dict:
+        return {
+            "title": f"Agent Identity — {identity.get('role', 'Agent')}",
+            "node_id": "ID-ROOT",
+            "summary": (
+                f"Role: {identity.get('role')}. "
+                f"Company: {identity.get('company_name', 'N/A')}. "
+                f"Values: {', '.join(identity.get('company_values', []))}."
+            ),
+            "nodes": [
                 {
-                    "title": p["title"],
-                    "node_id": p["id"],
-                    "summary": p["content"],
+                    "title": "Core Responsibilities",
+                    "node_id": "ID-01",
+                    "summary": "; ".join(identity.get("core_responsibilities", [])),
                     "nodes": [],
-                }
-                for p in policies_doc.get("policies", [])
-            ]
-            decision_nodes = [
+                },
+                {
+                    "title": "Constraints",
+                    "node_id": "ID-02",
+                    "summary": json.dumps(identity.get("constraints", {})),
+                    "nodes": [
+                        {
+                            "title": f"Constraint: {k.capitalize()}",
+                            "node_id": f"ID-02-{i}",
+                            "summary": "; ".join(v) if isinstance(v, list) else str(v),
+                            "nodes": [],
+                        }
+                        for i, (k, v) in enumerate(
+                            identity.get("constraints", {}).items()
+                        )
+                    ],
+                },
                 {
-                    "title": f"Past Decision: {d['situation'][:60]}",
-                    "node_id": d["id"],
+                    "title": "Decision Framework",
+                    "node_id": "ID-03",
                     "summary": (
-                        f"Decision: {d['decision']}. "
-                        f"Reasoning: {d['reasoning']}. "
-                        f"Policies referenced: {', '.join(d.get('constraints_referenced', []))}."
+                        "Steps: "
+                        + "; ".join(
+                            identity.get("decision_framework", {}).get("steps", [])
+                        )
+                        + " | Escalation triggers: "
+                        + "; ".join(
+                            identity.get("decision_framework", {}).get(
+                                "escalation_triggers", []
+                            )
+                        )
                     ),
                     "nodes": [],
-                }
-                for d in policies_doc.get("past_decisions", [])
-            ]
-            self.trees["policies"] = {
-                "title": "Company Policies & Past Decisions",
-                "node_id": "POL-ROOT",
+                },
+            ],
+        }
+
+    # ── Policies tree ────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _policies_tree(policies_doc: Dict) -> Dict:
+        policy_nodes = [
+            {
+                "title": p["title"],
+                "node_id": p["id"],
+                "summary": p["content"],
+                "nodes": [],
+            }
+            for p in policies_doc.get("policies", [])
+        ]
+        decision_nodes = [
+            {
+                "title": f"Past Decision: {d['situation'][:60]}",
+                "node_id": d["id"],
                 "summary": (
-                    f"{len(policy_nodes)} active policies, "
-                    f"{len(decision_nodes)} recorded past decisions."
+                    f"Decision: {d['decision']}. "
+                    f"Reasoning: {d['reasoning']}. "
+                    f"Policies referenced: {', '.join(d.get('constraints_referenced', []))}."
                 ),
-                "nodes": [
-                    {
-                        "title": "Active Policies",
-                        "node_id": "POL-SEC-1",
-                        "summary": "Binding operational and financial policies.",
-                        "nodes": policy_nodes,
-                    },
-                    {
-                        "title": "Past Decisions",
-                        "node_id": "POL-SEC-2",
-                        "summary": "Historical decisions for precedent lookup.",
-                        "nodes": decision_nodes,
-                    },
-                ],
+                "nodes": [],
             }
-        except Exception as e:
-            print(f"  ⚠️  LocalDocumentTree: policies load failed — {e}")
+            for d in policies_doc.get("past_decisions", [])
+        ]
+        return {
+            "title": "Company Policies & Past Decisions",
+            "node_id": "POL-ROOT",
+            "summary": (
+                f"{len(policy_nodes)} active policies, "
+                f"{len(decision_nodes)} recorded past decisions."
+            ),
+            "nodes": [
+                {
+                    "title": "Active Policies",
+                    "node_id": "POL-SEC-1",
+                    "summary": "Binding operational and financial policies.",
+                    "nodes": policy_nodes,
+                },
+                {
+                    "title": "Past Decisions",
+                    "node_id": "POL-SEC-2",
+                    "summary": "Historical decisions for precedent lookup.",
+                    "nodes": decision_nodes,
+                },
+            ],
+        }
 
     def get_tree_text(self, doc_name: str) -> str:
         tree = self.trees.get(doc_name)
@@ -186,6 +261,107 @@ class LocalDocumentTree:
             parts.append(_flatten_tree(tree))
         return "\n".join(parts)
 
+    # ── Node addressing ──────────────────────────────────────────────────────
+
+    def node_index(self) -> Dict[str, Tuple[str, int, Dict]]:
+        """
+        node_id → (doc_name, depth, node), in depth-first document order.
+        Built once per tree (per document, shared across reloads); do not
+        mutate the returned dict.
+        """
+        if self._node_index is None:
+            index: Dict[str, Tuple[str, int, Dict]] = {}
+            for doc_name, tree in self.trees.items():
+                if doc_name not in self._doc_indexes:
+                    self._doc_indexes[doc_name] = self._walk(doc_name, tree)
+                for node_id, entry in self._doc_indexes[doc_name].items():
+                    index.setdefault(node_id, entry)
+            self._node_index = index
+        return self._node_index
+
+    @staticmethod
+    def _walk(doc_name: str, root: Dict) -> Dict[str, Tuple[str, int, Dict]]:
+        index: Dict[str, Tuple[str, int, Dict]] = {}
+
+        def _visit(node, depth):
+            index.setdefault(node["node_id"], (doc_name, depth, node))
+            for child in node.get("nodes", []):
+                _visit(child, depth + 1)
+
+        _visit(root, 0)
+        return index
+
+    def lexical_ranking(self, query: str) -> List[Tuple[int, str]]:
+        """(shared words, node_id) for nodes sharing words with `query`, best first."""
+        words = set(_WORD.findall(query.lower()))
+        ranked = []
+        for node_id, (_, _, node) in self.node_index().items():
+            text = f"{node.get('title', '')} {node.get('summary', '')}".lower()
+            overlap = len(words & set(_WORD.findall(text)))
+            if overlap:
+                ranked.append((overlap, node_id))
+        ranked.sort(key=lambda r: -r[0])
+        return ranked
+
+    def lexical_search(self, query: str, top_k: int) -> List[str]:
+        """Node ids of the `top_k` best keyword matches (no LLM call)."""
+        return [node_id for _, node_id in self.lexical_ranking(query)[:top_k]]
+
+    def render_nodes(self, node_ids: List[str]) -> str:
+        """
+        Context text for a set of retrieved nodes, grouped per document in
+        tree order. Identical node sets always render identically, so a
+        stored node_id list reproduces its context from the current tree.
+        """
+        wanted = set(node_ids)
+        parts: List[str] = []
+        current_doc = None
+        for node_id, (doc_name, _, node) in self.node_index().items():
+            if node_id not in wanted:
+                continue
+            if doc_name != current_doc:
+                parts.append(f"=== {doc_name.upper()} ===")
+                current_doc = doc_name
+            parts.append(_node_chunk(node))
+        return "\n".join(parts)
+
+    def dependency_hashes(self, node_ids: Optional[List[str]],
+                          max_depth: int = 3) -> Dict[str, Dict[str, str]]:
+        """
+        Content hashes a retrieved context depends on.
+
+          node_hashes  — title + summary of every retrieved node (all nodes
+                         when `node_ids` is None, i.e. the full-tree dump),
+                         plus ID-ROOT, which carries the agent's role header
+          index_hashes — the child index shown to the tree searcher at every
+                         node it expanded; if one changes the node selection
+                         itself may change
+
+        A node missing from the tree hashes to "".
+        """
+        index = self.node_index()
+        ids = list(index) if node_ids is None else list(node_ids)
+        if "ID-ROOT" in index and "ID-ROOT" not in ids:
+            ids.append("ID-ROOT")
+
+        node_hashes = {
+            nid: _digest(_node_chunk(index[nid][2])) if nid in index else ""
+            for nid in ids
+        }
+
+        index_hashes: Dict[str, str] = {}
+        if node_ids is not None:
+            expanded = [tree["node_id"] for tree in self.trees.values()]
+            expanded += [
+                nid for nid in node_ids
+                if nid in index and index[nid][1] < max_depth
+            ]
+            for nid in expanded:
+                index_hashes[nid] = (
+                    _digest(_index_text(index[nid][2])) if nid in index else ""
+                )
+        return {"node_hashes": node_hashes, "index_hashes": index_hashes}
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Tree Search  (LLM-guided, mirrors PageIndex tree-search logic)
@@ -195,59 +371,359 @@ class LocalTreeSearcher:
     """
     Implements PageIndex-style tree search over LocalDocumentTree nodes.
 
-    At each tree level the LLM selects which child node(s) to descend into,
-    then extracts the relevant summary. This is the same two-step process
-    PageIndex uses: (1) reason over the index, (2) retrieve content.
+    Beam search: level by level, the children of every open node (across
+    all documents) are listed in ONE prompt and the LLM ranks them; the
+    top `beam_width` are retrieved and the ones with children stay open.
+    So a query costs at most `max_depth` LLM calls, and the search also
+    stops early once the per-query call or token budget would be exceeded.
     """
 
-    def __init__(self, model_client, max_depth: int = 3):
+    def __init__(self, model_client, max_depth: Optional[int] = None,
+                 beam_width: Optional[int] = None,
+                 max_calls: Optional[int] = None,
+                 max_tokens: Optional[int] = None):
         self.model = model_client
-        self.max_depth = max_depth
+        self.max_depth = config.TREE_SEARCH_MAX_DEPTH if max_depth is None else max_depth
+        self.beam_width = config.TREE_SEARCH_BEAM_WIDTH if beam_width is None else beam_width
+        self.max_calls = config.TREE_SEARCH_MAX_CALLS if max_calls is None else max_calls
+        self.max_tokens = config.TREE_SEARCH_MAX_TOKENS if max_tokens is None else max_tokens
 
-    def search(self, query: str, tree: Dict, depth: int = 0) -> List[str]:
+    def search(self, query: str, roots: List[Dict]) -> Tuple[List[str], Dict]:
         """
-        Recursively descend the tree to collect relevant summaries.
-        Returns a list of relevant text chunks.
+        Beam-search the trees under `roots` for `query`.
+        Returns (retrieved node_ids in selection order, cost report).
         """
-        if depth >= self.max_depth or not tree:
-            return []
-
-        children = tree.get("nodes", [])
-        if not children:
-            return [tree.get("summary", "")]
-
-        # Build a compact index of child titles + summaries for the LLM
-        index_text = "\n".join(
-            f"[{c['node_id']}] {c['title']}: {c.get('summary', '')[:150]}"
-            for c in children
+        started = time.time()
+        cost = {
+            "strategy": "tree_search",
+            "llm_calls": 0,
+            "est_tokens": 0,
+            "levels": 0,
+            "candidates_scored": 0,
+            "stopped": None,       # why the search ended early, if it did
+        }
+        selected: List[str] = []
+        beam = [root for root in roots if root.get("nodes")]
+
+        for depth in range(self.max_depth):
+            if not beam:
+                break
+            candidates = [c for node in beam for c in node["nodes"]]
+            prompt = self._level_prompt(query, beam)
+            # Extra ids in a reply are cut to the beam below rather than
+            # rejected, so the schema only restricts replies to real ids
+            schema = node_ids_schema([c["node_id"] for c in candidates])
+            reply_tokens = schema.max_tokens if config.STRUCTURED_OUTPUT else 50
+            tokens = RequestScheduler.estimate_tokens(prompt, reply_tokens)
+            if cost["llm_calls"] + 1 > self.max_calls:
+                cost["stopped"] = "call_budget"
+                break
+            if cost["est_tokens"] + tokens > self.max_tokens:
+                cost["stopped"] = "token_budget"
+                break
+
+            ranked = self._rank(prompt, candidates, schema)
+            cost["llm_calls"] += 1
+            cost["est_tokens"] += tokens
+            cost["levels"] = depth + 1
+            cost["candidates_scored"] += len(candidates)
+
+            kept = ranked[:self.beam_width]
+            selected.extend(c["node_id"] for c in kept)
+            beam = [c for c in kept if c.get("nodes")]
+
+        cost["elapsed_s"] = round(time.time() - started, 3)
+        return selected, cost
+
+    def _level_prompt(self, query: str, beam: List[Dict]) -> str:
+        # Same per-node child index as before (see _index_text), so a
+        # change to it still marks dependent decisions for re-search
+        sections = "\n\n".join(
+            f"Under '{node['title']}':\n{_index_text(node)}" for node in beam
         )
-
-        prompt = (
+        return (
             f"You are navigating a document index to answer this query:\n"
             f"QUERY: {query}\n\n"
-            f"Current section: {tree['title']}\n"
-            f"Child sections available:\n{index_text}\n\n"
-            f"List the node_ids (comma-separated) of the sections most relevant "
-            f"to the query. Return ONLY the node_ids, nothing else."
+            f"Candidate sections:\n{sections}\n\n"
         )
 
-        response = self.model.generate(prompt, temperature=0.0, max_tokens=50)
-        selected_ids = {
-            nid.strip()
-            for nid in re.split(r"[,\s]+", response)
-            if nid.strip()
+    def _rank(self, prompt: str, candidates: List[Dict], schema) -> List[Dict]:
+        """Candidates the LLM picked, most relevant first."""
+        by_id = {c["node_id"]: c for c in candidates}
+        width = min(self.beam_width, len(candidates))
+
+        if config.STRUCTURED_OUTPUT:
+            prompt += (
+                f"List the node_ids of up to {width} sections most relevant to "
+                f"the query, most relevant first. "
+                'Return ONLY JSON: {"node_ids": ["<node_id>", ...]}'
+            )
+            value = self.model.generate_json(prompt, schema, temperature=0.0,
+                                             strict=False)
+            ranked_ids = value["node_ids"] if value is not None else []
+        else:
+            prompt += (
+                f"List the node_ids (comma-separated) of up to {width} sections "
+                f"most relevant to the query, most relevant first. "
+                f"Return ONLY the node_ids, nothing else."
+            )
+            response = self.model.generate(prompt, temperature=0.0, max_tokens=50)
+            ranked_ids = [nid.strip() for nid in re.split(r"[,\s]+", response)
+                          if nid.strip()]
+
+        return [by_id[nid] for nid in dict.fromkeys(ranked_ids) if nid in by_id]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cloud Indexing  (background submit + status polling, hash-keyed doc ids)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class CloudIndexer:
+    """
+    Keeps the PageIndex cloud copies of the agent's documents in sync
+    without blocking queries.
+
+    Doc ids are cached per document together with the content hash they
+    were indexed from:
+
+        {"policies": {"hash": "<sha1[:12]>", "doc_id": "...", "ready": true}, ...}
+
+    refresh() wakes a background thread that submits only documents whose
+    hash changed, then polls until PageIndex reports them completed.
+    ready_doc_ids() is empty until every current document is indexed, so
+    callers serve from the local tree in the meantime.
+    """
+
+    def __init__(self, client_factory, cache_path=None,
+                 poll_interval: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        self._client_factory = client_factory
+        self.cache_path = cache_path or config.PAGEINDEX_DOC_CACHE
+        self.poll_interval = (config.PAGEINDEX_POLL_INTERVAL
+                              if poll_interval is None else poll_interval)
+        self.timeout = config.PAGEINDEX_INDEX_TIMEOUT if timeout is None else timeout
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load_cache()
+        self._wanted: Dict[str, str] = {}   # doc_name → hash of the current file
+        self._dirty = False
+        self._thread: Optional[threading.Thread] = None
+        self._rng = random.Random()
+        self.submitted = 0
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            cached = _load_json(self.cache_path)
+        except (OSError, ValueError):
+            return {}
+        # The old format was a bare list of doc ids with no content hash;
+        # those documents are indexed again once
+        if not isinstance(cached, dict):
+            return {}
+        # Cached ids are re-checked with PageIndex before they are used
+        return {
+            doc: {"hash": entry["hash"], "doc_id": entry["doc_id"], "ready": False}
+            for doc, entry in cached.items()
+            if isinstance(entry, dict) and {"hash", "doc_id"} <= set(entry)
         }
 
-        results = []
-        for child in children:
-            if child["node_id"] in selected_ids:
-                results.append(
-                    f"[{child['node_id']}] {child['title']}:\n{child.get('summary', '')}"
-                )
-                # Recurse
-                results.extend(self.search(query, child, depth + 1))
+    def _save_cache(self):
+        with self._lock:
+            payload = json.dumps(self._entries, indent=2)
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            tmp.write_text(payload)
+            os.replace(str(tmp), str(self.cache_path))
+        except OSError as e:
+            print(f"  ⚠️  Could not write {self.cache_path.name}: {e}")
 
-        return results
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def refresh(self, source_hashes: Optional[Dict[str, str]] = None):
+        """
+        Index the documents with these content hashes (default: the files
+        on disk) in the background. Returns immediately.
+        """
+        if source_hashes is None:
+            source_hashes = {
+                doc: _source_digest(raw)
+                for doc, raw in LocalDocumentTree.read_sources().items()
+            }
+        with self._lock:
+            self._wanted = {doc: h for doc, h in source_hashes.items() if h}
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pageindex-indexer", daemon=True
+                )
+                self._thread.start()
+
+    def ready_doc_ids(self) -> List[str]:
+        """Cloud doc ids to query, or [] while any document is (re)indexing."""
+        with self._lock:
+            if not self._wanted:
+                return []
+            doc_ids = []
+            for doc, digest in self._wanted.items():
+                entry = self._entries.get(doc)
+                if not entry or entry["hash"] != digest or not entry.get("ready"):
+                    return []
+                doc_ids.append(entry["doc_id"])
+            return doc_ids
+
+    def status(self) -> Dict[str, str]:
+        """doc_name → "ready" | "indexing" | "pending"."""
+        with self._lock:
+            status = {}
+            for doc, digest in self._wanted.items():
+                entry = self._entries.get(doc)
+                if not entry or entry["hash"] != digest:
+                    status[doc] = "pending"
+                else:
+                    status[doc] = "ready" if entry.get("ready") else "indexing"
+            return status
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the background pass finishes; True if all docs are ready."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return bool(self.ready_doc_ids())
+
+    # ── Background sync ──────────────────────────────────────────────────────
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._thread = None
+                    return
+                self._dirty = False
+                wanted = dict(self._wanted)
+            try:
+                self._sync(wanted)
+            except Exception as e:
+                print(f"  ⚠️  PageIndex cloud indexing failed: {e} — serving local tree")
+
+    def _sync(self, wanted: Dict[str, str]):
+        client = self._client_factory()
+        failed: set = set()
+        resubmits: Dict[str, int] = {}
+        while True:
+            self._submit_changed(client, wanted, failed)
+            lost = self._poll(client, wanted, failed)
+            if not lost:
+                break
+            # Doc ids PageIndex no longer knows: submit them again, a bounded
+            # number of times with jittered exponential backoff
+            for doc in lost:
+                resubmits[doc] = resubmits.get(doc, 0) + 1
+                if resubmits[doc] > config.PAGEINDEX_MAX_RESUBMITS:
+                    failed.add(doc)
+                    print(f"  ⚠️  PageIndex keeps losing {doc} — serving local tree")
+            retry = lost - failed
+            if retry:
+                attempt = max(resubmits[doc] for doc in retry)
+                time.sleep(self._rng.uniform(0, self.poll_interval * 2 ** attempt))
+        if self.ready_doc_ids():
+            print(f"  ✓ PageIndex cloud index ready ({len(wanted)} documents)")
+
+    def _submit_changed(self, client, wanted: Dict[str, str], failed: set):
+        """Submit documents with no doc id for their current hash."""
+        for doc, digest in wanted.items():
+            entry = self._entries.get(doc)
+            if (entry and entry["hash"] == digest) or doc in failed:
+                continue
+            path = getattr(config, LocalDocumentTree.SOURCES[doc])
+            try:
+                result = client.submit_document(str(path))
+            except Exception as e:
+                print(f"  ⚠️  Cloud indexing failed for {path}: {e}")
+                failed.add(doc)
+                continue
+            self.submitted += 1
+            with self._lock:
+                self._entries[doc] = {"hash": digest, "doc_id": result["doc_id"],
+                                      "ready": False}
+            self._save_cache()
+            if entry:
+                self._delete(client, entry["doc_id"])
+            print(f"  ☁️  Submitted {doc} for PageIndex indexing")
+
+    def _poll(self, client, wanted: Dict[str, str], failed: set) -> set:
+        """
+        Poll until every wanted document is ready. Returns the documents
+        whose doc id turned out to be unknown and need submitting again
+        (empty when done, timed out or superseded).
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                if self._dirty:        # superseded by a newer refresh()
+                    return set()
+                pending = [
+                    (doc, entry["doc_id"]) for doc, entry in self._entries.items()
+                    if doc in wanted and entry["hash"] == wanted[doc]
+                    and not entry.get("ready")
+                ]
+            if not pending:
+                return set()
+            if time.monotonic() >= deadline:
+                print(f"  ⚠️  PageIndex indexing still running after {self.timeout:.0f}s"
+                      " — serving local tree")
+                return set()
+
+            waiting, lost = False, set()
+            for doc, doc_id in pending:
+                try:
+                    state = client.get_document(doc_id).get("status")
+                except Exception as e:
+                    if not self._is_unknown_document(e):
+                        # Transient (network, rate limit, 5xx): ask again next poll
+                        print(f"  ⚠️  PageIndex status check failed for {doc}: {e}")
+                        waiting = True
+                        continue
+                    state = None
+                if state == "completed":
+                    with self._lock:
+                        self._entries[doc]["ready"] = True
+                    continue
+                if state in ("failed", None):
+                    with self._lock:
+                        self._entries.pop(doc, None)
+                    self._delete(client, doc_id)
+                    if state == "failed":
+                        failed.add(doc)
+                        print(f"  ⚠️  PageIndex could not index {doc}")
+                    else:
+                        lost.add(doc)
+                else:
+                    waiting = True
+            self._save_cache()
+            if lost:
+                return lost
+            if waiting:
+                time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _is_unknown_document(error: Exception) -> bool:
+        """
+        True only for a definite "no such document" reply (HTTP 404, or the
+        stand-in's KeyError); anything else may succeed on the next poll.
+        """
+        if isinstance(error, KeyError):
+            return True
+        response = getattr(error, "response", None)
+        status = (getattr(error, "status_code", None) or getattr(error, "status", None)
+                  or getattr(response, "status_code", None))
+        return status == 404
+
+    @staticmethod
+    def _delete(client, doc_id: str):
+        """Best-effort removal of a superseded cloud document."""
+        try:
+            client.delete_document(doc_id)
+        except Exception:
+            pass
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -262,40 +738,103 @@ class PageIndexRetriever:
         retriever = PageIndexRetriever(model_client)
         context   = retriever.retrieve(query)
 
-    Automatically selects cloud vs. local mode.
+    Automatically selects cloud vs. local mode. In cloud mode the documents
+    are indexed in the background and queries are answered from the local
+    tree until the cloud index is ready. `cloud_client` injects a
+    PageIndexClient-compatible client (e.g. LocalPageIndexClient).
     """
 
-    def __init__(self, model_client=None):
+    def __init__(self, model_client=None, cloud_client=None):
         self.model_client = model_client
-        self._cloud_client = None
+        self._cloud_client = cloud_client
+        self._client_lock = threading.Lock()
         self._local_tree = None
         self._searcher = None
+        self._indexer: Optional[CloudIndexer] = None
         self._mode = "uninitialized"
+        self._local = threading.local()
         self._setup()
 
     # ── Setup ────────────────────────────────────────────────────────────────
 
     def _setup(self):
-        pageindex_key = os.getenv("PAGEINDEX_API_KEY", "")
-        if pageindex_key:
-            try:
-                from pageindex import PageIndexClient  # noqa: F401
-                self._cloud_client = PageIndexClient(api_key=pageindex_key)
+        """
+        Pick the mode without importing the SDK or building any tree.
+        Cloud mode starts indexing in the background (the SDK is imported
+        on that thread); the local tree is built on first retrieval.
+        """
+        self._pageindex_key = os.getenv("PAGEINDEX_API_KEY", "")
+        if self._cloud_client is not None or config.PAGEINDEX_CLIENT == "local":
+            self._mode = "cloud"
+            print("  ✓ PageIndexRetriever: cloud mode (local stand-in)")
+        elif self._pageindex_key:
+            if importlib.util.find_spec("pageindex") is not None:
                 self._mode = "cloud"
                 print("  ✓ PageIndexRetriever: cloud mode (SDK)")
-                return
-            except ImportError:
+            else:
                 print("  ⚠️  pageindex SDK not installed — falling back to local mode")
-            except Exception as e:
-                print(f"  ⚠️  PageIndex cloud init failed: {e} — falling back to local mode")
 
-        # Local mode
-        self._local_tree = LocalDocumentTree()
-        if self.model_client:
-            self._searcher = LocalTreeSearcher(self.model_client)
+        if self._mode == "cloud":
+            self._indexer = CloudIndexer(lambda: self.cloud_client)
+            self._indexer.refresh()
+            return
+
         self._mode = "local"
         print("  ✓ PageIndexRetriever: local tree-search mode")
 
+    @property
+    def cloud_client(self):
+        """PageIndex client (SDK or local stand-in), created on first use"""
+        with self._client_lock:
+            if self._cloud_client is None:
+                if config.PAGEINDEX_CLIENT == "local":
+                    from utils.pageindex_local import LocalPageIndexClient
+                    self._cloud_client = LocalPageIndexClient()
+                else:
+                    from pageindex import PageIndexClient
+                    self._cloud_client = PageIndexClient(api_key=self._pageindex_key)
+            return self._cloud_client
+
+    @property
+    def cloud_status(self) -> Optional[Dict[str, str]]:
+        """Per-document cloud indexing state (None in local mode)"""
+        return self._indexer.status() if self._indexer else None
+
+    @property
+    def local_tree(self) -> "LocalDocumentTree":
+        """Local document tree, built on first local retrieval"""
+        if self._local_tree is None:
+            self._local_tree = LocalDocumentTree()
+        return self._local_tree
+
+    @property
+    def searcher(self) -> Optional["LocalTreeSearcher"]:
+        """LLM tree searcher (None without a model client), created on first use"""
+        if self._searcher is None and self.model_client:
+            self._searcher = LocalTreeSearcher(self.model_client)
+        return self._searcher
+
+    def use_tree(self, tree: "LocalDocumentTree"):
+        """
+        Make `tree` the current tree (see EpistemicProxyAgent.reload).
+        In cloud mode, documents whose content changed are re-indexed in
+        the background; until then queries are served from `tree`.
+        """
+        self._local_tree = tree
+        if self._indexer is not None:
+            self._indexer.refresh(tree.source_hashes)
+
+    def reload_tree(self, sources: Optional[Dict[str, Optional[bytes]]] = None
+                    ) -> "LocalDocumentTree":
+        """
+        Swap in a tree rebuilt from `sources` (default: the files on disk).
+        Copy-on-write: unchanged documents are shared with the current
+        tree, and searches already holding the current tree finish on it.
+        """
+        tree = LocalDocumentTree(sources, previous=self._local_tree)
+        self.use_tree(tree)
+        return tree
+
     # ── Public API ───────────────────────────────────────────────────────────
 
     def retrieve(self, query: str) -> str:
@@ -303,74 +842,116 @@ class PageIndexRetriever:
         Returns a context string constructed by tree-search over the document
         corpus, ranked by relevance to `query`.
         """
+        return self.retrieve_nodes(query)[0]
+
+    def retrieve_nodes(self, query: str, tree: Optional["LocalDocumentTree"] = None,
+                       lexical: bool = False) -> Tuple[str, Optional[List[str]]]:
+        """
+        Like `retrieve`, also returning the node_ids the context was built
+        from. node_ids is None when the context is not node-addressable
+        (cloud retrieval, or the full-tree dump when search found nothing).
+        `tree` pins the document tree to search (default: the current one).
+        `lexical` ranks nodes by keyword overlap instead of LLM tree search
+        (no model call; used by QueryScheduler under tight deadlines).
+        """
+        self._local.cost = None
+        if lexical:
+            return self._retrieve_lexical(query, tree)
         if self._mode == "cloud":
-            return self._retrieve_cloud(query)
-        return self._retrieve_local(query)
+            return self._retrieve_cloud(query, tree)
+        return self._retrieve_local(query, tree)
+
+    @property
+    def last_cost(self) -> Optional[Dict]:
+        """
+        Cost report of this thread's last tree search: LLM calls, estimated
+        tokens, levels searched, candidates scored, early-stop reason and
+        elapsed time. None when no tree search ran.
+        """
+        return getattr(self._local, "cost", None)
+
+    def dependencies(self, node_ids: Optional[List[str]],
+                     tree: Optional["LocalDocumentTree"] = None) -> Dict:
+        """Dependency hashes for a retrieval (empty for cloud-served context)"""
+        if self._mode == "cloud" and node_ids is None:
+            return {}
+        tree = tree or self.local_tree
+        if not tree.trees:
+            return {}
+        max_depth = self.searcher.max_depth if self.searcher else 0
+        return tree.dependency_hashes(node_ids, max_depth)
 
     # ── Cloud mode ───────────────────────────────────────────────────────────
 
-    def _retrieve_cloud(self, query: str) -> str:
-        """Query the PageIndex Chat API with the agent's document corpus."""
+    def _retrieve_cloud(self, query: str, tree: Optional["LocalDocumentTree"] = None
+                        ) -> Tuple[str, Optional[List[str]]]:
+        """
+        Query the PageIndex Chat API with the agent's document corpus,
+        or the local tree while the cloud documents are still indexing.
+        """
         try:
-            # Retrieve all indexed doc IDs stored on first index
-            doc_ids = self._get_or_index_cloud_docs()
+            doc_ids = self._indexer.ready_doc_ids()
             if not doc_ids:
-                return self._retrieve_local(query)
+                return self._retrieve_local(query, tree)
 
-            response = self._cloud_client.chat_completions(
+            response = self.cloud_client.chat_completions(
                 messages=[{"role": "user", "content": query}],
                 doc_id=doc_ids if len(doc_ids) > 1 else doc_ids[0],
             )
             content = response["choices"][0]["message"]["content"]
-            return f"[PageIndex Cloud Retrieval]\n{content}"
+            return f"[PageIndex Cloud Retrieval]\n{content}", None
         except Exception as e:
             print(f"  ⚠️  PageIndex cloud retrieval failed: {e} — using local")
-            return self._retrieve_local(query)
-
-    def _get_or_index_cloud_docs(self) -> List[str]:
-        """Submit agent docs to PageIndex cloud if not already indexed."""
-        cache_path = config.DATA_DIR / ".pageindex_doc_ids.json"
-        if cache_path.exists():
-            return _load_json(cache_path)
-
-        doc_ids = []
-        for path in [config.POLICIES_PATH, config.IDENTITY_PATH]:
-            try:
-                result = self._cloud_client.submit_document(str(path))
-                doc_ids.append(result["doc_id"])
-            except Exception as e:
-                print(f"  ⚠️  Cloud indexing failed for {path}: {e}")
-
-        if doc_ids:
-            cache_path.write_text(json.dumps(doc_ids))
-        return doc_ids
+            return self._retrieve_local(query, tree)
 
     # ── Local mode ───────────────────────────────────────────────────────────
 
-    def _retrieve_local(self, query: str) -> str:
+    def _retrieve_local(self, query: str, tree: Optional["LocalDocumentTree"] = None
+                        ) -> Tuple[str, Optional[List[str]]]:
         """
         Tree-search over local JSON documents.
         Falls back to flat dump when no model_client is available.
         """
-        if not self._local_tree:
-            return self._fallback_context()
+        local_tree = tree or self.local_tree
+        if not local_tree.trees:
+            return self._fallback_context(), None
 
         # Fast path: no LLM available → return full tree summaries
-        if not self._searcher:
-            return self._local_tree.get_all_summaries()
+        if not self.searcher:
+            return local_tree.get_all_summaries(), None
 
-        all_chunks: List[str] = []
-        for doc_name, tree in self._local_tree.trees.items():
-            chunks = self._searcher.search(query, tree)
-            if chunks:
-                all_chunks.append(f"=== {doc_name.upper()} ===")
-                all_chunks.extend(chunks)
+        node_ids, cost = self.searcher.search(query, list(local_tree.trees.values()))
+        self._local.cost = cost
 
-        if not all_chunks:
+        if not node_ids:
             # Searcher returned nothing — return full summaries
-            return self._local_tree.get_all_summaries()
-
-        return "\n".join(all_chunks)
+            return local_tree.get_all_summaries(), None
+
+        # Rendered from the node_ids, so the context can be rebuilt later
+        return local_tree.render_nodes(node_ids), node_ids
+
+    def _retrieve_lexical(self, query: str, tree: Optional["LocalDocumentTree"] = None
+                          ) -> Tuple[str, Optional[List[str]]]:
+        """Keyword-overlap retrieval over the local tree."""
+        local_tree = tree or self.local_tree
+        if not local_tree.trees:
+            return self._fallback_context(), None
+
+        started = time.time()
+        top_k = config.TREE_SEARCH_BEAM_WIDTH * config.TREE_SEARCH_MAX_DEPTH
+        node_ids = local_tree.lexical_search(query, top_k)
+        self._local.cost = {
+            "strategy": "lexical",
+            "llm_calls": 0,
+            "est_tokens": 0,
+            "levels": 0,
+            "candidates_scored": len(local_tree.node_index()),
+            "stopped": None,
+            "elapsed_s": round(time.time() - started, 3),
+        }
+        if not node_ids:
+            return local_tree.get_all_summaries(), None
+        return local_tree.render_nodes(node_ids), node_ids
 
     def _fallback_context(self) -> str:
         """Last-resort: read raw JSON files and return as text."""
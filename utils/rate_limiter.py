@@ -0,0 +1,163 @@
+"""
+Rate Limiter — quota-aware request scheduling for model providers.
+
+Every live request of a ModelClient goes through a RequestScheduler:
+
+  - token buckets for requests per minute (RPM) and tokens per minute
+    (TPM, estimated as prompt chars / 4 + max_tokens); either may be None
+  - priority classes: when requests queue for the buckets, "scoring"
+    (the routing decision itself) goes before "explanation", which goes
+    before "demo"
+  - retry with full-jitter exponential backoff on retryable failures
+    (429 / RESOURCE_EXHAUSTED / 5xx); a rate-limit reply also pauses every
+    queued request, honouring Retry-After when the provider sends one
+
+Failures are raised, never returned as text: ProviderError for provider
+failures, RateLimitError when retries or the queueing budget run out.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+PRIORITIES = {"scoring": 0, "explanation": 1, "demo": 2}
+
+
+class ProviderError(RuntimeError):
+    """A model provider call failed."""
+
+    def __init__(self, provider: str, message: str, status: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RateLimitError(ProviderError):
+    """Rate limit or quota still exceeded after retrying / queueing."""
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, bursting up to `capacity`."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at capacity) is available."""
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.tokens
+        return max(0.0, deficit / self.rate)
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RequestScheduler:
+
+    def __init__(self, provider: str, rpm: Optional[float] = None,
+                 tpm: Optional[float] = None, max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 30.0,
+                 max_wait: float = 120.0):
+        self.provider = provider
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self._rng = random.Random()          # jitter; leaves the global RNG alone
+        # (bucket, charged per token?) — RPM buckets charge 1 per request
+        self._buckets = []
+        if rpm:
+            self._buckets.append((TokenBucket(rpm), False))
+        if tpm:
+            self._buckets.append((TokenBucket(tpm), True))
+        self._cond = threading.Condition()
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.retries = 0
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_tokens: int) -> int:
+        return len(prompt) // 4 + max_tokens
+
+    # ── Admission ────────────────────────────────────────────────────────────
+
+    def acquire(self, priority: str = "scoring", tokens: int = 0):
+        """
+        Block until this request may be sent. Queued requests are admitted
+        in priority order, then arrival order.
+        """
+        ticket = (PRIORITIES.get(priority, len(PRIORITIES)), next(self._seq))
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0] == ticket:
+                        wait = max(
+                            [self._paused_until - now]
+                            + [b.wait_time(tokens if per_token else 1, now)
+                               for b, per_token in self._buckets]
+                        )
+                        if wait <= 0:
+                            for bucket, per_token in self._buckets:
+                                bucket.take(tokens if per_token else 1)
+                            return
+                    if now + (wait or 0.0) > deadline:
+                        raise RateLimitError(
+                            self.provider,
+                            f"request queued longer than {self.max_wait:.0f}s",
+                        )
+                    self._cond.wait(timeout=min(wait, deadline - now)
+                                    if wait is not None else deadline - now)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold back every queued request for `seconds` (provider said 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    # ── Execution ────────────────────────────────────────────────────────────
+
+    def call(self, fn: Callable[[], str], priority: str = "scoring",
+             tokens: int = 0) -> str:
+        """Run `fn` under the limits, retrying retryable ProviderErrors."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(priority, tokens)
+            try:
+                return fn()
+            except ProviderError as e:
+                if not e.retryable:
+                    raise
+                if attempt == self.max_retries:
+                    cls = RateLimitError if e.status == 429 else ProviderError
+                    raise cls(self.provider,
+                              f"gave up after {self.max_retries} retries: {e}",
+                              status=e.status) from e
+                delay = self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if e.retry_after:
+                    delay = max(delay, e.retry_after)
+                self.retries += 1
+                if e.status == 429:
+                    self.pause(delay)    # the next acquire() waits it out
+                else:
+                    time.sleep(delay)
@@ -0,0 +1,190 @@
+"""
+Structured Output — JSON schemas for LLM replies, validation and repair.
+
+Free-text replies are scraped with regexes and silently fall back to
+neutral values when the model rambles. With structured output each call
+site declares an OutputSchema:
+
+  - the JSON schema is sent to providers that support constrained
+    decoding (Ollama `format`, Gemini JSON mime type)
+  - `max_tokens` is sized to the largest valid reply, not a guess, so a
+    valid reply is never cut off
+  - replies are parsed and validated here; invalid ones are re-prompted
+    with the validation errors (see ModelClient.generate_json_many)
+
+Only the JSON-schema subset the pipeline needs is validated: type,
+properties, required, enum, minimum / maximum, items, minItems / maxItems,
+minLength / maxLength.
+"""
+
+import json
+from typing import Any, Dict, List
+
+
+class StructuredOutputError(ValueError):
+    """A reply still did not match its schema after all repair attempts."""
+
+
+class OutputSchema:
+    """A named JSON schema plus the token budget of a valid reply."""
+
+    def __init__(self, name: str, schema: Dict, max_tokens: int):
+        self.name = name
+        self.schema = schema
+        self.max_tokens = max_tokens
+
+    def instruction(self) -> str:
+        return (
+            "Return ONLY a JSON value matching this schema, nothing else:\n"
+            + json.dumps(self.schema)
+        )
+
+    def __repr__(self):
+        return f"OutputSchema({self.name!r}, max_tokens={self.max_tokens})"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Schemas used by the agent
+# ─────────────────────────────────────────────────────────────────────────────
+
+SCORE_SCHEMA = OutputSchema(
+    "score",
+    {
+        "type": "object",
+        "properties": {"score": {"type": "number", "minimum": 0.0, "maximum": 1.0}},
+        "required": ["score"],
+    },
+    max_tokens=12,
+)
+
+# Candidate actions: up to _MAX_ACTIONS strings of at most _ACTION_CHARS;
+# budget ~1 token per 3 characters, plus quotes / commas and the envelope
+_MAX_ACTIONS = 5
+_ACTION_CHARS = 160
+
+
+def actions_schema(max_actions: int = _MAX_ACTIONS) -> OutputSchema:
+    """Candidate actions, at most `max_actions` of them (budget scales with it)."""
+    return OutputSchema(
+        "actions",
+        {
+            "type": "object",
+            "properties": {
+                "actions": {
+                    "type": "array",
+                    "items": {"type": "string", "minLength": 10,
+                              "maxLength": _ACTION_CHARS},
+                    "minItems": min(3, max_actions),
+                    "maxItems": max_actions,
+                }
+            },
+            "required": ["actions"],
+        },
+        max_tokens=8 + max_actions * (_ACTION_CHARS // 3 + 3),
+    )
+
+
+ACTIONS_SCHEMA = actions_schema()
+
+
+def node_ids_schema(node_ids: List[str]) -> OutputSchema:
+    """Selection of child node_ids; the enum restricts replies to real ids."""
+    return OutputSchema(
+        "node_ids",
+        {
+            "type": "object",
+            "properties": {
+                "node_ids": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": list(node_ids)},
+                    "maxItems": len(node_ids),
+                }
+            },
+            "required": ["node_ids"],
+        },
+        max_tokens=8 + 6 * len(node_ids),
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parsing and validation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def extract_json(text: str) -> Any:
+    """
+    Parse the first JSON object or array in `text`, tolerating code fences
+    and prose around it. Raises ValueError if there is none.
+    """
+    decoder = json.JSONDecoder()
+    for i, ch in enumerate(text):
+        if ch in "{[":
+            try:
+                return decoder.raw_decode(text, i)[0]
+            except json.JSONDecodeError:
+                continue
+    raise ValueError("no JSON value in reply")
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+}
+
+
+def validate(value: Any, schema: Dict, path: str = "$") -> List[str]:
+    """List of schema violations of `value` (empty when valid)."""
+    errors: List[str] = []
+    expected = schema.get("type")
+
+    if expected in ("number", "integer"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return [f"{path}: expected {expected}"]
+        if expected == "integer" and not float(value).is_integer():
+            return [f"{path}: expected integer"]
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: {value} < minimum {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: {value} > maximum {schema['maximum']}")
+    elif expected in _TYPES and not isinstance(value, _TYPES[expected]):
+        return [f"{path}: expected {expected}"]
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} not one of {schema['enum']}")
+
+    if isinstance(value, str):
+        if len(value) < schema.get("minLength", 0):
+            errors.append(f"{path}: shorter than {schema['minLength']} characters")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append(f"{path}: longer than {schema['maxLength']} characters")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: missing '{key}'")
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate(value[key], sub, f"{path}.{key}"))
+
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: fewer than {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: more than {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
+
+
+def repair_prompt(prompt: str, reply: str, errors: List[str],
+                  schema: OutputSchema) -> str:
+    """Re-prompt quoting the invalid reply and what was wrong with it."""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous reply was invalid:\n{reply[:300]}\n"
+        f"Problems: {'; '.join(errors[:5])}\n"
+        f"{schema.instruction()}"
+    )
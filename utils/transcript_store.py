@@ -0,0 +1,77 @@
+"""
+Transcript Store — append-only record/replay log of LLM calls.
+
+Every (prompt, params) → response pair seen by ModelClient can be written to
+a compact JSON-lines file and served back later, so evaluation reruns do not
+have to re-query the model. Each line holds only a content hash of the
+request and the response text:
+
+    {"k": "<sha256 of provider/model/prompt/params>", "r": "<response>"}
+
+Later lines win when the same key is written twice, so the file can be
+appended to by several runs without compaction.
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class TranscriptMissError(KeyError):
+    """Raised in strict replay mode when a request is not in the transcript."""
+
+
+class TranscriptStore:
+    """
+    Append-only (request hash → response) store backed by a JSONL file.
+
+    The whole index is loaded into memory on open; responses are appended
+    and flushed one line at a time so a crashed run keeps what it recorded.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._index: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, **params) -> str:
+        payload = json.dumps(
+            [provider, model, prompt, params], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(str(self.path), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._index[entry["k"]] = entry["r"]
+                except (ValueError, KeyError):
+                    # Tolerate a truncated last line from an interrupted run
+                    continue
+
+    def get(self, key: str) -> Optional[str]:
+        return self._index.get(key)
+
+    def append(self, key: str, response: str):
+        line = json.dumps({"k": key, "r": response}, ensure_ascii=False)
+        with self._lock:
+            self._index[key] = response
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(str(self.path), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
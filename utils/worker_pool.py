@@ -0,0 +1,162 @@
+"""
+Worker Pool — multi-process execution backend for CPU-bound local inference.
+
+A locally hosted model generating inside the agent's own process is bound
+by the GIL, so the scoring grid runs on one core. ScoringWorkerPool starts
+N worker processes; each loads the model once in its initializer and then
+serves generation requests from the pool's task queue.
+
+Requests cross the process boundary as plain (prompt, temperature,
+max_tokens) tuples and results come back as strings, batched by
+`chunksize` to keep IPC round trips low.
+
+Usage:
+    pool = ScoringWorkerPool(LocalHFBackend("gpt2"), n_workers=4,
+                             threads_per_worker=2)
+    responses = pool.map([(prompt, 0.1, 10), ...])
+"""
+
+import multiprocessing as mp
+import os
+from typing import Dict, List, Optional, Tuple
+
+GenerationRequest = Tuple[str, float, int]
+
+# Backend loaded by _init_worker, one per worker process
+_worker_backend = None
+
+
+def _limit_threads(n_threads: int):
+    """Cap BLAS / OpenMP / torch intra-op threads in this process."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(n_threads)
+    try:
+        import torch
+        torch.set_num_threads(n_threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(backend, threads_per_worker: int):
+    global _worker_backend
+    _limit_threads(threads_per_worker)
+    backend.load()
+    _worker_backend = backend
+
+
+def _run_request(request: GenerationRequest) -> str:
+    prompt, temperature, max_tokens = request
+    return _worker_backend.generate(prompt, temperature, max_tokens)
+
+
+def _run_logprob_request(request: Tuple[str, int]) -> Dict[str, float]:
+    prompt, top_k = request
+    return _worker_backend.next_token_logprobs(prompt, top_k)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Backends
+# ─────────────────────────────────────────────────────────────────────────────
+
+class LocalHFBackend:
+    """
+    Local Hugging Face causal LM (transformers, CPU).
+
+    Constructed cheaply in the parent and pickled to each worker; the
+    weights are only loaded by `load()` inside the worker process.
+    """
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._tokenizer = None
+        self._model = None
+
+    def __getstate__(self):
+        return {"model_path": self.model_path, "_tokenizer": None, "_model": None}
+
+    def load(self):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        self._model = AutoModelForCausalLM.from_pretrained(self.model_path)
+        self._model.eval()
+
+    def generate(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        if self._model is None:
+            self.load()
+        import torch
+
+        inputs = self._tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            output = self._model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                do_sample=temperature > 0,
+                temperature=max(temperature, 1e-5),
+                pad_token_id=self._tokenizer.eos_token_id,
+            )
+        new_tokens = output[0][inputs["input_ids"].shape[1]:]
+        return self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+    def next_token_logprobs(self, prompt: str, top_k: int) -> Dict[str, float]:
+        """Top-k next-token log-probabilities from a single forward pass."""
+        if self._model is None:
+            self.load()
+        import torch
+
+        inputs = self._tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            logits = self._model(**inputs).logits[0, -1]
+        logprobs = torch.log_softmax(logits.float(), dim=-1)
+        values, indices = torch.topk(logprobs, top_k)
+        out: Dict[str, float] = {}
+        for lp, idx in zip(values.tolist(), indices.tolist()):
+            token = self._tokenizer.decode([idx])
+            out[token] = max(out.get(token, float("-inf")), lp)
+        return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pool
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ScoringWorkerPool:
+    """Process pool whose workers each hold one loaded backend."""
+
+    def __init__(self, backend, n_workers: int, threads_per_worker: int = 1,
+                 start_method: str = "spawn"):
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+        ctx = mp.get_context(start_method)
+        self._pool = ctx.Pool(
+            processes=n_workers,
+            initializer=_init_worker,
+            initargs=(backend, threads_per_worker),
+        )
+
+    def map(self, requests: List[GenerationRequest],
+            chunksize: Optional[int] = None) -> List[str]:
+        """Run requests across all workers, results in request order."""
+        if not requests:
+            return []
+        if chunksize is None:
+            chunksize = max(1, len(requests) // (self.n_workers * 4))
+        return self._pool.map(_run_request, requests, chunksize)
+
+    def map_logprobs(self, prompts: List[str], top_k: int,
+                     chunksize: Optional[int] = None) -> List[Dict[str, float]]:
+        """Next-token log-probabilities per prompt, in prompt order."""
+        if not prompts:
+            return []
+        if chunksize is None:
+            chunksize = max(1, len(prompts) // (self.n_workers * 4))
+        return self._pool.map(_run_logprob_request,
+                              [(p, top_k) for p in prompts], chunksize)
+
+    def submit(self, prompt: str, temperature: float, max_tokens: int):
+        """Queue one request; returns an AsyncResult."""
+        return self._pool.apply_async(_run_request, ((prompt, temperature, max_tokens),))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()